@@ -0,0 +1,35 @@
+from app.config.settings import settings
+from motor.motor_asyncio import AsyncIOMotorClient
+from typing import Dict, Optional
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def client_options() -> Dict:
+     """Connection pool options shared by the process-wide clients"""
+     return {
+          "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+          "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+          "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+          "maxConnecting": settings.MONGO_MAX_CONNECTING,
+          "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS
+     }
+
+
+def get_motor_client() -> AsyncIOMotorClient:
+     """
+     The process-wide Motor client. Every service shares its connection
+     pool and server monitoring instead of opening its own; it is created
+     on first use and closed by close_mongo_clients() at shutdown.
+     """
+     global _client
+     if _client is None:
+          _client = AsyncIOMotorClient(settings.DATABASE_URL, **client_options())
+     return _client
+
+
+def close_mongo_clients():
+     global _client
+     if _client is not None:
+          _client.close()
+          _client = None
@@ -1,14 +1,19 @@
 from app.config.settings import settings
-from motor.motor_asyncio import AsyncIOMotorClient
+from app.utils.embedding.dimension_reduction import configured_embedding_dim
+from app.DB.mongodb.client import get_motor_client
 from bson import ObjectId
 
 from datetime import datetime
 from typing import List, Dict, Optional
 
+# Product fields declared as filters on the vector index; ProductService
+# pushes conditions on these into $vectorSearch.filter
+PRODUCT_VECTOR_FILTER_FIELDS = ("category", "status", "price", "averageRating")
+
 
 class MongoDB:
      def __init__(self):
-          self.client = AsyncIOMotorClient(settings.DATABASE_URL)
+          self.client = get_motor_client()
           self.db = self.client[settings.DATABASE_NAME]
           self.user_collection = self.db["users"]
           self.session_collection = self.db["sessions"]
@@ -18,6 +23,10 @@ class MongoDB:
           # FIX: Standardized naming
           self.personal_setup_collection = self.db["personalSetup"]
           self.product_collection = self.db["products"]
+          self.interaction_collection = self.db["interactions"]
+          self.user_profile_collection = self.db["userProfiles"]
+          self.product_neighbor_collection = self.db["productNeighbors"]
+          self.product_deletion_collection = self.db["productDeletions"]
      async def init_indexes(self):
           """Initialize database indexes - call this on app startup"""
           # Session indexes
@@ -34,6 +43,20 @@ class MongoDB:
           await self.product_collection.create_index("vendor_id")
           await self.product_collection.create_index("category")
           await self.product_collection.create_index("status")
+          # In-process indexes catch up by write time; inserts store updatedAt, updates $set updated_at
+          await self.product_collection.create_index("updatedAt")
+          await self.product_collection.create_index("updated_at")
+          await self.product_deletion_collection.create_index(
+               "deleted_at", expireAfterSeconds=settings.PRODUCT_DELETION_LOG_DAYS * 86400
+          )
+          
+          # One materialized interaction profile per user
+          await self.user_profile_collection.create_index("userId", unique=True)
+          # Per-user interaction history, read in time order by the profile backfill
+          await self.interaction_collection.create_index([("userId", 1), ("timestamp", 1)])
+          
+          # Neighbor rows are read by _id; this serves removing a product from other rows
+          await self.product_neighbor_collection.create_index("neighbors.product_id")
           
           # Meal & Workout Unique Daily indexes
           await self.meal_collection.create_index([("date", 1), ("userId", 1)], unique=True)
@@ -56,17 +79,11 @@ class MongoDB:
                     {
                          "type": "vector",
                          "path": "embedding",
-                         "numDimensions":384,
+                         # Must match the (optionally reduced) embedding size
+                         "numDimensions": configured_embedding_dim(),
                          "similarity": "cosine"
                     },
-                    {
-                         "type": "filter",
-                         "path": "category"
-                    },
-                    {
-                         "type": "filter",
-                         "path": "status"
-                    }
+                    *[{"type": "filter", "path": path} for path in PRODUCT_VECTOR_FILTER_FIELDS]
                ]
           }
           
@@ -82,7 +99,9 @@ class MongoDB:
                print("Vector search index creation initiated!")
           except Exception as e:
                if "already exists" in str(e):
-                    print("Vector search index already exists.")
+                    # Keep the definition current, e.g. when filter fields are added
+                    await collection.update_search_index("product_vector_index", index_definition)
+                    print("Vector search index already exists; definition updated.")
                else:
                     print(f"Failed to create search index: {e}")
      async def get_sessions(self, userId: str) -> List[Dict]:
@@ -168,15 +187,17 @@ class MongoDB:
                image_url=assistant_image_url
           )
 
-     async def delete_session(self, session_id: str, userId: str):
-          await self.session_collection.delete_one({
+     async def delete_session(self, session_id: str, userId: str) -> bool:
+          """True if the user had a session or messages with this id"""
+          sessions = await self.session_collection.delete_one({
                "session_id": session_id,                    # ✅ plain string
                "userId": userId                             # ✅ plain string
           })
-          await self.message_collection.delete_many({
+          messages = await self.message_collection.delete_many({
                "session_id": session_id,                    # ✅ plain string
                "userId": userId                             # ✅ plain string
           })
+          return sessions.deleted_count > 0 or messages.deleted_count > 0
      
      async def get_meal(self, userId: str):
           cursor = self.meal_collection.find(
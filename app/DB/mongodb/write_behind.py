@@ -0,0 +1,130 @@
+from app.config.settings import settings
+from pymongo.errors import BulkWriteError
+from typing import Dict, List, Optional
+import asyncio
+import time
+
+
+class WriteBehindBuffer:
+     """
+     Write-behind buffer for fire-and-forget Mongo writes (interaction and
+     search logs, profile counters).
+
+     Callers add pymongo write operations (InsertOne / UpdateOne) per
+     collection and return immediately. Buffered operations are flushed
+     with one unordered bulk_write per collection when flush_rows are
+     pending or flush_interval_ms has passed, whichever comes first. Once
+     max_buffer operations are waiting, add() blocks until a flush frees
+     space, so a slow database pushes back on writers instead of growing
+     memory without bound. One flush runs at a time.
+     """
+     def __init__(self, db, flush_rows: int = 500, flush_interval_ms: float = 1000, max_buffer: int = 20000):
+          self.db = db
+          self.flush_rows = flush_rows
+          self.flush_interval = flush_interval_ms / 1000
+          self.max_buffer = max_buffer
+          self._pending: Dict[str, List] = {}
+          self._size = 0
+          self._space: Optional[asyncio.Event] = None
+          self._flush_task: Optional[asyncio.Task] = None
+          self._timer_task: Optional[asyncio.Task] = None
+          self._closed = False
+          self._stats = {
+               "queued": 0,
+               "written": 0,
+               "failed": 0,
+               "flushes": 0,
+               "backpressure_waits": 0,
+               "flush_ms": 0.0
+          }
+
+     async def add(self, collection: str, operations: List):
+          if not operations:
+               return
+          if self._closed:
+               await self.db[collection].bulk_write(operations, ordered=False)
+               return
+          if self._space is None:
+               self._space = asyncio.Event()
+               self._space.set()
+               self._timer_task = asyncio.create_task(self._timer())
+
+          if self._size >= self.max_buffer:
+               self._stats["backpressure_waits"] += 1
+          while self._size >= self.max_buffer:
+               self._space.clear()
+               self._request_flush()
+               await self._space.wait()
+
+          self._pending.setdefault(collection, []).extend(operations)
+          self._size += len(operations)
+          self._stats["queued"] += len(operations)
+          if self._size >= self.flush_rows:
+               self._request_flush()
+
+     def _request_flush(self):
+          if self._flush_task is None or self._flush_task.done():
+               self._flush_task = asyncio.create_task(self._flush())
+
+     async def _timer(self):
+          while True:
+               await asyncio.sleep(self.flush_interval)
+               if self._size:
+                    self._request_flush()
+
+     async def _flush(self):
+          while self._size:
+               batch, self._pending, self._size = self._pending, {}, 0
+               self._space.set()
+               started = time.perf_counter()
+               for collection, operations in batch.items():
+                    try:
+                         await self.db[collection].bulk_write(operations, ordered=False)
+                         self._stats["written"] += len(operations)
+                    except BulkWriteError as e:
+                         failed = len(e.details.get("writeErrors", []))
+                         self._stats["written"] += len(operations) - failed
+                         self._stats["failed"] += failed
+                         print(f"Write-behind: {failed} of {len(operations)} writes to {collection} failed")
+                    except Exception as e:
+                         self._stats["failed"] += len(operations)
+                         print(f"Write-behind: dropped {len(operations)} writes to {collection}: {e}")
+               self._stats["flushes"] += 1
+               self._stats["flush_ms"] += (time.perf_counter() - started) * 1000
+
+     async def close(self):
+          """Stop the timer and write out everything still buffered"""
+          self._closed = True
+          if self._timer_task is not None:
+               self._timer_task.cancel()
+          if self._flush_task is not None:
+               await self._flush_task
+          if self._size:
+               await self._flush()
+
+     def get_stats(self) -> Dict:
+          stats = dict(self._stats)
+          stats["pending"] = self._size
+          stats["avg_flush_ms"] = stats["flush_ms"] / max(stats["flushes"], 1)
+          return stats
+
+
+_buffer: Optional[WriteBehindBuffer] = None
+
+
+def get_write_behind_buffer(db) -> WriteBehindBuffer:
+     """Process-wide buffer, bound to the database handle of its first caller"""
+     global _buffer
+     if _buffer is None:
+          _buffer = WriteBehindBuffer(
+               db,
+               flush_rows=settings.WRITE_BEHIND_FLUSH_ROWS,
+               flush_interval_ms=settings.WRITE_BEHIND_FLUSH_INTERVAL_MS,
+               max_buffer=settings.WRITE_BEHIND_MAX_BUFFER
+          )
+     return _buffer
+
+
+async def close_write_behind_buffer():
+     if _buffer is not None:
+          await _buffer.close()
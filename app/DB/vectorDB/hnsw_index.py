@@ -0,0 +1,350 @@
+from app.config.settings import settings
+from app.DB.vectorDB.local_index import VectorColumns, parse_synced_at, snapshot_lock, swap_snapshot, top_k
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import time
+import shutil
+import json
+import os
+
+
+class HnswVectorIndex:
+     """
+     In-process approximate vector index over product embeddings (hnswlib).
+
+     Graph labels are row positions in the shared VectorColumns store, so
+     filters are the same boolean masks the exact index uses. Replaced and
+     deleted products are tombstoned with mark_deleted; compact() rebuilds
+     the graph from live rows once tombstones pile up (outside the lock, so
+     searches and writes continue meanwhile), then snapshots the graph and
+     columns to disk. synced_at is the products-collection
+     watermark of the snapshot, as for LocalVectorIndex.
+
+     Searches walk the graph outside the lock, so they run concurrently
+     with each other and with writes (hnswlib allows add_items alongside
+     knn_query). The two graph operations hnswlib cannot run alongside are
+     coordinated explicitly: a resize waits for running searches, and
+     writes wait while save() serializes the graph.
+
+     Tuning: M (graph degree) and ef_construction trade build time and
+     memory for recall; ef_search trades query latency for recall and can
+     be changed at runtime. Highly selective filters are scored exactly,
+     since walking the graph for a handful of matching rows is wasted work.
+     """
+     EXACT_SCAN_ROWS = 4096
+     COMPACT_TOMBSTONE_RATIO = 0.2
+     REBUILD_CHUNK_ROWS = 50_000
+
+     def __init__(
+          self,
+          path: str,
+          m: int = 16,
+          ef_construction: int = 200,
+          ef_search: int = 64,
+          load: bool = True
+     ):
+          self.path = path
+          self.m = m
+          self.ef_construction = ef_construction
+          self.ef_search = ef_search
+          self._lock = threading.RLock()
+          self._idle = threading.Condition(self._lock)
+          self._searches = 0
+          self._resizing = False
+          self._saving = False
+          self.clear()
+          if load and os.path.exists(os.path.join(path, "meta.json")):
+               self.load()
+
+     def __len__(self) -> int:
+          return self.columns.live_count
+
+     def clear(self):
+          with self._lock:
+               self.dim: Optional[int] = None
+               self.vector_space: Optional[str] = None
+               self.synced_at: Optional[datetime] = None
+               self.columns = VectorColumns()
+               self._graph = None
+               self._unsaved_rows = 0
+               self._saved_at = time.monotonic()
+
+     def empty_copy(self) -> "HnswVectorIndex":
+          """Unloaded index writing to the same snapshot path, for rebuilds"""
+          return HnswVectorIndex(self.path, self.m, self.ef_construction, self.ef_search, load=False)
+
+     def _tombstone_ratio(self) -> float:
+          total = len(self.columns)
+          return (total - self.columns.live_count) / total if total else 0.0
+
+     def needs_compaction(self, min_rows: int, ratio: float, max_age_seconds: float) -> bool:
+          """
+          Unsaved adds / tombstones reached max(min_rows, ratio x live rows) or
+          are older than max_age_seconds, or tombstones (saved ones included)
+          exceed COMPACT_TOMBSTONE_RATIO of the graph.
+          """
+          with self._lock:
+               if self.dim is None:
+                    return False
+               if self._tombstone_ratio() > self.COMPACT_TOMBSTONE_RATIO:
+                    return True
+               if self._unsaved_rows == 0:
+                    return False
+               if self._unsaved_rows >= max(min_rows, ratio * self.columns.live_count):
+                    return True
+               return 0 < max_age_seconds <= time.monotonic() - self._saved_at
+
+     def _new_graph(self, dim: int, capacity: int):
+          import hnswlib
+          graph = hnswlib.Index(space="ip", dim=dim)
+          graph.init_index(max_elements=max(capacity, 1024), ef_construction=self.ef_construction, M=self.m)
+          graph.set_ef(self.ef_search)
+          return graph
+
+     def load(self):
+          import hnswlib
+          with open(os.path.join(self.path, "meta.json")) as f:
+               meta = json.load(f)
+          with self._lock:
+               self.dim = meta["dim"]
+               self.vector_space = meta.get("vector_space")
+               self.synced_at = parse_synced_at(meta)
+               self.columns = VectorColumns.load(self.path, meta["vocab"])
+               self._unsaved_rows = 0
+               self._saved_at = time.monotonic()
+               graph = hnswlib.Index(space="ip", dim=self.dim)
+               graph.load_index(os.path.join(self.path, "graph.bin"))
+               graph.set_ef(self.ef_search)
+               self._graph = graph
+
+     def set_ef(self, ef_search: int):
+          with self._lock:
+               self.ef_search = ef_search
+               if self._graph is not None:
+                    self._graph.set_ef(ef_search)
+
+     def _await_writable(self, new_rows: int = 0):
+          """
+          Called holding the lock before a graph write: waits out a save in
+          progress and, when the graph must grow to take `new_rows` more rows,
+          running searches. Searches arriving meanwhile queue behind the resize.
+          """
+          while True:
+               # Other writers may append while this one waits
+               capacity = len(self.columns) + new_rows
+               grow = capacity > self._graph.get_max_elements()
+               if not self._saving and not (grow and self._searches):
+                    break
+               if grow:
+                    self._resizing = True
+               self._idle.wait()
+          if grow:
+               self._graph.resize_index(max(capacity, 2 * self._graph.get_max_elements()))
+               self._resizing = False
+               self._idle.notify_all()
+
+     def upsert_many(self, docs: List[Dict]):
+          """Insert or replace products; each doc needs _id, embedding and filter fields"""
+          docs = [d for d in docs if d.get("embedding") is not None and len(d["embedding"])]
+          if not docs:
+               return
+          vectors = np.asarray([d["embedding"] for d in docs], dtype=np.float32)
+          with self._lock:
+               if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    self._graph = self._new_graph(self.dim, 2 * len(docs))
+               if vectors.shape[1] != self.dim:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+               # Grow first: rows must reach the graph as soon as they reach the columns
+               self._await_writable(len(docs))
+               replaced = [self.columns.row_of.get(str(d["_id"])) for d in docs]
+               rows = self.columns.append(docs)
+               for row in replaced:
+                    if row is not None:
+                         self._graph.mark_deleted(row)
+               self._graph.add_items(vectors, rows)
+               self._unsaved_rows += len(docs)
+
+     def upsert(self, doc: Dict):
+          self.upsert_many([doc])
+
+     def delete(self, product_id: str) -> bool:
+          with self._lock:
+               row = self.columns.row_of.get(str(product_id))
+               if row is None:
+                    return False
+               self._await_writable()
+               self.columns.delete(product_id)
+               self._graph.mark_deleted(row)
+               self._unsaved_rows += 1
+               return True
+
+     def delete_many(self, product_ids: List[str]) -> int:
+          with self._lock:
+               return sum(self.delete(product_id) for product_id in product_ids)
+
+     def _exact(self, graph, columns: VectorColumns, query: np.ndarray, mask: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+          """Score the rows in `mask` exactly: vectors are copied under the lock and scored outside it"""
+          with self._lock:
+               # Rows deleted since the mask was taken can no longer be read from the graph
+               rows = np.flatnonzero(mask & columns.alive[:len(mask)])
+               if len(rows) == 0:
+                    return rows, np.empty(0, dtype=np.float32)
+               vectors = np.asarray(graph.get_items(rows, return_type="numpy"), dtype=np.float32)
+          scores = vectors @ query
+          best = top_k(scores, limit)
+          return rows[best], scores[best]
+
+     def search(
+          self,
+          query_embedding: List[float],
+          limit: int = 10,
+          filters: Optional[Dict[str, Any]] = None,
+          min_score: float = 0.0
+     ) -> List[Tuple[str, float]]:
+          query = np.asarray(query_embedding, dtype=np.float32)
+          with self._lock:
+               while self._resizing:
+                    self._idle.wait()
+               if self.dim is None or self.columns.live_count == 0:
+                    return []
+               graph, columns = self._graph, self.columns
+               ids = columns.ids
+               mask = columns.filter_mask(filters)
+               matching = int(mask.sum())
+               if matching == 0:
+                    return []
+               k = min(limit, matching)
+               exact = bool(filters) and matching <= self.EXACT_SCAN_ROWS
+               if not exact:
+                    self._searches += 1
+
+          if exact:
+               labels, scores = self._exact(graph, columns, query, mask, k)
+          else:
+               try:
+                    # hnswlib searches with max(ef, k), so ef needs no per-query adjustment
+                    labels, distances = graph.knn_query(
+                         query, k=k, filter=(lambda label: label < len(mask) and bool(mask[label])) if filters else None
+                    )
+                    labels, scores = labels[0].astype(np.int64), 1.0 - distances[0]
+               except RuntimeError:
+                    # ef too small to collect k filtered neighbours
+                    labels = None
+               finally:
+                    with self._lock:
+                         self._searches -= 1
+                         self._idle.notify_all()
+               if labels is None:
+                    labels, scores = self._exact(graph, columns, query, mask, k)
+
+          # Rows added after the search started are not in `ids`
+          keep = (scores >= min_score) & (labels < len(ids))
+          return [(ids[label], float(score)) for label, score in zip(labels[keep], scores[keep])]
+
+     def save(self, vector_space: Optional[str] = None):
+          """
+          Snapshot the graph and columns, swapping the directory in atomically.
+          Only the capture takes the lock: searches continue during the write,
+          graph writes wait for it.
+          """
+          with self._lock:
+               if self.dim is None:
+                    return
+               while self._saving:
+                    self._idle.wait()
+               self._saving = True
+               self.vector_space = vector_space or self.vector_space
+               graph, columns = self._graph, self.columns
+               meta = {
+                    "dim": self.dim,
+                    "m": self.m,
+                    "ef_construction": self.ef_construction,
+                    "vocab": columns.vocab,
+                    "vector_space": self.vector_space,
+                    "synced_at": self.synced_at.isoformat() if self.synced_at else None
+               }
+          saved = False
+          try:
+               with snapshot_lock(self.path):
+                    tmp_path = f"{self.path}.tmp"
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    os.makedirs(tmp_path)
+                    graph.save_index(os.path.join(tmp_path, "graph.bin"))
+                    columns.save(tmp_path, np.ones(len(columns), dtype=bool))
+                    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                         json.dump(meta, f)
+                    swap_snapshot(tmp_path, self.path)
+               saved = True
+          finally:
+               with self._lock:
+                    if saved:
+                         self._unsaved_rows = 0
+                         self._saved_at = time.monotonic()
+                    self._saving = False
+                    self._idle.notify_all()
+
+     def compact(self, vector_space: Optional[str] = None):
+          """Rebuild the graph without tombstones when they exceed COMPACT_TOMBSTONE_RATIO, then save"""
+          with self._lock:
+               if self.dim is None:
+                    return
+               rebuild = self._tombstone_ratio() > self.COMPACT_TOMBSTONE_RATIO
+               if rebuild:
+                    old_graph, columns = self._graph, self.columns
+                    total = len(columns)
+                    live = np.flatnonzero(columns.alive)
+          if rebuild:
+               # Graph construction dominates; only reads of the old graph take the lock
+               graph = self._new_graph(self.dim, 2 * len(live))
+               dropped = np.zeros(len(live), dtype=bool)
+               for start in range(0, len(live), self.REBUILD_CHUNK_ROWS):
+                    rows = live[start:start + self.REBUILD_CHUNK_ROWS]
+                    with self._lock:
+                         # Rows deleted since the rebuild started can no longer be read
+                         alive = columns.alive[rows]
+                         vectors = np.zeros((len(rows), self.dim), dtype=np.float32)
+                         if alive.any():
+                              vectors[alive] = old_graph.get_items(rows[alive], return_type="numpy")
+                    labels = np.arange(start, start + len(rows))
+                    graph.add_items(vectors, labels)
+                    for label in labels[~alive]:
+                         graph.mark_deleted(int(label))
+                    dropped[labels[~alive]] = True
+               with self._lock:
+                    self._await_writable()
+                    if self._graph is old_graph:
+                         self._swap_rebuilt_graph(graph, live, total, dropped)
+          self.save(vector_space)
+
+     def _swap_rebuilt_graph(self, graph, live: np.ndarray, total: int, dropped: np.ndarray):
+          """Install a graph rebuilt from `live` rows, applying the writes made during the rebuild"""
+          added = np.arange(total, len(self.columns))
+          added = added[self.columns.alive[added]]
+          if len(added):
+               vectors = np.asarray(self._graph.get_items(added, return_type="numpy"), dtype=np.float32)
+               graph.resize_index(max(graph.get_max_elements(), len(live) + len(added)))
+               graph.add_items(vectors, np.arange(len(live), len(live) + len(added)))
+          for label in np.flatnonzero(~self.columns.alive[live] & ~dropped):
+               graph.mark_deleted(int(label))
+          self.columns = self.columns.take(np.concatenate([live, added]))
+          self._graph = graph
+
+
+_hnsw_index: Optional[HnswVectorIndex] = None
+
+
+def get_hnsw_vector_index() -> HnswVectorIndex:
+     """Process-wide HNSW index, opened from the snapshot on first use"""
+     global _hnsw_index
+     if _hnsw_index is None:
+          _hnsw_index = HnswVectorIndex(
+               settings.HNSW_INDEX_DIR,
+               m=settings.HNSW_M,
+               ef_construction=settings.HNSW_EF_CONSTRUCTION,
+               ef_search=settings.HNSW_EF_SEARCH
+          )
+     return _hnsw_index
@@ -0,0 +1,311 @@
+from app.DB.vectorDB.local_index import VectorColumns, top_k
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import asyncio
+import re
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Term-frequency weight per product field; names carry brand / SKU terms
+FIELD_WEIGHTS = {"name": 3.0, "features": 1.0, "description": 1.0}
+
+LEXICAL_PROJECTION = {
+     "_id": 1, "name": 1, "description": 1, "features": 1,
+     "category": 1, "status": 1, "price": 1, "averageRating": 1
+}
+
+
+def tokenize(text: str) -> List[str]:
+     return TOKEN_PATTERN.findall(text.lower())
+
+
+def _field_text(value) -> str:
+     if isinstance(value, (list, tuple)):
+          return " ".join(str(v) for v in value)
+     return str(value or "")
+
+
+class LexicalIndex:
+     """
+     In-process BM25 inverted index over product name, description and features.
+
+     Postings are frozen into CSR arrays (term -> slice of row ids and
+     precomputed BM25 term weights, so a query only multiplies by idf and
+     accumulates); products written since the last freeze() go to a small
+     dict-of-lists delta that is weighted on lookup. Rows, tombstones and
+     filter columns come from the same VectorColumns store as the vector
+     indexes, so filters behave identically.
+
+     Writes and searches run in worker threads. A search reads its query
+     terms' postings under the lock and scores outside it. freeze() sets
+     the delta aside (searches keep reading it) and merges it outside the
+     lock, then swaps the result in, so a search never sees half-merged
+     postings.
+
+     The initial build runs in a worker thread; product writes arriving
+     meanwhile (apply_upsert / apply_delete) are queued and replayed by
+     finish_build(), so none is lost.
+     """
+     K1 = 1.2
+     B = 0.75
+     FREEZE_ROWS = 5000
+
+     def __init__(self):
+          self.columns = VectorColumns()
+          self.doc_len = np.empty(0, dtype=np.float32)
+          self.built = False
+          self.building = False
+          self._pending: List[Tuple[str, Any]] = []
+          self._lock = threading.Lock()
+          # Guards the postings, columns and doc_len; held briefly, never while merging
+          self._state_lock = threading.Lock()
+          self._freeze_lock = threading.Lock()
+          self._terms: Dict[str, int] = {}
+          self._offsets = np.zeros(1, dtype=np.int64)
+          self._rows = np.empty(0, dtype=np.int32)
+          self._weights = np.empty(0, dtype=np.float32)
+          self._avg_len = 1.0
+          self._delta: Dict[str, Tuple[List[int], List[float]]] = {}
+          self._delta_rows = 0
+          # Delta being merged by a running freeze()
+          self._merging: Dict[str, Tuple[List[int], List[float]]] = {}
+
+     def __len__(self) -> int:
+          return self.columns.live_count
+
+     @staticmethod
+     def _term_counts(doc: Dict) -> Counter:
+          counts = Counter()
+          for field, weight in FIELD_WEIGHTS.items():
+               for token in tokenize(_field_text(doc.get(field))):
+                    counts[token] += weight
+          return counts
+
+     def upsert_many(self, docs: List[Dict]):
+          """Insert or replace products; the previous row of a replaced product is tombstoned"""
+          if not docs:
+               return
+          term_counts = [self._term_counts(doc) for doc in docs]
+          lengths = np.asarray([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+          with self._state_lock:
+               rows = self.columns.append(docs)
+               for row, counts in zip(rows, term_counts):
+                    for term, tf in counts.items():
+                         postings = self._delta.setdefault(term, ([], []))
+                         postings[0].append(int(row))
+                         postings[1].append(tf)
+               self.doc_len = np.concatenate([self.doc_len, lengths])
+               self._delta_rows += len(docs)
+               # A build freezes once in finish_build()
+               freeze = self._delta_rows >= self.FREEZE_ROWS and not self.building
+          if freeze and self._freeze_lock.acquire(blocking=False):
+               # Skipped while another writer's freeze is running; the next write retries
+               try:
+                    self._freeze()
+               finally:
+                    self._freeze_lock.release()
+
+     def upsert(self, doc: Dict):
+          self.upsert_many([doc])
+
+     def delete(self, product_id: str) -> bool:
+          with self._state_lock:
+               return self.columns.delete(product_id)
+
+     def apply_upsert(self, doc: Dict):
+          """Apply a product write; queued while the index is being built, ignored before"""
+          with self._lock:
+               if self.building:
+                    self._pending.append(("upsert", doc))
+                    return
+          if self.built:
+               self.upsert(doc)
+
+     def apply_delete(self, product_id: str):
+          with self._lock:
+               if self.building:
+                    self._pending.append(("delete", product_id))
+                    return
+          if self.built:
+               self.delete(product_id)
+
+     def begin_build(self):
+          with self._lock:
+               self.building = True
+               self._pending = []
+
+     def finish_build(self):
+          """Freeze the built postings, replay the writes queued during the build, and mark it built"""
+          self.freeze()
+          while True:
+               with self._lock:
+                    pending, self._pending = self._pending, []
+                    if not pending:
+                         self.building = False
+                         self.built = True
+                         return
+               for action, value in pending:
+                    if action == "upsert":
+                         self.upsert(value)
+                    else:
+                         self.delete(value)
+
+     def abort_build(self):
+          with self._lock:
+               self.building = False
+               self._pending = []
+
+     def freeze(self):
+          """Merge the delta into the CSR postings, dropping tombstoned rows and renumbering"""
+          with self._freeze_lock:
+               self._freeze()
+
+     def _freeze(self):
+          """
+          Called holding _freeze_lock. Merges the rows present when it starts;
+          rows written during the merge stay in the delta, renumbered, and
+          rows deleted during it stay tombstoned until the next freeze.
+          """
+          with self._state_lock:
+               frozen = (self._terms, self._offsets, self._rows, self._weights)
+               delta, self._merging, self._delta = self._delta, self._delta, {}
+               doc_len = self.doc_len
+               merged_rows = len(doc_len)
+               alive = self.columns.alive[:merged_rows].copy()
+
+          new_row = np.cumsum(alive, dtype=np.int64) - 1
+          avg_len = float(doc_len[alive].mean()) if alive.any() else 1.0
+          terms = set(frozen[0]) | set(delta)
+          merged_terms: Dict[str, int] = {}
+          row_parts, weight_parts, lengths = [], [], []
+          for term in terms:
+               rows, weights = self._postings(term, frozen, (delta,), doc_len, avg_len)
+               keep = alive[rows]
+               if not keep.any():
+                    continue
+               merged_terms[term] = len(lengths)
+               row_parts.append(new_row[rows[keep]].astype(np.int32))
+               weight_parts.append(weights[keep])
+               lengths.append(int(keep.sum()))
+          offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+          merged = np.concatenate(row_parts) if row_parts else np.empty(0, dtype=np.int32)
+          weights = np.concatenate(weight_parts) if weight_parts else np.empty(0, dtype=np.float32)
+
+          with self._state_lock:
+               added = len(self.columns) - merged_rows
+               keep = np.concatenate([alive, np.ones(added, dtype=bool)])
+               shift = int(alive.sum()) - merged_rows
+               self._terms = merged_terms
+               self._offsets = offsets
+               self._rows = merged
+               self._weights = weights
+               self._avg_len = avg_len or 1.0
+               self.doc_len = self.doc_len[keep]
+               self.columns = self.columns.take(keep)
+               self._delta = {term: ([row + shift for row in rows], tfs) for term, (rows, tfs) in self._delta.items()}
+               self._merging = {}
+               self._delta_rows = added
+
+     def _term_weights(self, tfs: np.ndarray, rows: np.ndarray, doc_len: np.ndarray, avg_len: float) -> np.ndarray:
+          """BM25 saturation / length normalization, without idf"""
+          norm = self.K1 * (1 - self.B + self.B * doc_len[rows] / avg_len)
+          return (tfs * (self.K1 + 1) / (tfs + norm)).astype(np.float32)
+
+     def _postings(
+          self,
+          term: str,
+          frozen: Tuple,
+          deltas: Tuple[Dict, ...],
+          doc_len: np.ndarray,
+          avg_len: float
+     ) -> Tuple[np.ndarray, np.ndarray]:
+          """(rows, weights) for a term: frozen (terms, offsets, rows, weights) postings plus the deltas, weighted against avg_len"""
+          terms, offsets, frozen_rows, frozen_weights = frozen
+          term_id = terms.get(term)
+          if term_id is None:
+               rows, weights = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+          else:
+               start, end = offsets[term_id], offsets[term_id + 1]
+               rows, weights = frozen_rows[start:end], frozen_weights[start:end]
+          for delta in deltas:
+               postings = delta.get(term)
+               if postings:
+                    delta_rows = np.asarray(postings[0], dtype=np.int32)
+                    delta_weights = self._term_weights(np.asarray(postings[1], dtype=np.float32), delta_rows, doc_len, avg_len)
+                    rows = np.concatenate([rows, delta_rows])
+                    weights = np.concatenate([weights, delta_weights])
+          return rows, weights
+
+     def search(
+          self,
+          query: str,
+          limit: int = 10,
+          filters: Optional[Dict[str, Any]] = None
+     ) -> List[Tuple[str, float]]:
+          with self._state_lock:
+               columns = self.columns
+               live = columns.live_count
+               if live == 0:
+                    return []
+               frozen = (self._terms, self._offsets, self._rows, self._weights)
+               # Frozen weights use the average length at the last freeze();
+               # df counts tombstoned rows until then. Both drift only slightly.
+               postings = [
+                    self._postings(term, frozen, (self._merging, self._delta), self.doc_len, self._avg_len)
+                    for term in set(tokenize(query))
+               ]
+
+          row_parts, weight_parts = [], []
+          for rows, weights in postings:
+               if len(rows) == 0:
+                    continue
+               df = len(rows)
+               row_parts.append(rows)
+               weight_parts.append(weights * np.float32(np.log1p((live - df + 0.5) / (df + 0.5))))
+          if not row_parts:
+               return []
+
+          rows = np.concatenate(row_parts)
+          weights = np.concatenate(weight_parts)
+          if len(rows) > len(columns) // 8:
+               # Long postings: dense accumulation beats sorting
+               dense = np.bincount(rows, weights=weights, minlength=len(columns))
+               rows = np.flatnonzero(dense)
+               scores = dense[rows].astype(np.float32)
+          else:
+               rows, inverse = np.unique(rows, return_inverse=True)
+               scores = np.bincount(inverse, weights=weights).astype(np.float32)
+          keep = columns.filter_mask(filters, rows)
+          rows, scores = rows[keep], scores[keep]
+          best = top_k(scores, limit)
+          return [(columns.ids[rows[i]], float(scores[i])) for i in best]
+
+
+async def build_lexical_index(index: LexicalIndex, collection, batch_size: int = 5000):
+     """Build the lexical index from every product in the collection, tokenizing off the event loop"""
+     index.begin_build()
+     try:
+          cursor = collection.find({}, LEXICAL_PROJECTION)
+          while True:
+               docs = await cursor.to_list(length=batch_size)
+               if not docs:
+                    break
+               await asyncio.to_thread(index.upsert_many, docs)
+          await asyncio.to_thread(index.finish_build)
+     except BaseException:
+          index.abort_build()
+          raise
+     print(f"Built LexicalIndex with {len(index)} products, {len(index._terms)} terms")
+
+
+_lexical_index: Optional[LexicalIndex] = None
+
+
+def get_lexical_index() -> LexicalIndex:
+     """Process-wide lexical index; built by ProductService on first search"""
+     global _lexical_index
+     if _lexical_index is None:
+          _lexical_index = LexicalIndex()
+     return _lexical_index
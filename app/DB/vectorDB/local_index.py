@@ -0,0 +1,432 @@
+from app.config.settings import settings
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import asyncio
+import shutil
+import fcntl
+import json
+import time
+import os
+
+FILTER_COLUMNS = ("category", "status", "price", "rating")
+
+
+def _enum_value(value) -> Optional[str]:
+     if value is None:
+          return None
+     return getattr(value, "value", value)
+
+
+class VectorColumns:
+     """
+     Columnar product store shared by the in-process index backends: ids,
+     per-row filter columns (category / status codes, price, rating) and an
+     alive mask. Rows are append-only; deletes and replaced rows are
+     tombstoned until the next compaction.
+     """
+     def __init__(self):
+          self.ids = np.empty(0, dtype=object)
+          self.category = np.empty(0, dtype=np.int16)
+          self.status = np.empty(0, dtype=np.int16)
+          self.price = np.empty(0, dtype=np.float32)
+          self.rating = np.empty(0, dtype=np.float32)
+          self.alive = np.empty(0, dtype=bool)
+          self.vocab: Dict[str, List[str]] = {"category": [], "status": []}
+          self.row_of: Dict[str, int] = {}
+
+     def __len__(self) -> int:
+          return len(self.ids)
+
+     @property
+     def live_count(self) -> int:
+          return int(self.alive.sum())
+
+     def code(self, column: str, value, add: bool = False) -> int:
+          value = _enum_value(value)
+          vocab = self.vocab[column]
+          if value in vocab:
+               return vocab.index(value)
+          if not add:
+               return -2  # matches nothing
+          vocab.append(value)
+          return len(vocab) - 1
+
+     def append(self, rows: List[Dict]) -> np.ndarray:
+          """Append rows ({_id, category, status, price, averageRating}); returns their positions"""
+          start = len(self.ids)
+          ids = [str(r["_id"]) for r in rows]
+          for product_id in ids:
+               old = self.row_of.get(product_id)
+               if old is not None:
+                    self.alive[old] = False
+          self.ids = np.concatenate([self.ids, np.array(ids, dtype=object)])
+          self.category = np.concatenate([self.category, np.array([self.code("category", r.get("category"), add=True) for r in rows], dtype=np.int16)])
+          self.status = np.concatenate([self.status, np.array([self.code("status", r.get("status"), add=True) for r in rows], dtype=np.int16)])
+          self.price = np.concatenate([self.price, np.array([r.get("price") or 0 for r in rows], dtype=np.float32)])
+          self.rating = np.concatenate([self.rating, np.array([r.get("averageRating") or 0 for r in rows], dtype=np.float32)])
+          self.alive = np.concatenate([self.alive, np.ones(len(rows), dtype=bool)])
+          for offset, product_id in enumerate(ids):
+               self.row_of[product_id] = start + offset
+          return np.arange(start, start + len(rows))
+
+     def delete(self, product_id: str) -> bool:
+          row = self.row_of.pop(str(product_id), None)
+          if row is None:
+               return False
+          self.alive[row] = False
+          return True
+
+     def filter_mask(self, filters: Optional[Dict[str, Any]], rows: Optional[np.ndarray] = None) -> np.ndarray:
+          """
+          Same semantics as the Atlas pipeline in ProductService.vector_search_products.
+          Evaluated over every row, or only over `rows` when given.
+          """
+          pick = (lambda column: column) if rows is None else (lambda column: column[rows])
+          mask = pick(self.alive).copy()
+          if not filters:
+               return mask
+          if "category" in filters:
+               mask &= pick(self.category) == self.code("category", filters["category"])
+          mask &= pick(self.status) == self.code("status", filters.get("status", "ACTIVE"))
+          if "price_range" in filters:
+               price = pick(self.price)
+               mask &= price >= filters["price_range"].get("min", 0)
+               mask &= price <= filters["price_range"].get("max", float("inf"))
+          if "min_rating" in filters:
+               mask &= pick(self.rating) >= filters["min_rating"]
+          return mask
+
+     def _index_rows(self):
+          self.row_of = {self.ids[i]: int(i) for i in np.flatnonzero(self.alive)}
+
+     def take(self, keep: np.ndarray) -> "VectorColumns":
+          """New columns holding only the selected rows, renumbered from 0"""
+          columns = VectorColumns()
+          columns.vocab = self.vocab
+          columns.ids = self.ids[keep]
+          for column in FILTER_COLUMNS:
+               setattr(columns, column, getattr(self, column)[keep])
+          columns.alive = self.alive[keep]
+          columns._index_rows()
+          return columns
+
+     def save(self, path: str, keep: np.ndarray):
+          np.save(os.path.join(path, "ids.npy"), self.ids[keep].astype(str))
+          np.save(os.path.join(path, "alive.npy"), self.alive[keep])
+          for column in FILTER_COLUMNS:
+               np.save(os.path.join(path, f"{column}.npy"), getattr(self, column)[keep])
+
+     @classmethod
+     def load(cls, path: str, vocab: Dict[str, List[str]]) -> "VectorColumns":
+          columns = cls()
+          columns.vocab = vocab
+          columns.ids = np.load(os.path.join(path, "ids.npy")).astype(object)
+          for column in FILTER_COLUMNS:
+               setattr(columns, column, np.load(os.path.join(path, f"{column}.npy")))
+          alive_path = os.path.join(path, "alive.npy")
+          if os.path.exists(alive_path):
+               columns.alive = np.load(alive_path)
+          else:
+               columns.alive = np.ones(len(columns.ids), dtype=bool)
+          columns._index_rows()
+          return columns
+
+
+@contextmanager
+def snapshot_lock(path: str):
+     """Serialize snapshot writes to path across worker processes"""
+     os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+     with open(f"{path}.lock", "w") as f:
+          fcntl.flock(f, fcntl.LOCK_EX)
+          try:
+               yield
+          finally:
+               fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def parse_synced_at(meta: Dict) -> Optional[datetime]:
+     """Collection watermark a snapshot was built / caught up to; None for snapshots that predate it"""
+     synced_at = meta.get("synced_at")
+     return datetime.fromisoformat(synced_at) if synced_at else None
+
+
+def swap_snapshot(tmp_path: str, path: str):
+     """Replace the snapshot directory at path with tmp_path"""
+     old_path = f"{path}.old"
+     shutil.rmtree(old_path, ignore_errors=True)
+     if os.path.exists(path):
+          os.rename(path, old_path)
+     os.rename(tmp_path, path)
+     shutil.rmtree(old_path, ignore_errors=True)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+     """Indices of the k highest scores, best first"""
+     if k <= 0 or len(scores) == 0:
+          return np.empty(0, dtype=np.int64)
+     if k < len(scores):
+          candidates = np.argpartition(-scores, k - 1)[:k]
+     else:
+          candidates = np.arange(len(scores))
+     return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class LocalVectorIndex:
+     """
+     In-process exact vector index over product embeddings.
+
+     The snapshot is a directory of .npy files: the float16/float32 vector
+     matrix (opened memory-mapped, so workers share the page cache) plus id
+     and filter columns. Upserts go to an in-memory delta matrix and
+     tombstone the old row; compact() merges everything into a new snapshot
+     once needs_compaction() says the delta or tombstones have grown.
+     Search is a blocked matrix-vector product over rows passing the filter
+     mask, followed by argpartition top-k.
+
+     synced_at is the products-collection watermark the snapshot reflects;
+     sync_index_from_collection() catches up with writes made since (by
+     other workers, or before a restart). Mutations hold the lock; search
+     only holds it while taking a consistent view of the arrays.
+     """
+     BLOCK_ROWS = 65536
+
+     def __init__(self, path: str, dtype: str = "float16", load: bool = True):
+          self.path = path
+          self.dtype = np.dtype(dtype)
+          self._lock = threading.RLock()
+          self.clear()
+          if load and os.path.exists(os.path.join(path, "meta.json")):
+               self.load()
+
+     def __len__(self) -> int:
+          return self.columns.live_count
+
+     def clear(self):
+          with self._lock:
+               self.dim: Optional[int] = None
+               self.vector_space: Optional[str] = None
+               self.synced_at: Optional[datetime] = None
+               self.columns = VectorColumns()
+               self._base = np.empty((0, 0), dtype=self.dtype)
+               self._delta: List[np.ndarray] = []
+               self._delta_matrix = None
+               self._saved_rows = 0
+               self._saved_at = time.monotonic()
+
+     def empty_copy(self) -> "LocalVectorIndex":
+          """Unloaded index writing to the same snapshot path, for rebuilds"""
+          return LocalVectorIndex(self.path, dtype=self.dtype.name, load=False)
+
+     def load(self):
+          with open(os.path.join(self.path, "meta.json")) as f:
+               meta = json.load(f)
+          base = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+          columns = VectorColumns.load(self.path, meta["vocab"])
+          with self._lock:
+               self.dim = meta["dim"]
+               self.vector_space = meta.get("vector_space")
+               self.synced_at = parse_synced_at(meta)
+               self._base = base
+               self.columns = columns
+               self._delta = []
+               self._delta_matrix = None
+               self._saved_rows = len(columns)
+               self._saved_at = time.monotonic()
+
+     @property
+     def unsaved_rows(self) -> int:
+          """Delta rows plus tombstoned snapshot rows, written since the snapshot"""
+          return len(self.columns) - self._saved_rows + int(self._saved_rows - self.columns.alive[:self._saved_rows].sum())
+
+     def needs_compaction(self, min_rows: int, ratio: float, max_age_seconds: float) -> bool:
+          """Unsaved rows reached max(min_rows, ratio x live rows), or are older than max_age_seconds"""
+          with self._lock:
+               if self.dim is None:
+                    return False
+               unsaved = self.unsaved_rows
+               if unsaved >= max(min_rows, ratio * self.columns.live_count):
+                    return True
+               return unsaved > 0 and 0 < max_age_seconds <= time.monotonic() - self._saved_at
+
+     def _vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+          if self._delta_matrix is None:
+               self._delta_matrix = np.concatenate(self._delta) if self._delta else np.empty((0, self.dim or 0), dtype=self.dtype)
+          return self._base, self._delta_matrix
+
+     def upsert_many(self, docs: List[Dict]):
+          """Insert or replace products; each doc needs _id, embedding and filter fields"""
+          docs = [d for d in docs if d.get("embedding") is not None and len(d["embedding"])]
+          if not docs:
+               return
+          vectors = np.asarray([d["embedding"] for d in docs], dtype=np.float32).astype(self.dtype)
+          with self._lock:
+               if self.dim is None:
+                    self.dim = vectors.shape[1]
+               if vectors.shape[1] != self.dim:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+               self.columns.append(docs)
+               self._delta.append(vectors)
+               self._delta_matrix = None
+
+     def upsert(self, doc: Dict):
+          self.upsert_many([doc])
+
+     def delete(self, product_id: str) -> bool:
+          with self._lock:
+               return self.columns.delete(product_id)
+
+     def delete_many(self, product_ids: List[str]) -> int:
+          with self._lock:
+               return sum(self.columns.delete(product_id) for product_id in product_ids)
+
+     def search(
+          self,
+          query_embedding: List[float],
+          limit: int = 10,
+          filters: Optional[Dict[str, Any]] = None,
+          min_score: float = 0.0
+     ) -> List[Tuple[str, float]]:
+          with self._lock:
+               # Upserts replace these arrays (and flip alive in place); score against a consistent view
+               if self.dim is None or len(self.columns) == 0:
+                    return []
+               mask = self.columns.filter_mask(filters)
+               ids = self.columns.ids
+               base, delta = self._vectors()
+          query = np.asarray(query_embedding, dtype=np.float32)
+          rows = np.flatnonzero(mask)
+          if len(rows) == 0:
+               return []
+
+          scores = np.empty(len(rows), dtype=np.float32)
+          base_rows = rows[rows < len(base)]
+          # Dense filters: scan contiguous blocks; sparse filters: gather only matching rows
+          if len(base_rows) > len(base) // 2:
+               full = np.empty(len(base), dtype=np.float32)
+               for start in range(0, len(base), self.BLOCK_ROWS):
+                    full[start:start + self.BLOCK_ROWS] = base[start:start + self.BLOCK_ROWS].astype(np.float32) @ query
+               scores[:len(base_rows)] = full[base_rows]
+          elif len(base_rows):
+               scores[:len(base_rows)] = base[base_rows].astype(np.float32) @ query
+          delta_rows = rows[len(base_rows):] - len(base)
+          if len(delta_rows):
+               scores[len(base_rows):] = delta[delta_rows].astype(np.float32) @ query
+
+          keep = scores >= min_score
+          rows, scores = rows[keep], scores[keep]
+          best = top_k(scores, limit)
+          return [(ids[rows[i]], float(scores[i])) for i in best]
+
+     def compact(self, vector_space: Optional[str] = None):
+          """Write live rows to a fresh snapshot and swap it in"""
+          with self._lock, snapshot_lock(self.path):
+               if self.dim is None:
+                    return
+               self._write_snapshot(vector_space)
+               self.load()
+
+     def _write_snapshot(self, vector_space: Optional[str]):
+          keep = self.columns.alive
+          base, delta = self._vectors()
+          tmp_path = f"{self.path}.tmp"
+          shutil.rmtree(tmp_path, ignore_errors=True)
+          os.makedirs(tmp_path)
+
+          out = np.lib.format.open_memmap(
+               os.path.join(tmp_path, "vectors.npy"), mode="w+", dtype=self.dtype, shape=(int(keep.sum()), self.dim)
+          )
+          written = 0
+          for matrix, alive in ((base, keep[:len(base)]), (delta, keep[len(base):])):
+               for start in range(0, len(matrix), self.BLOCK_ROWS):
+                    block = matrix[start:start + self.BLOCK_ROWS][alive[start:start + self.BLOCK_ROWS]]
+                    out[written:written + len(block)] = block
+                    written += len(block)
+          out.flush()
+          del out
+
+          self.columns.save(tmp_path, keep)
+          self.vector_space = vector_space or self.vector_space
+          with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+               json.dump({
+                    "dim": self.dim,
+                    "dtype": self.dtype.name,
+                    "vocab": self.columns.vocab,
+                    "vector_space": self.vector_space,
+                    "synced_at": self.synced_at.isoformat() if self.synced_at else None
+               }, f)
+
+          swap_snapshot(tmp_path, self.path)
+
+
+INDEX_PROJECTION = {"_id": 1, "embedding": 1, "category": 1, "status": 1, "price": 1, "averageRating": 1}
+
+# Re-read writes this far behind the watermark: clocks of the writing workers may differ
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+async def build_index_from_collection(index, collection, vector_space: Optional[str] = None, batch_size: int = 5000):
+     """
+     (Re)build an index from every product that has an embedding. The new
+     snapshot is built in a fresh index and then loaded into `index`, which
+     keeps serving its old contents meanwhile; writes made during the build
+     are after its watermark and picked up by the next sync.
+     """
+     started = datetime.utcnow()
+     fresh = index.empty_copy()
+     cursor = collection.find({"embedding": {"$exists": True, "$ne": None}}, INDEX_PROJECTION)
+     while True:
+          docs = await cursor.to_list(length=batch_size)
+          if not docs:
+               break
+          await asyncio.to_thread(fresh.upsert_many, docs)
+     fresh.synced_at = started
+     if fresh.dim is None:
+          index.clear()
+          index.synced_at = started
+     else:
+          await asyncio.to_thread(fresh.compact, vector_space)
+          await asyncio.to_thread(index.load)
+     print(f"Built {type(index).__name__} with {len(index)} products")
+
+
+async def sync_index_from_collection(index, collection, deletions, batch_size: int = 5000) -> int:
+     """
+     Apply products written and deleted since index.synced_at. Inserts store
+     updatedAt (the schema alias) while updates $set updated_at, so both are
+     matched. Returns the number of products applied.
+     """
+     started = datetime.utcnow()
+     since = index.synced_at - SYNC_OVERLAP
+     cursor = collection.find(
+          {
+               "embedding": {"$exists": True, "$ne": None},
+               "$or": [{"updated_at": {"$gte": since}}, {"updatedAt": {"$gte": since}}]
+          },
+          INDEX_PROJECTION
+     )
+     applied = 0
+     while True:
+          docs = await cursor.to_list(length=batch_size)
+          if not docs:
+               break
+          await asyncio.to_thread(index.upsert_many, docs)
+          applied += len(docs)
+     deleted = [str(doc["_id"]) async for doc in deletions.find({"deleted_at": {"$gte": since}}, {"_id": 1})]
+     if deleted:
+          applied += await asyncio.to_thread(index.delete_many, deleted)
+     index.synced_at = started
+     return applied
+
+
+_local_index: Optional[LocalVectorIndex] = None
+
+
+def get_local_vector_index() -> LocalVectorIndex:
+     """Process-wide local index, opened from the snapshot on first use"""
+     global _local_index
+     if _local_index is None:
+          _local_index = LocalVectorIndex(settings.LOCAL_INDEX_DIR, dtype=settings.LOCAL_INDEX_DTYPE)
+     return _local_index
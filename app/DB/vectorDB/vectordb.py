@@ -1,6 +1,7 @@
 from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models
 from app.utils.embedding.embedding import LocalEmbeddingService
+from app.utils.embedding.dimension_reduction import configured_embedding_dim
 
 class VectorDB:
      def __init__(self):
@@ -8,7 +9,7 @@ class VectorDB:
           self.collection_name = "Actyv_products"
           
           self.model = LocalEmbeddingService()
-          self.vector_size = 768 
+          self.vector_size = configured_embedding_dim()
 
      async def create_collection(self):
           await self.client.create_collection(
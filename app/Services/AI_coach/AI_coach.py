@@ -1,10 +1,6 @@
-from app.utils.file_handler.file_handler import FileHandler
 from app.config.settings import settings
-from app.modules.graph.builder import graph_builder
 from app.DB.mongodb.mongodb import MongoDB
-from langchain_core.messages import HumanMessage, AIMessage
-from langgraph.checkpoint.mongodb import MongoDBSaver
-from pymongo import MongoClient
+from functools import cached_property
 import base64
 import uuid
 from bson.objectid import ObjectId
@@ -12,12 +8,28 @@ from bson.objectid import ObjectId
 
 class AI_coach:
     def __init__(self):
-        self.file_handler = FileHandler()
-        self.client = MongoClient(settings.DATABASE_URL)
-        self.checkpointer = MongoDBSaver(self.client)
-        self.graph = graph_builder().compile(checkpointer=self.checkpointer)
         self.db = MongoDB()
 
+    # LangGraph, LangChain and the document loaders are imported on first
+    # use (or by the startup warm-up), so importing this module stays cheap
+
+    @cached_property
+    def file_handler(self):
+        from app.utils.file_handler.file_handler import FileHandler
+        return FileHandler()
+
+    @cached_property
+    def checkpointer(self):
+        # Motor-backed, so checkpoint I/O never blocks other streams on the event loop
+        from app.modules.graph.checkpointer import MotorCheckpointSaver
+        return MotorCheckpointSaver()
+
+    @cached_property
+    def graph(self):
+        # Compiled on the first chat, not on session listing or deletion
+        from app.modules.graph.builder import graph_builder
+        return graph_builder().compile(checkpointer=self.checkpointer)
+
     async def get_response(
         self,
         query: str,
@@ -29,6 +41,8 @@ class AI_coach:
         """
         Stream responses from the AI coach using LangGraph streaming
         """
+        from langchain_core.messages import HumanMessage, AIMessage
+
         # Generate session_id if not provided
         if not session_id:
             session_id = str(uuid.uuid4())
@@ -172,6 +186,12 @@ class AI_coach:
 
         except Exception as e:
             yield {"type": "error", "content": f"Error in graph execution: {str(e)}"}
+        finally:
+            # Also writes out what a failed or abandoned run left buffered
+            try:
+                await self.checkpointer.compact_thread(session_id)
+            except Exception as e:
+                print(f"Checkpoint compaction failed for {session_id}: {e}")
 
     async def get_chat_history(self, session_id: str, user_id: str):
         """Retrieve chat history for a session"""
@@ -182,5 +202,7 @@ class AI_coach:
         return await self.db.get_sessions(userId)
 
     async def delete_session(self, session_id: str, userId: str):
-        """Delete a session"""
-        await self.db.delete_session(session_id, userId)
\ No newline at end of file
+        """Delete a session, its messages and its LangGraph checkpoints"""
+        # Checkpoints carry no userId: only drop them once the session proved to be this user's
+        if await self.db.delete_session(session_id, userId):
+            await self.checkpointer.adelete_thread(session_id)
\ No newline at end of file
@@ -4,12 +4,12 @@ from pydantic import BaseModel
 from typing import Optional
 import json
 from .AI_coach import AI_coach
+from app.Services.container import provide
 from app.modules.auth.auth import verify_token
 from fastapi.encoders import jsonable_encoder
 
 
 router = APIRouter()
-ai_coach = AI_coach()
 
 
 class ChatResponse(BaseModel):
@@ -59,7 +59,8 @@ async def chat_with_file_endpoint(
      userId: str = Form(...),           # ✅ was a query param, breaks multipart requests
      query: str = Form(...),
      file: Optional[UploadFile] = File(None),
-     session_id: Optional[str] = Form(None)
+     session_id: Optional[str] = Form(None),
+     ai_coach: AI_coach = Depends(provide(AI_coach))
 ):
      file_bytes = None
      file_extension = None
@@ -90,7 +91,7 @@ async def chat_with_file_endpoint(
      )
 
 @router.get("/api/sessions")
-async def get_user_sessions(userId:str):
+async def get_user_sessions(userId:str, ai_coach: AI_coach = Depends(provide(AI_coach))):
      """
      Get all sessions for a user
 
@@ -110,7 +111,7 @@ async def get_user_sessions(userId:str):
 
 
 @router.get("/api/messages/{session_id}")
-async def get_session_messages(session_id: str, userId:str):
+async def get_session_messages(session_id: str, userId:str, ai_coach: AI_coach = Depends(provide(AI_coach))):
      """
      Get all messages for a session
 
@@ -130,7 +131,7 @@ async def get_session_messages(session_id: str, userId:str):
 
 
 @router.delete("/api/sessions/{session_id}")
-async def delete_session(session_id: str, userId:str):
+async def delete_session(session_id: str, userId:str, ai_coach: AI_coach = Depends(provide(AI_coach))):
      """
      Delete a session and all its messages
 
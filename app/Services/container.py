@@ -0,0 +1,33 @@
+from fastapi import Request
+from typing import Callable, Dict, Type, TypeVar
+
+T = TypeVar("T")
+
+
+class ServiceContainer:
+     """
+     App-scoped service singletons, created by the app lifespan.
+
+     Each service class is constructed on first use and then shared by
+     every request. Services keep their heavy members (models, API
+     clients, compiled graphs) lazy too, so constructing one is cheap and
+     an endpoint only pays for what it touches.
+     """
+     def __init__(self):
+          self._instances: Dict[type, object] = {}
+
+     def get(self, cls: Type[T]) -> T:
+          instance = self._instances.get(cls)
+          if instance is None:
+               instance = self._instances[cls] = cls()
+          return instance
+
+     def clear(self):
+          self._instances.clear()
+
+
+def provide(cls: Type[T]) -> Callable[[Request], T]:
+     """FastAPI dependency resolving `cls` from the app's container: Depends(provide(ProductService))"""
+     def dependency(request: Request) -> T:
+          return request.app.state.services.get(cls)
+     return dependency
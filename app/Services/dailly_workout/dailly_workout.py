@@ -1,4 +1,5 @@
 from openai import AsyncOpenAI
+from functools import cached_property
 from app.config.settings import settings
 from app.DB.mongodb.mongodb import MongoDB
 from app.prompt.prompt import Workout_system_prompt,Workout_user_prompt
@@ -7,9 +8,12 @@ from .daily_workout_schema import WorkoutSession
 
 class DailyWorkout:
      def __init__(self):
-          self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
           self.db = MongoDB()
 
+     @cached_property
+     def client(self) -> AsyncOpenAI:
+          return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
      async def get_prompt(self,userId:str):
           workout = await self.db.get_workout(userId)
           personal_setup = await self.db.get_personal_setup(userId)
@@ -1,13 +1,14 @@
 from fastapi import APIRouter,Depends
 from app.Services.dailly_workout.dailly_workout import DailyWorkout
+from app.Services.container import provide
 from app.Services.dailly_workout.daily_workout_schema import WorkoutSession
 
 router = APIRouter()
 
 
 @router.get("/daily_workout",response_model=WorkoutSession)
-async def get_daily_workout(userId:str):
+async def get_daily_workout(userId:str, daily_workout: DailyWorkout = Depends(provide(DailyWorkout))):
      try:
-          return await DailyWorkout().get_response(userId)
+          return await daily_workout.get_response(userId)
      except Exception as e:
           return e
\ No newline at end of file
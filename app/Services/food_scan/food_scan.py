@@ -1,5 +1,6 @@
 
 from openai import AsyncOpenAI
+from functools import cached_property
 from app.prompt.prompt import food_scan_system_prompt, food_scan_user_prompt
 from app.config.settings import settings
 from .food_scan_schema import FoodScanResponse
@@ -8,10 +9,9 @@ import json
 import base64
 
 class food_scan_service:
-     def __init__(self):
-          self.client = AsyncOpenAI(
-          api_key=settings.OPENAI_API_KEY
-          )
+     @cached_property
+     def client(self) -> AsyncOpenAI:
+          return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
      
      async def generate_response(self,food_image: bytes) -> str:
           try:
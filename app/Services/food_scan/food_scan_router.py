@@ -1,13 +1,17 @@
 from fastapi import APIRouter, File, UploadFile, Depends
 from app.Services.food_scan.food_scan import food_scan_service
+from app.Services.container import provide
 from app.modules.auth.auth import verify_token
 from fastapi import HTTPException
 
 router = APIRouter()
-food_scan_instance =food_scan_service()
 
 @router.post("/food-scan")
-async def food_scan(file: UploadFile = File(...),user: dict = Depends(verify_token)):
+async def food_scan(
+     file: UploadFile = File(...),
+     user: dict = Depends(verify_token),
+     food_scan_instance: food_scan_service = Depends(provide(food_scan_service))
+):
      try:
           if not user:
                raise HTTPException(status_code=401, detail="Unauthorized")
@@ -0,0 +1,69 @@
+from app.config.settings import settings
+from app.DB.mongodb.mongodb import MongoDB
+from app.Services.container import ServiceContainer
+from app.Services.AI_coach.AI_coach import AI_coach
+from app.Services.products.products import ProductService
+from app.utils.embedding.model_registry import get_shared_embedding_model
+from typing import Awaitable, Callable, Dict
+import asyncio
+import time
+
+
+class Readiness:
+     """
+     Warm-up progress of this process. Liveness only says the event loop
+     answers; readiness says the required components (database indexes)
+     are initialized. Optional components that fail to warm up are
+     reported but do not block readiness: they initialize on first use.
+     """
+     def __init__(self):
+          self.started_at = time.monotonic()
+          self.finished = False
+          self.components: Dict[str, Dict] = {}
+
+     async def run(self, name: str, step: Callable[[], Awaitable], required: bool = False):
+          self.components[name] = {"status": "warming", "required": required}
+          started = time.perf_counter()
+          try:
+               await step()
+               self.components[name]["status"] = "ready"
+          except Exception as e:
+               self.components[name].update(status="failed", error=str(e))
+               print(f"Warm-up of {name} failed: {e}")
+          self.components[name]["ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+     @property
+     def ready(self) -> bool:
+          return self.finished and all(
+               component["status"] == "ready"
+               for component in self.components.values()
+               if component["required"]
+          )
+
+     def report(self) -> Dict:
+          return {
+               "ready": self.ready,
+               "uptime_s": round(time.monotonic() - self.started_at, 1),
+               "components": self.components
+          }
+
+
+async def warm_up(services: ServiceContainer, readiness: Readiness):
+     """
+     Initialize the app after the server starts accepting connections.
+     With STARTUP_WARMUP off only the database indexes are created, and the
+     embedding model, search indexes and AI coach graph load on first use.
+     """
+     await readiness.run("mongo_indexes", MongoDB().init_indexes, required=True)
+     if settings.STARTUP_WARMUP:
+          # Heavy imports (torch, LangGraph) and model loads run off the event loop
+          if settings.EMBEDDING_WORKERS == 0:
+               await readiness.run(
+                    "embedding_model",
+                    lambda: asyncio.to_thread(lambda: get_shared_embedding_model().backend)
+               )
+          # Awaited on the loop, but snapshot loads, tokenizing and index builds inside run in threads
+          await readiness.run("search_indexes", services.get(ProductService).warm_up)
+          await readiness.run("ai_coach_graph", lambda: asyncio.to_thread(lambda: services.get(AI_coach).graph))
+     readiness.finished = True
+     print(f"Warm-up finished: {readiness.report()}")
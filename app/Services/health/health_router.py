@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+router = APIRouter()
+
+
+@router.get("/health/live")
+async def liveness():
+     """The process is up and its event loop responds; never touches dependencies"""
+     return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def readiness(request: Request):
+     """503 until the startup warm-up has initialized the required components"""
+     report = request.app.state.readiness.report()
+     return JSONResponse(report, status_code=200 if report["ready"] else 503)
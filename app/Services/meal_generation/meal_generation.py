@@ -1,4 +1,5 @@
 from openai import AsyncOpenAI
+from functools import cached_property
 from app. config.settings import settings
 from .meal_generation_schema import DailyMealLog
 from app.prompt.prompt import Meal_system_prompt,Meal_user_prompt
@@ -7,8 +8,11 @@ from app.DB.mongodb.mongodb import MongoDB
 
 class MealGeneration:
      def __init__(self):
-          self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
           self.db = MongoDB()
+
+     @cached_property
+     def client(self) -> AsyncOpenAI:
+          return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
      
      async def get_prompt(self,userId:str):
           personal_strategy_roadmap = await self.db.get_strategy_roadmap(userId)
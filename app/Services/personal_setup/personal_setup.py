@@ -4,6 +4,7 @@ from .personal_setup_schema import StrategyRoadmap
 from app.DB.mongodb.mongodb import MongoDB
 from app.config.settings import settings
 from datetime import datetime, timezone
+from functools import cached_property
 from bson.errors import InvalidId
 from fastapi import HTTPException
 from openai import AsyncOpenAI
@@ -17,14 +18,32 @@ class personalSetup:
      def __init__(self):
           self.mongodb = MongoDB()
           self.personal_collection = self.mongodb.personal_setup_collection
-          self.openai = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-          self.embedding_service = LocalEmbeddingService()
+
+     @cached_property
+     def openai(self) -> AsyncOpenAI:
+          return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+     @cached_property
+     def embedding_service(self) -> LocalEmbeddingService:
+          return LocalEmbeddingService()
      
 
+     async def _preference_fields(self, personal_setup: dict) -> dict:
+          """
+          Setup embedding stored alongside the setup, so uncached search never
+          re-embeds it (with the search cache on, search uses the bucket's vector)
+          """
+          embedding = await self.embedding_service.generate_preference_vector(personal_setup)
+          return {
+               "preference_embedding": embedding.tolist(),
+               "preference_model": self.embedding_service.vector_space
+          }
+
      async def create_personal_setup(self, userId: str, personal_setup: dict):
           try:
                now = datetime.now(timezone.utc) # Use UTC for consistency
                personal_setup_dict = personal_setup
+               personal_setup_dict.update(await self._preference_fields(personal_setup))
                
                personal_setup_dict["userId"] = ObjectId(userId)
                # Add timestamps here
@@ -40,7 +59,9 @@ class personalSetup:
                # 1. Convert string to ObjectId for the query
                oid = ObjectId(userId)
                
-               result = await self.personal_collection.find_one({"userId": oid})
+               result = await self.personal_collection.find_one(
+                    {"userId": oid}, {"preference_embedding": 0}
+               )
                
                if result:
                     result["_id"] = str(result["_id"])
@@ -54,6 +75,9 @@ class personalSetup:
                raise HTTPException(status_code=500, detail=str(e))
      async def update_personal_setup(self, userId: str, personal_setup: dict):
           try:
+               # Roadmap-only updates don't change the setup, so keep the stored vector
+               if set(personal_setup) - {"strategy_roadmap", "updatedAt"}:
+                    personal_setup.update(await self._preference_fields(personal_setup))
                personal_setup["updatedAt"] = datetime.now(timezone.utc)
                result = await self.personal_collection.update_one(
                     {"userId": ObjectId(userId)}, {"$set": personal_setup}
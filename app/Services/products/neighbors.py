@@ -0,0 +1,101 @@
+from pymongo import ReplaceOne
+from datetime import datetime
+from typing import Iterator, List, Tuple
+import numpy as np
+import asyncio
+
+
+def neighbor_blocks(
+     matrix: np.ndarray,
+     k: int,
+     block_rows: int = 512
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+     """
+     Exact top-k neighbors of every row of a unit-row matrix, excluding the
+     row itself, one block of rows at a time: each block costs one
+     (block_rows x n) matrix product, so memory stays at block_rows * n
+     scores. Yields (first row, neighbor rows, cosine scores), best first.
+     """
+     n = len(matrix)
+     k = min(k, n - 1)
+     for start in range(0, n, block_rows):
+          block = matrix[start:start + block_rows]
+          scores = block @ matrix.T
+          scores[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf
+          if k <= 0:
+               yield start, np.empty((len(block), 0), dtype=np.int64), np.empty((len(block), 0), dtype=np.float32)
+               continue
+          top = np.argpartition(scores, -k, axis=1)[:, -k:]
+          top_scores = np.take_along_axis(scores, top, axis=1)
+          order = np.argsort(-top_scores, axis=1, kind="stable")
+          yield start, np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def neighbor_entries(ids: List, rows: np.ndarray, scores: np.ndarray) -> List[dict]:
+     return [{"product_id": ids[row], "score": float(score)} for row, score in zip(rows, scores)]
+
+
+async def load_product_embeddings(collection, batch_size: int = 5000) -> Tuple[List, np.ndarray]:
+     """Ids and unit-normalized embeddings of every product with an embedding of the common dimension"""
+     ids, rows = [], []
+     cursor = collection.find({"embedding": {"$exists": True, "$ne": None}}, {"embedding": 1})
+     while True:
+          docs = await cursor.to_list(length=batch_size)
+          if not docs:
+               break
+          for doc in docs:
+               ids.append(doc["_id"])
+               rows.append(np.asarray(doc["embedding"], dtype=np.float32))
+     if not rows:
+          return [], np.empty((0, 0), dtype=np.float32)
+     dims = np.array([len(row) for row in rows])
+     dim = np.bincount(dims).argmax()
+     keep = np.flatnonzero(dims == dim)
+     matrix = np.stack([rows[i] for i in keep])
+     matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+     return [ids[i] for i in keep], matrix
+
+
+async def build_neighbor_table(
+     products_collection,
+     neighbors_collection,
+     vector_space: str,
+     k: int,
+     block_rows: int = 512
+) -> int:
+     """
+     Recompute the whole neighbor table: one document per product
+     ({_id, neighbors: [{product_id, score}], model, computed_at, stale}),
+     replacing every existing row. Rows of products that no longer exist
+     are removed. Returns the number of rows written.
+     """
+     started = datetime.utcnow()
+     ids, matrix = await load_product_embeddings(products_collection)
+     blocks = neighbor_blocks(matrix, k, block_rows)
+     written = 0
+     while True:
+          # Matrix products run off the event loop
+          block = await asyncio.to_thread(next, blocks, None)
+          if block is None:
+               break
+          start, rows, scores = block
+          computed_at = datetime.utcnow()
+          operations = [
+               ReplaceOne(
+                    {"_id": ids[start + i]},
+                    {
+                         "neighbors": neighbor_entries(ids, rows[i], scores[i]),
+                         "model": vector_space,
+                         "computed_at": computed_at,
+                         "stale": False
+                    },
+                    upsert=True
+               )
+               for i in range(len(rows))
+          ]
+          if operations:
+               await neighbors_collection.bulk_write(operations, ordered=False)
+               written += len(operations)
+     await neighbors_collection.delete_many({"computed_at": {"$lt": started}})
+     print(f"Built neighbor table: {written} products, top {k}")
+     return written
@@ -1,21 +1,108 @@
 # app/Services/products/products_service.py
-from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Optional, Dict, Any, Tuple
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import Awaitable, List, Optional, Dict, Any, Tuple
 from bson import ObjectId
+from bson.errors import InvalidId
 from app.config.settings import settings
 from app.Services.products.products_schema import Product
 from app.utils.embedding.embedding import LocalEmbeddingService
+from app.DB.vectorDB.local_index import get_local_vector_index, build_index_from_collection, sync_index_from_collection
+from app.DB.vectorDB.hnsw_index import get_hnsw_vector_index
+from app.DB.vectorDB.lexical_index import get_lexical_index, build_lexical_index
+from app.DB.mongodb.mongodb import PRODUCT_VECTOR_FILTER_FIELDS
+from app.DB.mongodb.client import get_motor_client
+from app.DB.mongodb.write_behind import get_write_behind_buffer
+from app.Services.products.rerank import score_candidates, ranked_prefix, annotate, mmr_select, profile_key
+from app.Services.products.search_cache import get_search_result_cache
+from app.Services.products.neighbors import build_neighbor_table
+from collections import OrderedDict
 import asyncio
+import math
+import time
+import numpy as np
 from datetime import datetime, timedelta
 
+PRODUCT_SEARCH_PROJECTION = {
+     "_id": 1,
+     "name": 1,
+     "category": 1,
+     "description": 1,
+     "price": 1,
+     "discount": 1,
+     "averageRating": 1,
+     "totalReview": 1,
+     "features": 1,
+     "tags": 1,
+     "created_at": 1,
+     "score": 1
+}
+
+# Top-ranked candidates per requested result that diversity selection chooses from
+RERANK_POOL_FACTOR = 4
+
+# Atlas caps numCandidates at 10000
+VECTOR_SEARCH_MAX_CANDIDATES = 10000
+
+# Minimum similarity for get_similar_products
+SIMILAR_MIN_SCORE = 0.5
+
+# Search stages whose degradation changes the candidates (those results aren't cached)
+RETRIEVAL_STAGES = ("embedding", "personalize", "vector_search", "lexical_search", "fuse")
+
+# Decayed counts below this are dropped from user profiles
+PROFILE_MIN_COUNT = 0.05
+
+IMPLICIT_SCORES = {
+     'purchase': 1.0,
+     'add_to_cart': 0.8,
+     'click': 0.5,
+     'view': 0.3
+}
+
+_index_build_lock = None
+# monotonic time of the last catch-up of the vector index with the collection; None until the first
+_index_synced_at = None
+_lexical_build_lock = None
+_vector_search_stats = {
+     "searches": 0,
+     "filtered": 0,
+     "requested": 0,
+     "returned": 0,
+     "underfilled": 0,
+     "rounds": 0
+}
+_similar_stats = {
+     "table": 0,
+     "live": 0
+}
+# Fire-and-forget tasks (search logging), referenced until they finish
+_background_tasks = set()
+# product id -> (expires_at, category), least recently used first
+_product_attribute_cache: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+
+
 class ProductService:
      def __init__(self):
-          self.client = AsyncIOMotorClient(settings.DATABASE_URL)
+          self.client = get_motor_client()
           self.db = self.client[settings.DATABASE_NAME]
           self.products_collection = self.db["products"]
           self.users_collection = self.db["users"]
+          self.personal_setup_collection = self.db["personalSetup"]
           self.interactions_collection = self.db["interactions"]  # For tracking
+          self.user_profiles_collection = self.db["userProfiles"]  # Materialized from interactions
+          self.product_neighbors_collection = self.db["productNeighbors"]  # Materialized similar products
+          self.product_deletions_collection = self.db["productDeletions"]  # Replayed by in-process indexes
           self.embedding_service = LocalEmbeddingService()
+          self.write_buffer = get_write_behind_buffer(self.db) if settings.WRITE_BEHIND_ENABLED else None
+          self.result_cache = get_search_result_cache() if settings.SEARCH_CACHE_ENABLED else None
+     
+     async def _write(self, collection, operations: List):
+          """Queue writes on the write-behind buffer, or write them now when it is disabled"""
+          if self.write_buffer is not None:
+               await self.write_buffer.add(collection.name, operations)
+          elif operations:
+               await collection.bulk_write(operations, ordered=False)
      
      async def create_product_with_embedding(self, product_data: dict) -> Product:
           """Create a product and generate its embedding"""
@@ -29,6 +116,10 @@ class ProductService:
                product.model_dump(by_alias=True, exclude={"id"})
           )
           product.id = result.inserted_id
+          await self._sync_search_indexes({**product.model_dump(by_alias=True), "_id": result.inserted_id})
+          self._catalog_changed()
+          if settings.NEIGHBOR_TABLE_ENABLED:
+               self._in_background(self._refresh_product_neighbors(result.inserted_id, product.embedding))
           
           return product
      
@@ -53,8 +144,62 @@ class ProductService:
                     "updated_at": datetime.utcnow()
                }}
           )
+          await self._sync_search_indexes({**product_exists, **product_data, "embedding": embedding.tolist()})
+          self._catalog_changed(product_id)
+          if settings.NEIGHBOR_TABLE_ENABLED:
+               # Serve live results until the row is recomputed
+               await self.product_neighbors_collection.update_one(
+                    {"_id": ObjectId(product_id)}, {"$set": {"stale": True}}
+               )
+               self._in_background(self._refresh_product_neighbors(ObjectId(product_id), embedding.tolist()))
           return True
      
+     async def reembed_all_products(self, chunk_size: int = 2048) -> Dict:
+          """
+          Re-embed the whole catalog chunk by chunk with length-bucketed
+          batches, so memory stays bounded regardless of catalog size.
+          """
+          cursor = self.products_collection.find({}, {"embedding": 0})
+          updated = 0
+          skipped = 0
+          while True:
+               docs = await cursor.to_list(length=chunk_size)
+               if not docs:
+                    break
+
+               ids, texts = [], []
+               for doc in docs:
+                    try:
+                         product = Product(**doc)
+                    except Exception:
+                         skipped += 1
+                         continue
+                    ids.append(doc["_id"])
+                    texts.append(await self.embedding_service.create_product_text(product))
+
+               async for embeddings in self.embedding_service.stream_embeddings_bucketed(texts, chunk_size=len(texts) or 1):
+                    operations = [
+                         UpdateOne({"_id": _id}, {"$set": {"embedding": embedding.tolist(), "updated_at": datetime.utcnow()}})
+                         for _id, embedding in zip(ids, embeddings)
+                    ]
+                    if operations:
+                         await self.products_collection.bulk_write(operations, ordered=False)
+                    updated += len(operations)
+
+          if self._uses_vector_index():
+               await build_index_from_collection(
+                    self._vector_index(), self.products_collection, self.embedding_service.vector_space
+               )
+
+          self._catalog_changed()
+          if settings.NEIGHBOR_TABLE_ENABLED:
+               await self.rebuild_neighbor_table()
+          return {
+               "updated": updated,
+               "skipped": skipped,
+               **self.embedding_service.get_stats()["bulk"]
+          }
+
      async def get_personal_setup(self, userId: str) -> Dict:
           """Get user's personal setup/preferences"""
           user = await self.users_collection.find_one({"_id": ObjectId(userId)})
@@ -85,7 +230,9 @@ class ProductService:
           limit: int = 10,
           filters: Optional[Dict[str, Any]] = None,
           use_personalization: bool = True,
-          min_score: float = 0.3
+          min_score: float = 0.3,
+          trace: Optional[Dict] = None,
+          expand: bool = False
      ) -> List[Dict]:
           """
           OPTIMIZED: Enhanced search with multiple strategies
@@ -95,25 +242,53 @@ class ProductService:
           2. User personalization
           3. Popularity signals
           4. Hybrid re-ranking
+          
+          Runs as a stage graph: the setup fetch, user history fetch and query
+          embedding start together; retrieval waits on setup and embedding,
+          re-ranking on retrieval and history; the search log is written after
+          the response. Each I/O stage has its own timeout and degrades
+          instead of failing the search. Pass `trace` to get per-stage
+          timings ("timings_ms") and degraded stages ("degraded").
+          
+          With `expand`, retrieval also searches the setup-specific query
+          variants from expand_query (see _search_candidates); their batched
+          embedding then starts once the setup is known.
           """
+          trace = self._new_trace(trace)
+          started = time.perf_counter()
+          candidates = limit * settings.SEARCH_CANDIDATE_MULTIPLIER  # Fetch more for re-ranking
           
-          # Get user preferences
-          personal_setup = await self.get_personal_setup(userId)
+          setup_stage = asyncio.create_task(self._run_stage(
+               trace, "setup", self.get_personal_setup(userId), settings.SEARCH_SETUP_TIMEOUT_MS, None
+          ))
+          history_stage = asyncio.create_task(self._run_stage(
+               trace, "history", self._get_user_history(userId), settings.SEARCH_HISTORY_TIMEOUT_MS, {}
+          ))
+          embedding_stage = None if expand else asyncio.create_task(self._run_stage(
+               trace, "embedding", self.embedding_service.generate_embedding(query),
+               settings.SEARCH_EMBEDDING_TIMEOUT_MS, None
+          ))
           
-          # Strategy 1: Main personalized search
-          main_results = await self._personalized_vector_search(
-               query=query,
-               setup=personal_setup,
-               limit=limit * 2,  # Fetch more for re-ranking
-               filters=filters,
-               min_score=min_score,
-               use_personalization=use_personalization
+          # Without a setup, search unpersonalized with the default setup
+          personal_setup = await setup_stage
+          if personal_setup is None:
+               personal_setup = self._get_default_setup()
+               use_personalization = False
+          
+          # Strategy 1: Main personalized search, with BM25 lexical retrieval
+          # running alongside and fused by reciprocal rank. Candidates are
+          # cached per query and preference bucket, before per-user stages.
+          main_results = await self._search_candidates(
+               userId, query, personal_setup, candidates, filters, min_score, use_personalization,
+               embedding_stage, trace, expand
           )
           
-          # Strategy 2: Get user's interaction history for personalization boost
-          user_history = await self._get_user_history(userId)
+          # Strategy 2: User's interaction history for personalization boost
+          # (empty, i.e. no boost, when the history stage degraded)
+          user_history = await history_stage
           
           # Strategy 3: Hybrid re-ranking
+          rerank_started = time.perf_counter()
           reranked_results = await self._hybrid_rerank(
                results=main_results,
                query=query,
@@ -122,70 +297,501 @@ class ProductService:
                limit=limit
           )
           
-          # Log search for analytics
-          await self._log_search(userId, query, len(reranked_results))
+          # Embeddings were only needed for diversity selection
+          for result in reranked_results:
+               result.pop("embedding", None)
+          trace["timings_ms"]["rerank"] = (time.perf_counter() - rerank_started) * 1000
+          
+          # Log search for analytics, off the response path
+          self._in_background(self._log_search(userId, query, len(reranked_results)))
           
+          trace["timings_ms"]["total"] = (time.perf_counter() - started) * 1000
           return reranked_results
      
-     async def _personalized_vector_search(
+     @staticmethod
+     def _new_trace(trace: Optional[Dict] = None) -> Dict:
+          trace = trace if trace is not None else {}
+          trace.setdefault("timings_ms", {})
+          trace.setdefault("degraded", {})
+          return trace
+     
+     @staticmethod
+     async def _run_stage(trace: Dict, name: str, awaitable, timeout_ms: float, fallback):
+          """Await one search stage, recording its time; on timeout or error return `fallback`"""
+          started = time.perf_counter()
+          try:
+               return await asyncio.wait_for(awaitable, timeout_ms / 1000)
+          except asyncio.TimeoutError:
+               trace["degraded"][name] = "timeout"
+               print(f"Search stage {name} timed out after {timeout_ms}ms")
+               return fallback
+          except Exception as e:
+               trace["degraded"][name] = "error"
+               print(f"Search stage {name} failed: {e}")
+               return fallback
+          finally:
+               trace["timings_ms"][name] = (time.perf_counter() - started) * 1000
+     
+     @staticmethod
+     def _in_background(coroutine):
+          """Run a fire-and-forget coroutine, keeping a reference until it finishes"""
+          task = asyncio.create_task(coroutine)
+          _background_tasks.add(task)
+          task.add_done_callback(_background_tasks.discard)
+          task.add_done_callback(
+               lambda t: t.cancelled() or t.exception() is None or print(f"Background task failed: {t.exception()}")
+          )
+     
+     @staticmethod
+     def _preference_bucket(setup: Dict, use_personalization: bool) -> str:
+          """
+          Coarse preference group whose members share cached search candidates.
+          Cached retrieval is personalized with the bucket's preference vector
+          (see _personalized_query_embeddings), never a single user's.
+          """
+          if not use_personalization or not setup:
+               return "none"
+          return f"{setup.get('fitnessGoal')}|{setup.get('fitnessLevel')}"
+     
+     async def _search_candidates(
           self,
+          userId: str,
           query: str,
           setup: Dict,
-          limit: int,
+          candidates: int,
           filters: Optional[Dict[str, Any]],
           min_score: float,
-          use_personalization: bool
+          use_personalization: bool,
+          embedding_stage: Optional[Awaitable] = None,
+          trace: Optional[Dict] = None,
+          expand: bool = False
      ) -> List[Dict]:
-          """Core vector search with personalization"""
+          """
+          Fused vector + lexical candidates with embeddings, from the result
+          cache when possible. `embedding_stage` is the already running query
+          embedding (None if it degraded); without a query vector only lexical
+          candidates are returned. Degraded results are not cached.
           
-          # Generate search embedding
-          if use_personalization and setup:
-               setup_text = await self.embedding_service.create_setup_text(setup)
-               query_embedding = await self.embedding_service.generate_weighted_search_vector(
-                    query_text=query,
-                    setup_text=setup_text
+          With `expand`, the query's expand_query variants are embedded in one
+          batch and searched concurrently, and every variant's hits are fused
+          with the lexical hits by reciprocal rank.
+          """
+          trace = self._new_trace(trace)
+          variants = await self.embedding_service.expand_query(query, setup) if expand else [query]
+          cache = self.result_cache
+          if cache is not None:
+               key = cache.key(
+                    " | ".join(variants), filters, self._preference_bucket(setup, use_personalization), candidates, min_score
+               )
+               cached = cache.get(key)
+               if cached is not None:
+                    trace["cache"] = "hit"
+                    if isinstance(embedding_stage, asyncio.Future):
+                         # Not needed; the batcher drops cancelled requests before encoding
+                         embedding_stage.cancel()
+                    return cached
+               version = cache.catalog_version
+          
+          if len(variants) > 1:
+               embedding_stage = self._run_stage(
+                    trace, "embedding", self.embedding_service.generate_embeddings_batch(variants),
+                    settings.SEARCH_EMBEDDING_TIMEOUT_MS, None
+               )
+          elif embedding_stage is None:
+               embedding_stage = self._run_stage(
+                    trace, "embedding", self.embedding_service.generate_embedding(query),
+                    settings.SEARCH_EMBEDDING_TIMEOUT_MS, None
+               )
+          query_vectors = await embedding_stage
+          if query_vectors is not None:
+               query_vectors = np.atleast_2d(query_vectors)
+               query_vector = query_vectors[0]
+          if cache is not None and query_vectors is not None:
+               cached = cache.get_similar(key, query_vector)
+               if cached is not None:
+                    trace["cache"] = "near_hit"
+                    return cached
+          
+          if query_vectors is not None:
+               query_embeddings = await self._run_stage(
+                    trace, "personalize",
+                    self._personalized_query_embeddings(
+                         userId, setup, use_personalization, query_vectors, bucket_level=cache is not None
+                    ),
+                    settings.SEARCH_SETUP_TIMEOUT_MS, [vector.tolist() for vector in query_vectors]
+               )
+               query_embedding = query_embeddings[0]
+               vector_stage = self._run_stage(
+                    trace, "vector_search",
+                    asyncio.gather(*(
+                         self.vector_search_products(
+                              query_embedding=embedding,
+                              limit=candidates,
+                              filters=filters,
+                              min_score=min_score,
+                              include_embedding=True
+                         )
+                         for embedding in query_embeddings
+                    )),
+                    settings.SEARCH_RETRIEVAL_TIMEOUT_MS, []
                )
           else:
-               # Pure query search without personalization
-               query_embedding = await self.embedding_service.generate_embedding(query)
-               query_embedding = query_embedding.tolist()
-          
-          return await self.vector_search_products(
-               query_embedding=query_embedding,
-               limit=limit,
-               filters=filters,
-               min_score=min_score
+               query_embedding = None
+               vector_stage = asyncio.sleep(0, [])
+          vector_lists, lexical_hits = await asyncio.gather(
+               vector_stage,
+               self._run_stage(
+                    trace, "lexical_search", self._lexical_search(query, candidates, filters),
+                    settings.SEARCH_RETRIEVAL_TIMEOUT_MS, []
+               )
+          )
+          results = await self._run_stage(
+               trace, "fuse",
+               self._fuse_results(vector_lists, lexical_hits, query_embedding, candidates),
+               settings.SEARCH_RETRIEVAL_TIMEOUT_MS, vector_lists[0] if vector_lists else []
           )
+          if cache is not None and not any(stage in trace["degraded"] for stage in RETRIEVAL_STAGES):
+               cache.put(key, query_vector, results, version)
+          return results
      
-     async def _get_user_history(self, userId: str, days: int = 90) -> Dict:
-          """Get user's interaction history for personalization"""
-          cutoff_date = datetime.utcnow() - timedelta(days=days)
+     async def get_preference_vector(self, userId: str, setup: Dict) -> np.ndarray:
+          """
+          User's stored setup embedding, written by personalSetup whenever the
+          setup changes. Falls back to embedding the setup (a cache hit for
+          repeated setups) when nothing usable is stored.
+
+          Only used with SEARCH_CACHE_ENABLED off: cached retrieval is shared
+          per preference bucket and embeds the bucket's setup instead.
+          """
+          try:
+               doc = await self.personal_setup_collection.find_one(
+                    {"userId": ObjectId(userId)},
+                    {"preference_embedding": 1, "preference_model": 1}
+               )
+          except InvalidId:
+               doc = None
+
+          if doc and doc.get("preference_embedding") and \
+               doc.get("preference_model") == self.embedding_service.vector_space:
+               return np.asarray(doc["preference_embedding"], dtype=np.float32)
+
+          return await self.embedding_service.generate_preference_vector(setup)
+
+     async def _personalized_query_embeddings(
+          self,
+          userId: str,
+          setup: Dict,
+          use_personalization: bool,
+          query_vectors,
+          bucket_level: bool = False
+     ) -> List[List[float]]:
+          """
+          Query vectors, each blended with the user's preference vector (fetched
+          once) when personalizing. With `bucket_level` the preference vector is
+          that of the user's _preference_bucket (goal and level only), so the
+          candidates can be cached for the whole bucket; per-user signals are
+          applied by the re-ranking.
+          """
+          if bucket_level and setup:
+               setup = {field: setup[field] for field in ("fitnessGoal", "fitnessLevel") if setup.get(field)}
+          if use_personalization and setup:
+               if bucket_level:
+                    preference_vector = await self.embedding_service.generate_preference_vector(setup)
+               else:
+                    preference_vector = await self.get_preference_vector(userId, setup)
+               return [
+                    self.embedding_service.combine_weighted_vectors(
+                         query_vector,
+                         preference_vector,
+                         query_weight=settings.PERSONALIZATION_QUERY_WEIGHT,
+                         setup_weight=settings.PERSONALIZATION_SETUP_WEIGHT
+                    ).tolist()
+                    for query_vector in query_vectors
+               ]
+          # Pure query search without personalization
+          return [np.asarray(query_vector).tolist() for query_vector in query_vectors]
+
+     async def _get_built_lexical_index(self):
+          """Lexical index, built from the products collection on first use"""
+          global _lexical_build_lock
+          index = get_lexical_index()
+          if not index.built:
+               if _lexical_build_lock is None:
+                    _lexical_build_lock = asyncio.Lock()
+               async with _lexical_build_lock:
+                    if not index.built:
+                         await build_lexical_index(index, self.products_collection)
+          return index
+
+     async def _lexical_search(
+          self,
+          query: str,
+          limit: int,
+          filters: Optional[Dict[str, Any]]
+     ) -> List[Tuple[str, float]]:
+          """BM25 hits as (product_id, score), best first"""
+          if not settings.LEXICAL_SEARCH_ENABLED:
+               return []
+          index = await self._get_built_lexical_index()
+          return await asyncio.to_thread(index.search, query, limit, filters)
+
+     async def _fuse_results(
+          self,
+          vector_lists: List[List[Dict]],
+          lexical_hits: List[Tuple[str, float]],
+          query_embedding: Optional[List[float]],
+          limit: int
+     ) -> List[Dict]:
+          """
+          Reciprocal rank fusion of one or more vector candidate lists (one
+          per query variant) and the lexical candidates. A product found by
+          several variants keeps its best vector score. Products only found
+          lexically are fetched with their embedding so they carry a real
+          vector similarity into _hybrid_rerank, like every other candidate
+          (without a query embedding they get no "score", i.e. a neutral one).
+          """
+          if not lexical_hits and len(vector_lists) <= 1:
+               return vector_lists[0] if vector_lists else []
+
+          k = settings.SEARCH_RRF_K
+          fused: Dict[str, float] = {}
+          by_id: Dict[str, Dict] = {}
+          for vector_results in vector_lists:
+               for rank, doc in enumerate(vector_results):
+                    product_id = str(doc["_id"])
+                    fused[product_id] = fused.get(product_id, 0.0) + 1.0 / (k + rank + 1)
+                    best = by_id.get(product_id)
+                    if best is None or doc.get("score", 0.0) > best.get("score", 0.0):
+                         by_id[product_id] = doc
+          lexical_scores = dict(lexical_hits)
+          for rank, (product_id, _) in enumerate(lexical_hits):
+               fused[product_id] = fused.get(product_id, 0.0) + 1.0 / (k + rank + 1)
+
+          missing = [ObjectId(product_id) for product_id in lexical_scores if product_id not in by_id]
+          if missing:
+               docs = await self.products_collection.find(
+                    {"_id": {"$in": missing}},
+                    {**PRODUCT_SEARCH_PROJECTION, "embedding": 1}
+               ).to_list(None)
+               query = None
+               if query_embedding is not None:
+                    query = np.asarray(query_embedding, dtype=np.float32)
+                    query /= max(np.linalg.norm(query), 1e-12)
+               for doc in docs:
+                    if query is not None:
+                         embedding = np.asarray(doc.get("embedding") or [], dtype=np.float32)
+                         if len(embedding) == len(query):
+                              doc["score"] = float(embedding @ query / max(np.linalg.norm(embedding), 1e-12))
+                         else:
+                              doc["score"] = 0.0
+                    by_id[str(doc["_id"])] = doc
+
+          for product_id, doc in by_id.items():
+               doc["fused_score"] = fused.get(product_id, 0.0)
+               if product_id in lexical_scores:
+                    doc["lexical_score"] = lexical_scores[product_id]
+          ranked = sorted(by_id.values(), key=lambda d: d["fused_score"], reverse=True)
+          return ranked[:limit]
+
+     async def _get_user_history(self, userId: str) -> Dict:
+          """
+          Get user's interaction history for personalization, from the
+          materialized profile kept up to date by log_product_interaction
+          """
+          profile = await self.user_profiles_collection.find_one(
+               {"userId": userId},
+               {"viewed_products": 1, "purchased_products": 1, "category_purchases": 1}
+          ) or {}
           
-          interactions = await self.interactions_collection.find({
-               "userId": userId,
-               "timestamp": {"$gte": cutoff_date}
-          }).to_list(None)
-          
-          # Aggregate by category and products
-          history = {
-               'viewed_products': set(),
-               'purchased_products': set(),
-               'favorite_categories': {},
-               'price_range': {'min': 0, 'max': float('inf')}
+          return {
+               'viewed_products': set(profile.get('viewed_products', [])),
+               'purchased_products': set(profile.get('purchased_products', [])),
+               'favorite_categories': profile.get('category_purchases', {})
           }
+     
+     def _user_profile_operations(
+          self,
+          userId: str,
+          product_id: str,
+          interaction_type: str,
+          category: Optional[str]
+     ) -> List[UpdateOne]:
+          """Writes folding one interaction into the user's profile (none for other interaction types)"""
+          now = datetime.utcnow()
+          if interaction_type == 'view':
+               field = "viewed_products"
+          elif interaction_type == 'purchase':
+               field = "purchased_products"
+          else:
+               return []
+          
+          # One pipeline update, so it is atomic: the product moves to the end
+          # of the list (most recent last) and the oldest entries beyond the
+          # cap fall off the front
+          cap = settings.USER_PROFILE_MAX_PRODUCTS
+          product = {"$literal": product_id}
+          fields = {
+               field: {"$slice": [{"$concatArrays": [
+                    {"$filter": {"input": {"$ifNull": [f"${field}", []]}, "cond": {"$ne": ["$$this", product]}}},
+                    [product]
+               ]}, -cap]},
+               "updated_at": now,
+               "decayed_at": {"$ifNull": ["$decayed_at", now]}
+          }
+          if interaction_type == 'purchase':
+               count = f"category_purchases.{profile_key(category)}"
+               fields[count] = {"$add": [{"$ifNull": [f"${count}", 0]}, 1]}
+          return [UpdateOne({"userId": userId}, [{"$set": fields}], upsert=True)]
+     
+     async def decay_user_profiles(self) -> int:
+          """
+          Periodic job: scale every profile's category counts by
+          0.5 ** (time since its last decay / USER_PROFILE_HALF_LIFE_DAYS),
+          drop counts that decayed away and re-apply the product set caps.
+          Runs server-side as one pipeline update; safe to run from several
+          workers since the factor depends on each profile's decayed_at.
+          """
+          now = datetime.utcnow()
+          half_life_ms = settings.USER_PROFILE_HALF_LIFE_DAYS * 86_400_000
+          cap = settings.USER_PROFILE_MAX_PRODUCTS
+          
+          def decayed(field: str) -> Dict:
+               return {"$arrayToObject": {"$filter": {
+                    "input": {"$map": {
+                         "input": {"$objectToArray": {"$ifNull": [f"${field}", {}]}},
+                         "in": {"k": "$$this.k", "v": {"$multiply": ["$$this.v", "$_decay"]}}
+                    }},
+                    "cond": {"$gte": ["$$this.v", PROFILE_MIN_COUNT]}
+               }}}
+          
+          result = await self.user_profiles_collection.update_many({}, [
+               {"$set": {"_decay": {"$pow": [0.5, {"$divide": [
+                    {"$subtract": [now, {"$ifNull": ["$decayed_at", now]}]}, half_life_ms
+               ]}]}}},
+               {"$set": {
+                    "category_purchases": decayed("category_purchases"),
+                    "viewed_products": {"$slice": [{"$ifNull": ["$viewed_products", []]}, -cap]},
+                    "purchased_products": {"$slice": [{"$ifNull": ["$purchased_products", []]}, -cap]},
+                    "decayed_at": now
+               }},
+               # price_histogram: no longer kept, dropped from older profiles
+               {"$unset": ["_decay", "price_histogram"]}
+          ])
+          return result.modified_count
+     
+     def _profile_pipeline(self, match: Dict, now: datetime) -> List[Dict]:
+          """
+          Aggregation folding interactions into one row per user: viewed and
+          purchased products ordered by last interaction (capped), and each
+          purchased product's category with its purchases weighted by age,
+          with the same half-life the decay job uses
+          """
+          half_life_ms = settings.USER_PROFILE_HALF_LIFE_DAYS * 86_400_000
+          cap = settings.USER_PROFILE_MAX_PRODUCTS
+          return [
+               {"$match": {**match, "interaction_type": {"$in": ["view", "purchase"]}}},
+               {"$group": {
+                    "_id": {"userId": "$userId", "type": "$interaction_type", "product_id": "$product_id"},
+                    "last": {"$max": "$timestamp"},
+                    "category": {"$last": "$category"},
+                    "weight": {"$sum": {"$pow": [0.5, {"$divide": [
+                         {"$subtract": [now, {"$ifNull": ["$timestamp", now]}]}, half_life_ms
+                    ]}]}}
+               }},
+               {"$sort": {"last": 1}},
+               {"$group": {
+                    "_id": {"userId": "$_id.userId", "type": "$_id.type"},
+                    "products": {"$push": {"$toString": "$_id.product_id"}},
+                    "categories": {"$push": {"k": "$category", "v": "$weight"}}
+               }},
+               {"$group": {
+                    "_id": "$_id.userId",
+                    "lists": {"$push": {
+                         "type": "$_id.type",
+                         "products": {"$slice": ["$products", -cap]},
+                         "categories": "$categories"
+                    }}
+               }}
+          ]
+     
+     @staticmethod
+     def _backfilled_profile(row: Dict, now: datetime) -> Dict:
+          """Profile fields from one _profile_pipeline row"""
+          profile = {"viewed_products": [], "purchased_products": [], "category_purchases": {}}
+          for entry in row["lists"]:
+               if entry["type"] == "view":
+                    profile["viewed_products"] = entry["products"]
+                    continue
+               profile["purchased_products"] = entry["products"]
+               counts = profile["category_purchases"]
+               for category in entry["categories"]:
+                    key = profile_key(category.get("k"))
+                    counts[key] = counts.get(key, 0) + category["v"]
+          profile["category_purchases"] = {
+               k: v for k, v in profile["category_purchases"].items() if v >= PROFILE_MIN_COUNT
+          }
+          return {**profile, "decayed_at": now, "updated_at": now}
+     
+     async def backfill_user_profiles(self, batch_size: int = 1000, retries: int = 3) -> int:
+          """
+          Rebuild every profile from the interactions collection, folded
+          server-side by _profile_pipeline from the interactions logged before
+          the run started.
+          
+          Live updates are kept: a profile that log_product_interaction updated
+          during the run is not overwritten (the conditional upsert then hits
+          the unique userId index). It is rebuilt again from all of its user's
+          interactions (the userId / timestamp index) and written only if its
+          updated_at has not moved meanwhile.
+          """
+          now = datetime.utcnow()
+          conflicts: List[str] = []
+          backfilled = 0
+          
+          async def flush(operations: List[Tuple[str, UpdateOne]]):
+               try:
+                    await self.user_profiles_collection.bulk_write([op for _, op in operations], ordered=False)
+               except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    if any(error["code"] != 11000 for error in errors):
+                         raise
+                    conflicts.extend(operations[error["index"]][0] for error in errors)
           
-          for interaction in interactions:
-               if interaction.get('interaction_type') == 'view':
-                    history['viewed_products'].add(str(interaction['product_id']))
-               elif interaction.get('interaction_type') == 'purchase':
-                    history['purchased_products'].add(str(interaction['product_id']))
-                    
-                    # Track category preferences
-                    category = interaction.get('category', 'unknown')
-                    history['favorite_categories'][category] = \
-                         history['favorite_categories'].get(category, 0) + 1
+          operations = []
+          cursor = self.interactions_collection.aggregate(
+               self._profile_pipeline({"timestamp": {"$lt": now}}, now), allowDiskUse=True
+          )
+          async for row in cursor:
+               backfilled += 1
+               operations.append((row["_id"], UpdateOne(
+                    {"userId": row["_id"], "updated_at": {"$not": {"$gte": now}}},
+                    {"$set": self._backfilled_profile(row, now)},
+                    upsert=True
+               )))
+               if len(operations) >= batch_size:
+                    await flush(operations)
+                    operations = []
+          if operations:
+               await flush(operations)
           
-          return history
+          for userId in conflicts:
+               for _ in range(retries):
+                    current = await self.user_profiles_collection.find_one({"userId": userId}, {"updated_at": 1})
+                    rebuilt_at = datetime.utcnow()
+                    rows = await self.interactions_collection.aggregate(
+                         self._profile_pipeline({"userId": userId}, rebuilt_at)
+                    ).to_list(length=1)
+                    if not rows:
+                         break
+                    result = await self.user_profiles_collection.update_one(
+                         {"userId": userId, "updated_at": (current or {}).get("updated_at")},
+                         {"$set": self._backfilled_profile(rows[0], rebuilt_at)}
+                    )
+                    if result.matched_count:
+                         break
+               else:
+                    print(f"Profile backfill skipped user {userId}: still being updated")
+          return backfilled
      
      async def _hybrid_rerank(
           self,
@@ -199,248 +805,283 @@ class ProductService:
           Re-rank results using hybrid signals:
           1. Vector similarity score (from initial search)
           2. Popularity score (rating, reviews)
-          3. Personalization score (category preference, price fit)
+          3. Personalization score (category preference, past purchases, fitness level)
           4. Freshness score (new products)
           5. Diversity (avoid too similar products)
           """
           
-          for result in results:
-               # Start with vector similarity score
-               vector_score = result.get('score', 0.5)
-               
-               # Popularity score (0-1)
-               popularity_score = self._calculate_popularity_score(result)
-               
-               # Personalization score (0-1)
-               personalization_score = self._calculate_personalization_score(
-                    result, setup, user_history
-               )
-               
-               # Freshness score (0-1)
-               freshness_score = self._calculate_freshness_score(result)
-               
-               # Combined score with weights
-               final_score = (
-                    0.50 * vector_score +        # Semantic relevance (most important)
-                    0.20 * popularity_score +    # Social proof
-                    0.20 * personalization_score +  # User fit
-                    0.10 * freshness_score       # Novelty
-               )
-               
-               result['final_score'] = final_score
-               result['score_breakdown'] = {
-                    'vector': vector_score,
-                    'popularity': popularity_score,
-                    'personalization': personalization_score,
-                    'freshness': freshness_score
-               }
+          # Signals are computed column-wise over all candidates at once
+          # (rerank.py); weights come from the RERANK_*_WEIGHT settings
+          signals = score_candidates(results, setup, user_history)
           
-          # Sort by final score
-          results.sort(key=lambda x: x['final_score'], reverse=True)
+          # Only the top of the ranking can make the page, so partition out
+          # the candidate pool for diversity selection instead of sorting all
+          order = ranked_prefix(signals["final"], limit * RERANK_POOL_FACTOR)
+          ranked = annotate(results, signals, order)
           
           # Apply diversity filter to avoid too many similar products
-          diverse_results = self._apply_diversity_filter(results, limit)
-          
-          return diverse_results
-     
-     def _calculate_popularity_score(self, product: Dict) -> float:
-          """Calculate popularity score from ratings and reviews"""
-          rating = product.get('averageRating', 0)
-          review_count = product.get('totalReview', 0)
-          
-          # Normalize rating (0-5 -> 0-1)
-          rating_score = rating / 5.0 if rating else 0.5
-          
-          # Review count score with logarithmic scaling
-          # More reviews = more reliable, but diminishing returns
-          review_score = min(np.log1p(review_count) / np.log1p(100), 1.0)
-          
-          # Weighted combination
-          return 0.7 * rating_score + 0.3 * review_score
-     
-     def _calculate_personalization_score(
-          self,
-          product: Dict,
-          setup: Dict,
-          user_history: Dict
-     ) -> float:
-          """Calculate how well product fits user preferences"""
-          score = 0.5  # Base score
-          
-          # Category preference boost
-          category = product.get('category', '')
-          if category in user_history.get('favorite_categories', {}):
-               category_freq = user_history['favorite_categories'][category]
-               score += min(category_freq * 0.1, 0.3)  # Up to +0.3
-          
-          # Avoid recently purchased products (reduce score)
-          product_id = str(product.get('_id', ''))
-          if product_id in user_history.get('purchased_products', set()):
-               score -= 0.4  # Significant penalty
-          
-          # Price fit (user's typical price range)
-          # This would require analyzing user's purchase history
-          # Simplified for now
-          
-          # Fitness level match (example for fitness products)
-          if 'tags' in product and setup.get('fitnessLevel'):
-               if setup['fitnessLevel'] in product.get('tags', []):
-                    score += 0.2
-          
-          return max(0.0, min(1.0, score))  # Clamp to [0, 1]
-     
-     def _calculate_freshness_score(self, product: Dict) -> float:
-          """Boost newer products slightly"""
-          created_at = product.get('created_at')
-          if not created_at:
-               return 0.5
-          
-          # Products created in last 30 days get boost
-          if isinstance(created_at, str):
-               created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-          
-          days_old = (datetime.utcnow() - created_at).days
-          
-          if days_old < 7:
-               return 1.0  # Very new
-          elif days_old < 30:
-               return 0.8  # Recent
-          elif days_old < 90:
-               return 0.6  # Moderately new
-          else:
-               return 0.4  # Older
+          return self._apply_diversity_filter(ranked, limit)
      
      def _apply_diversity_filter(
           self,
           results: List[Dict],
-          limit: int,
-          min_category_gap: int = 2
+          limit: int
      ) -> List[Dict]:
           """
-          Ensure diversity in results - don't show too many similar products
+          Ensure diversity in results - don't show too many similar products.
+          Maximal marginal relevance over the candidate embeddings (rerank.py)
+          on the top of the ranking, with at most 1/3 of the page per category.
           """
-          if len(results) <= limit:
-               return results
-          
-          diverse_results = []
-          category_counts = {}
-          last_category = None
-          consecutive_same = 0
-          
-          for result in results:
-               category = result.get('category', 'unknown')
-               
-               # Track consecutive products from same category
-               if category == last_category:
-                    consecutive_same += 1
-               else:
-                    consecutive_same = 0
-                    last_category = category
-               
-               # Skip if too many consecutive from same category
-               if consecutive_same >= min_category_gap:
-                    continue
-               
-               # Skip if category is over-represented
-               category_count = category_counts.get(category, 0)
-               max_per_category = max(2, limit // 3)  # At most 1/3 from one category
-               
-               if category_count >= max_per_category:
-                    continue
-               
-               diverse_results.append(result)
-               category_counts[category] = category_count + 1
-               
-               if len(diverse_results) >= limit:
-                    break
-          
-          # If we didn't get enough, fill with remaining results
-          if len(diverse_results) < limit:
-               for result in results:
-                    if result not in diverse_results:
-                         diverse_results.append(result)
-                         if len(diverse_results) >= limit:
-                              break
-          
-          return diverse_results[:limit]
+          pool = results[:limit * RERANK_POOL_FACTOR]
+          relevance = np.fromiter(
+               (r.get('final_score', r.get('score', 0.0)) for r in pool), dtype=np.float32, count=len(pool)
+          )
+          picks = mmr_select(
+               pool,
+               relevance,
+               limit,
+               mmr_lambda=settings.SEARCH_MMR_LAMBDA,
+               max_per_category=max(2, limit // 3)
+          )
+          return [pool[i] for i in picks]
+     
+     def _uses_vector_index(self) -> bool:
+          return settings.VECTOR_SEARCH_BACKEND != "atlas"
+
+     def _vector_index(self):
+          """In-process index selected by VECTOR_SEARCH_BACKEND"""
+          if settings.VECTOR_SEARCH_BACKEND == "hnsw":
+               return get_hnsw_vector_index()
+          return get_local_vector_index()
+
+     def _catalog_changed(self, product_id: Optional[str] = None):
+          """Drop cached search candidates and product attributes after a product write"""
+          if self.result_cache is not None:
+               self.result_cache.bump_catalog_version()
+          if product_id is not None:
+               _product_attribute_cache.pop(product_id, None)
      
+     async def _sync_search_indexes(self, product: Dict):
+          """Apply a product write to the in-process indexes"""
+          if self._uses_vector_index() and product.get("embedding") is not None:
+               # Off the loop: a compaction may hold the index lock
+               await asyncio.to_thread(self._vector_index().upsert, product)
+          # Tokenizing, and the periodic freeze(), stay off the loop too
+          await asyncio.to_thread(get_lexical_index().apply_upsert, product)
+
+     def _vector_index_stale(self, index) -> bool:
+          """
+          True when the index must be rebuilt rather than caught up: no snapshot,
+          one from before watermarks were recorded, one built for another
+          embedding space or dimension, or one older than the deletion log.
+          """
+          if index.synced_at is None:
+               return True
+          if index.dim is not None and (
+               index.vector_space != self.embedding_service.vector_space
+               or index.dim != self.embedding_service.dimension
+          ):
+               return True
+          return index.synced_at < datetime.utcnow() - timedelta(days=settings.PRODUCT_DELETION_LOG_DAYS)
+
+     async def _get_built_vector_index(self):
+          """
+          Index kept in step with the products collection: rebuilt when stale,
+          caught up from Mongo on first use in this process, then caught up and
+          compacted in the background every VECTOR_INDEX_SYNC_SECONDS.
+          """
+          global _index_build_lock, _index_synced_at
+          index = self._vector_index() if _index_synced_at is not None else None
+          if index is None or self._vector_index_stale(index):
+               if _index_build_lock is None:
+                    _index_build_lock = asyncio.Lock()
+               async with _index_build_lock:
+                    # Opening the snapshot reads its id / filter columns (and the HNSW graph): off the loop
+                    index = await asyncio.to_thread(self._vector_index)
+                    if self._vector_index_stale(index):
+                         await build_index_from_collection(
+                              index, self.products_collection, self.embedding_service.vector_space
+                         )
+                         _index_synced_at = time.monotonic()
+                    elif _index_synced_at is None:
+                         applied = await sync_index_from_collection(
+                              index, self.products_collection, self.product_deletions_collection
+                         )
+                         print(f"Caught up {type(index).__name__} with {applied} products written since its snapshot")
+                         _index_synced_at = time.monotonic()
+          elif time.monotonic() - _index_synced_at >= settings.VECTOR_INDEX_SYNC_SECONDS:
+               _index_synced_at = time.monotonic()
+               self._in_background(self._maintain_vector_index(index))
+          return index
+
+     async def _maintain_vector_index(self, index):
+          """Apply other workers' product writes, then snapshot once the delta has grown"""
+          try:
+               await sync_index_from_collection(index, self.products_collection, self.product_deletions_collection)
+               if index.needs_compaction(
+                    settings.VECTOR_INDEX_COMPACT_MIN_ROWS,
+                    settings.VECTOR_INDEX_COMPACT_RATIO,
+                    settings.VECTOR_INDEX_SNAPSHOT_SECONDS
+               ):
+                    await asyncio.to_thread(index.compact, self.embedding_service.vector_space)
+          except Exception as e:
+               print(f"Vector index maintenance failed: {e}")
+
+     async def warm_up(self):
+          """Build the in-process search indexes now instead of on the first search"""
+          if self._uses_vector_index():
+               await self._get_built_vector_index()
+          if settings.LEXICAL_SEARCH_ENABLED:
+               await self._get_built_lexical_index()
+
+     async def _index_vector_search(
+          self,
+          query_embedding: List[float],
+          limit: int,
+          filters: Optional[Dict[str, Any]],
+          min_score: float,
+          projection: Dict[str, int]
+     ) -> List[Dict]:
+          """Vector search against the in-process index, hydrated from Mongo"""
+          index = await self._get_built_vector_index()
+          hits = await asyncio.to_thread(index.search, query_embedding, limit, filters, min_score)
+          if not hits:
+               return []
+
+          scores = {product_id: score for product_id, score in hits}
+          docs = await self.products_collection.find(
+               {"_id": {"$in": [ObjectId(product_id) for product_id, _ in hits]}},
+               projection
+          ).to_list(None)
+          for doc in docs:
+               doc["score"] = scores[str(doc["_id"])]
+          docs.sort(key=lambda d: d["score"], reverse=True)
+          return docs
+
+     def _vector_search_conditions(self, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+          """Search filters as per-field Mongo conditions"""
+          if not filters:
+               return {}
+          conditions = {"status": filters.get("status", "ACTIVE")}
+          if "category" in filters:
+               conditions["category"] = filters["category"]
+          if "price_range" in filters:
+               price = {"$gte": filters["price_range"].get("min", 0)}
+               if filters["price_range"].get("max") not in (None, float("inf")):
+                    price["$lte"] = filters["price_range"]["max"]
+               conditions["price"] = price
+          if "min_rating" in filters:
+               conditions["averageRating"] = {"$gte": filters["min_rating"]}
+          return conditions
+
+     @staticmethod
+     def _vector_prefilter(conditions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+          """$vectorSearch.filter clause for conditions on indexed filter fields"""
+          clauses = [
+               {field: condition if isinstance(condition, dict) else {"$eq": condition}}
+               for field, condition in conditions.items()
+          ]
+          if not clauses:
+               return None
+          return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+     async def _atlas_vector_search(
+          self,
+          query_embedding: List[float],
+          limit: int,
+          filters: Optional[Dict[str, Any]],
+          min_score: float,
+          projection: Dict[str, int]
+     ) -> Tuple[List[Dict], int]:
+          """
+          $vectorSearch with indexed filters pushed into the search itself.
+          Conditions on fields the index doesn't declare are applied after
+          the search, over-fetching adaptively until `limit` results pass,
+          the best remaining scores fall under min_score, or numCandidates
+          hits its cap. Returns (results, rounds).
+          """
+          conditions = self._vector_search_conditions(filters)
+          prefilter = self._vector_prefilter(
+               {field: c for field, c in conditions.items() if field in PRODUCT_VECTOR_FILTER_FIELDS}
+          )
+          postfilter = {field: c for field, c in conditions.items() if field not in PRODUCT_VECTOR_FILTER_FIELDS}
+          multiplier = settings.VECTOR_SEARCH_NUM_CANDIDATES_MULTIPLIER
+
+          fetch = limit
+          rounds = 0
+          while True:
+               rounds += 1
+               num_candidates = min(fetch * multiplier, VECTOR_SEARCH_MAX_CANDIDATES)
+               fetch = min(fetch, num_candidates)
+               search = {
+                    "index": "product_vector_index",
+                    "path": "embedding",
+                    "queryVector": query_embedding,
+                    "numCandidates": num_candidates,
+                    "limit": fetch
+               }
+               if prefilter:
+                    search["filter"] = prefilter
+               pipeline = [
+                    {"$vectorSearch": search},
+                    {"$addFields": {"score": {"$meta": "vectorSearchScore"}}}
+               ]
+               if postfilter:
+                    pipeline.append({"$match": postfilter})
+               pipeline.append({"$project": projection})
+               matched = await self.products_collection.aggregate(pipeline).to_list(None)
+
+               results = [doc for doc in matched if doc["score"] >= min_score]
+               exhausted = len(results) < len(matched) or num_candidates >= VECTOR_SEARCH_MAX_CANDIDATES
+               if not postfilter or len(results) >= limit or exhausted:
+                    return results[:limit], rounds
+               # Grow by the observed pass rate of the post-filter, at least doubling
+               pass_rate = max(len(matched), 1) / fetch
+               fetch = max(fetch * 2, math.ceil(limit / pass_rate * 1.2))
+
      async def vector_search_products(
           self,
           query_embedding: List[float],
           limit: int = 10,
           filters: Optional[Dict[str, Any]] = None,
-          min_score: float = 0.3
+          min_score: float = 0.3,
+          include_embedding: bool = False
      ) -> List[Dict]:
-          """Core vector search (your existing implementation)"""
-          
-          pipeline = [
-               {
-                    "$vectorSearch": {
-                         "index": "product_vector_index",
-                         "path": "embedding",
-                         "queryVector": query_embedding,
-                         "numCandidates": limit * 10,
-                         "limit": limit
-                    }
-               },
-               {
-                    "$addFields": {
-                         "score": {"$meta": "vectorSearchScore"}
-                    }
-               }
-          ]
-          
-          # Apply filters
-          if filters:
-               match_conditions = {}
-               
-               if "category" in filters:
-                    match_conditions["category"] = filters["category"]
-               
-               if "status" in filters:
-                    match_conditions["status"] = filters["status"]
-               else:
-                    match_conditions["status"] = "ACTIVE"
-               
-               if "price_range" in filters:
-                    match_conditions["price"] = {
-                         "$gte": filters["price_range"].get("min", 0),
-                         "$lte": filters["price_range"].get("max", float('inf'))
-                    }
-               
-               if "min_rating" in filters:
-                    match_conditions["averageRating"] = {"$gte": filters["min_rating"]}
-               
-               if match_conditions:
-                    pipeline.append({"$match": match_conditions})
-          
-          # Min score filter
-          pipeline.append({
-               "$match": {
-                    "score": {"$gte": min_score}
-               }
-          })
-          
-          # Project fields
-          pipeline.append({
-               "$project": {
-                    "_id": 1,
-                    "name": 1,
-                    "category": 1,
-                    "description": 1,
-                    "price": 1,
-                    "discount": 1,
-                    "averageRating": 1,
-                    "totalReview": 1,
-                    "features": 1,
-                    "tags": 1,
-                    "created_at": 1,
-                    "score": 1
-               }
-          })
-          
-          results = await self.products_collection.aggregate(pipeline).to_list(None)
+          """
+          Core vector search against the configured backend. include_embedding
+          keeps each product's embedding on the result (for diversity selection);
+          callers strip it before responding.
+          """
+          projection = {**PRODUCT_SEARCH_PROJECTION, "embedding": 1} if include_embedding else PRODUCT_SEARCH_PROJECTION
+          if self._uses_vector_index():
+               results = await self._index_vector_search(query_embedding, limit, filters, min_score, projection)
+               rounds = 1
+          else:
+               results, rounds = await self._atlas_vector_search(query_embedding, limit, filters, min_score, projection)
+
+          _vector_search_stats["searches"] += 1
+          _vector_search_stats["filtered"] += bool(filters)
+          _vector_search_stats["requested"] += limit
+          _vector_search_stats["returned"] += len(results)
+          _vector_search_stats["underfilled"] += len(results) < limit
+          _vector_search_stats["rounds"] += rounds
           return results
+
+     def get_search_stats(self) -> Dict:
+          """Filled-vs-requested ratios for tuning VECTOR_SEARCH_NUM_CANDIDATES_MULTIPLIER"""
+          stats = dict(_vector_search_stats)
+          searches = max(stats["searches"], 1)
+          stats["fill_ratio"] = stats["returned"] / max(stats["requested"], 1)
+          stats["underfilled_ratio"] = stats["underfilled"] / searches
+          stats["avg_rounds"] = stats["rounds"] / searches
+          stats["backend"] = settings.VECTOR_SEARCH_BACKEND
+          return {
+               "vector_search": stats,
+               "embedding": self.embedding_service.get_stats(),
+               "write_behind": self.write_buffer.get_stats() if self.write_buffer is not None else None,
+               "result_cache": self.result_cache.get_stats() if self.result_cache is not None else None,
+               "similar_products": dict(_similar_stats)
+          }
      
      async def get_similar_products(
           self,
@@ -448,7 +1089,17 @@ class ProductService:
           limit: int = 5,
           exclude_same_exact: bool = True
      ) -> List[Dict]:
-          """Find similar products based on a given product"""
+          """
+          Find similar products based on a given product: served from the
+          materialized neighbor table, or by live vector search (which also
+          refreshes the row) when the product's row is missing or stale
+          """
+          if settings.NEIGHBOR_TABLE_ENABLED:
+               similar = await self._similar_from_neighbor_table(product_id, limit)
+               if similar is not None:
+                    _similar_stats["table"] += 1
+                    return similar
+          _similar_stats["live"] += 1
           
           product_data = await self.products_collection.find_one({"_id": ObjectId(product_id)})
           if not product_data or not product_data.get("embedding"):
@@ -457,23 +1108,161 @@ class ProductService:
           results = await self.vector_search_products(
                query_embedding=product_data["embedding"],
                limit=limit + 1,
-               min_score=0.5  # Higher threshold for similarity
+               min_score=SIMILAR_MIN_SCORE  # Higher threshold for similarity
           )
+          if settings.NEIGHBOR_TABLE_ENABLED:
+               self._in_background(self._refresh_product_neighbors(product_data["_id"], product_data["embedding"]))
           
           # Exclude the source product
           filtered = [r for r in results if str(r["_id"]) != product_id]
           
           return filtered[:limit]
      
+     def _neighbor_row_stale(self, row: Dict) -> bool:
+          if row.get("stale") or row.get("model") != self.embedding_service.vector_space:
+               return True
+          max_age = settings.NEIGHBOR_TABLE_MAX_AGE_HOURS
+          return bool(max_age) and row["computed_at"] < datetime.utcnow() - timedelta(hours=max_age)
+     
+     async def _similar_from_neighbor_table(self, product_id: str, limit: int) -> Optional[List[Dict]]:
+          """
+          Similar products from the product's neighbor row, joined with the
+          neighbors' product fields in one query; None when the row is missing
+          or stale, or deleted neighbors leave it short
+          """
+          projection = {field: 1 for field in PRODUCT_SEARCH_PROJECTION if field != "score"}
+          rows = await self.product_neighbors_collection.aggregate([
+               {"$match": {"_id": ObjectId(product_id)}},
+               {"$lookup": {
+                    "from": self.products_collection.name,
+                    "localField": "neighbors.product_id",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": projection}],
+                    "as": "products"
+               }}
+          ]).to_list(1)
+          if not rows or self._neighbor_row_stale(rows[0]):
+               return None
+          
+          products = {doc["_id"]: doc for doc in rows[0]["products"]}
+          similar, missing = [], False
+          for neighbor in rows[0]["neighbors"]:
+               if neighbor["score"] < SIMILAR_MIN_SCORE or len(similar) == limit:
+                    break
+               product = products.get(neighbor["product_id"])
+               if product is None:
+                    missing = True
+                    continue
+               similar.append({**product, "score": neighbor["score"]})
+          if missing and len(similar) < limit:
+               return None
+          return similar
+     
+     async def _refresh_product_neighbors(self, product_id: ObjectId, embedding: List[float]):
+          """
+          Incremental neighbor table update for a new or re-embedded product:
+          its own row from a live vector search (exact cosine over the
+          returned embeddings), its old entries removed from other rows and
+          its new score pushed into each neighbor's row (kept sorted, capped
+          at NEIGHBOR_TABLE_K). Products that would newly list it but are not
+          among its own neighbors pick it up at the next rebuild.
+          """
+          k = settings.NEIGHBOR_TABLE_K
+          vector_space = self.embedding_service.vector_space
+          query = np.asarray(embedding, dtype=np.float32)
+          query /= max(np.linalg.norm(query), 1e-12)
+          results = await self.vector_search_products(
+               query_embedding=list(embedding), limit=k + 1, min_score=-1.0, include_embedding=True
+          )
+          
+          neighbors = []
+          for result in results:
+               vector = np.asarray(result.get("embedding") or [], dtype=np.float32)
+               if result["_id"] == product_id or len(vector) != len(query):
+                    continue
+               score = float(vector @ query / max(np.linalg.norm(vector), 1e-12))
+               neighbors.append({"product_id": result["_id"], "score": score})
+          neighbors = sorted(neighbors, key=lambda n: n["score"], reverse=True)[:k]
+          
+          operations = [
+               UpdateMany({"neighbors.product_id": product_id}, {"$pull": {"neighbors": {"product_id": product_id}}}),
+               ReplaceOne(
+                    {"_id": product_id},
+                    {"neighbors": neighbors, "model": vector_space, "computed_at": datetime.utcnow(), "stale": False},
+                    upsert=True
+               )
+          ]
+          operations.extend(
+               UpdateOne(
+                    {"_id": neighbor["product_id"], "model": vector_space},
+                    {"$push": {"neighbors": {
+                         "$each": [{"product_id": product_id, "score": neighbor["score"]}],
+                         "$sort": {"score": -1},
+                         "$slice": k
+                    }}}
+               )
+               for neighbor in neighbors
+          )
+          await self.product_neighbors_collection.bulk_write(operations, ordered=True)
+     
+     async def _drop_product_neighbors(self, product_id: ObjectId):
+          """Remove a deleted product's row and its entries in other rows"""
+          await self.product_neighbors_collection.bulk_write([
+               DeleteOne({"_id": product_id}),
+               UpdateMany({"neighbors.product_id": product_id}, {"$pull": {"neighbors": {"product_id": product_id}}})
+          ], ordered=False)
+     
+     async def rebuild_neighbor_table(self) -> int:
+          """Batch job: recompute every product's top NEIGHBOR_TABLE_K neighbors (see neighbors.build_neighbor_table)"""
+          return await build_neighbor_table(
+               self.products_collection,
+               self.product_neighbors_collection,
+               self.embedding_service.vector_space,
+               settings.NEIGHBOR_TABLE_K,
+               settings.NEIGHBOR_TABLE_BLOCK_ROWS
+          )
+     
      async def _log_search(self, userId: str, query: str, result_count: int):
           """Log search for analytics and improvement"""
-          await self.interactions_collection.insert_one({
+          await self._write(self.interactions_collection, [InsertOne({
                "userId": userId,
                "interaction_type": "search",
                "query": query,
                "result_count": result_count,
                "timestamp": datetime.utcnow()
-          })
+          })])
+     
+     async def _product_attributes(self, product_ids: List[str]) -> Dict[str, Optional[str]]:
+          """Category per product id, from the local cache or one $in query for the misses"""
+          now = time.monotonic()
+          attributes, misses = {}, []
+          for product_id in set(product_ids):
+               cached = _product_attribute_cache.get(product_id)
+               if cached and cached[0] > now:
+                    _product_attribute_cache.move_to_end(product_id)
+                    attributes[product_id] = cached[1]
+               else:
+                    misses.append(product_id)
+          
+          object_ids = []
+          for product_id in misses:
+               try:
+                    object_ids.append(ObjectId(product_id))
+               except InvalidId:
+                    attributes[product_id] = None
+          if object_ids:
+               found = {
+                    str(doc["_id"]): doc.get("category")
+                    async for doc in self.products_collection.find({"_id": {"$in": object_ids}}, {"category": 1})
+               }
+               expires = now + settings.PRODUCT_ATTRIBUTE_CACHE_TTL
+               for object_id in object_ids:
+                    product_id = str(object_id)
+                    attributes[product_id] = found.get(product_id)
+                    _product_attribute_cache[product_id] = (expires, attributes[product_id])
+               while len(_product_attribute_cache) > settings.PRODUCT_ATTRIBUTE_CACHE_SIZE:
+                    _product_attribute_cache.popitem(last=False)
+          return attributes
      
      async def log_product_interaction(
           self,
@@ -483,27 +1272,42 @@ class ProductService:
           metadata: Optional[Dict] = None
      ):
           """Log user-product interactions for future model training"""
-          
-          product = await self.products_collection.find_one({"_id": ObjectId(product_id)})
-          
-          interaction = {
+          await self.log_product_interactions([{
                "userId": userId,
                "product_id": product_id,
                "interaction_type": interaction_type,
-               "category": product.get('category') if product else None,
-               "timestamp": datetime.utcnow(),
-               "implicit_score": {
-                    'purchase': 1.0,
-                    'add_to_cart': 0.8,
-                    'click': 0.5,
-                    'view': 0.3
-               }.get(interaction_type, 0.5)
-          }
-          
-          if metadata:
-               interaction['metadata'] = metadata
+               "metadata": metadata
+          }])
+     
+     async def log_product_interactions(self, events: List[Dict]) -> int:
+          """
+          Log a batch of interactions (dicts with userId, product_id,
+          interaction_type and optional metadata). Writes go through the
+          write-behind buffer; returns the number of events accepted.
+          """
+          attributes = await self._product_attributes([event["product_id"] for event in events])
+          now = datetime.utcnow()
+          interactions, profile_updates = [], []
+          for event in events:
+               category = attributes[event["product_id"]]
+               interaction = {
+                    "userId": event["userId"],
+                    "product_id": event["product_id"],
+                    "interaction_type": event["interaction_type"],
+                    "category": category,
+                    "timestamp": now,
+                    "implicit_score": IMPLICIT_SCORES.get(event["interaction_type"], 0.5)
+               }
+               if event.get("metadata"):
+                    interaction['metadata'] = event["metadata"]
+               interactions.append(InsertOne(interaction))
+               profile_updates.extend(self._user_profile_operations(
+                    event["userId"], event["product_id"], event["interaction_type"], category
+               ))
           
-          await self.interactions_collection.insert_one(interaction)
+          await self._write(self.interactions_collection, interactions)
+          await self._write(self.user_profiles_collection, profile_updates)
+          return len(interactions)
      
      # Keep your existing methods
      async def get_product_by_id(self, product_id: str) -> Optional[Product]:
@@ -516,4 +1320,15 @@ class ProductService:
      async def delete_product(self, product_id: str) -> bool:
           """Delete a product"""
           result = await self.products_collection.delete_one({"_id": ObjectId(product_id)})
+          if result.deleted_count:
+               # Other workers' indexes (and snapshots loaded after a restart) replay this log
+               await self.product_deletions_collection.update_one(
+                    {"_id": ObjectId(product_id)}, {"$set": {"deleted_at": datetime.utcnow()}}, upsert=True
+               )
+          if self._uses_vector_index():
+               await asyncio.to_thread(self._vector_index().delete, product_id)
+          await asyncio.to_thread(get_lexical_index().apply_delete, product_id)
+          self._catalog_changed(product_id)
+          if settings.NEIGHBOR_TABLE_ENABLED:
+               await self._drop_product_neighbors(ObjectId(product_id))
           return result.deleted_count > 0
\ No newline at end of file
@@ -1,9 +1,27 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import Optional, List
 from app.Services.products.products import ProductService
+from app.Services.container import provide
+from app.Services.products.products_schema import InteractionEvent
+
+MAX_INTERACTION_BATCH = 1000
 
 router = APIRouter()
 
+
+def server_timing(trace: dict) -> str:
+     """Search trace as a Server-Timing header; degraded stages carry the reason"""
+     entries = []
+     for stage, ms in trace["timings_ms"].items():
+          entry = f"{stage};dur={ms:.1f}"
+          if stage in trace["degraded"]:
+               entry += f';desc="{trace["degraded"][stage]}"'
+          entries.append(entry)
+     if "cache" in trace:
+          entries.append(f'cache;desc="{trace["cache"]}"')
+     return ", ".join(entries)
+
+
 @router.get("/search")
 async def search_products(
      query: str = Query(..., description="Search query"),
@@ -14,7 +32,10 @@ async def search_products(
      max_price: Optional[float] = None,
      min_rating: Optional[float] = None,
      use_personalization: bool = Query(True, description="Enable personalized results"),
-     service: ProductService = Depends()
+     expand: bool = Query(False, description="Also search context-aware query variants"),
+     debug: bool = Query(False, description="Return per-stage timings in a Server-Timing header"),
+     response: Response = None,
+     service: ProductService = Depends(provide(ProductService))
 ):
      """
      Enhanced personalized search endpoint
@@ -22,6 +43,8 @@ async def search_products(
      - **query**: What the user is searching for
      - **userId**: User ID to personalize results
      - **use_personalization**: Toggle personalization on/off
+     - **expand**: Multi-query expansion from the user's setup (goal, level, equipment)
+     - **debug**: Add a Server-Timing header with per-stage timings
      """
      
      filters = {}
@@ -35,26 +58,38 @@ async def search_products(
      if min_rating:
           filters['min_rating'] = min_rating
      
+     trace = {}
      results = await service.search_by_text_query(
           userId=userId,
           query=query,
           limit=limit,
           filters=filters if filters else None,
-          use_personalization=use_personalization
+          use_personalization=use_personalization,
+          trace=trace,
+          expand=expand
      )
      
+     if debug:
+          response.headers["Server-Timing"] = server_timing(trace)
+     
      return {
           "query": query,
           "personalized": use_personalization,
+          "expanded": expand,
           "count": len(results),
           "results": results
      }
 
+@router.get("/search/stats")
+async def search_stats(service: ProductService = Depends(provide(ProductService))):
+     """Vector search fill ratios and embedding throughput for this worker"""
+     return service.get_search_stats()
+
 @router.get("/{product_id}/similar")
 async def get_similar_products(
      product_id: str,
      limit: int = Query(5, ge=1, le=20),
-     service: ProductService = Depends()
+     service: ProductService = Depends(provide(ProductService))
      ):
      """Get products similar to the given product"""
      
@@ -74,7 +109,7 @@ async def log_interaction(
      userId: str,
      product_id: str,
      interaction_type: str,
-     service: ProductService = Depends()
+     service: ProductService = Depends(provide(ProductService))
      ):
      """
      Log user-product interaction
@@ -88,4 +123,22 @@ async def log_interaction(
           interaction_type=interaction_type
      )
      
-     return {"status": "logged"}
\ No newline at end of file
+     return {"status": "logged"}
+
+@router.post("/interactions/batch")
+async def log_interactions(
+     events: List[InteractionEvent],
+     service: ProductService = Depends(provide(ProductService))
+     ):
+     """
+     Log a batch of user-product interactions
+
+     Accepts up to 1000 events per request
+     """
+     
+     if len(events) > MAX_INTERACTION_BATCH:
+          raise HTTPException(status_code=400, detail=f"At most {MAX_INTERACTION_BATCH} events per batch")
+     
+     logged = await service.log_product_interactions([event.model_dump() for event in events])
+     
+     return {"status": "logged", "count": logged}
\ No newline at end of file
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from enum import Enum
 from pydantic import BaseModel, Field
 from bson import ObjectId
@@ -66,3 +66,8 @@ class Product(BaseModel):
           json_encoders = {ObjectId: str}
 
 
+class InteractionEvent(BaseModel):
+     userId: str
+     product_id: str
+     interaction_type: str  # view, click, purchase, add_to_cart
+     metadata: Optional[Dict[str, Any]] = None
@@ -0,0 +1,213 @@
+from app.config.settings import settings
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+SIGNALS = ("vector", "popularity", "personalization", "freshness")
+
+_US_PER_DAY = 86_400 * 1_000_000
+_LOG1P_100 = np.log1p(100)
+
+
+def rerank_weights() -> Dict[str, float]:
+     return {
+          "vector": settings.RERANK_VECTOR_WEIGHT,
+          "popularity": settings.RERANK_POPULARITY_WEIGHT,
+          "personalization": settings.RERANK_PERSONALIZATION_WEIGHT,
+          "freshness": settings.RERANK_FRESHNESS_WEIGHT
+     }
+
+
+def _floats(results: List[Dict], key: str, default: float) -> np.ndarray:
+     return np.fromiter(
+          (default if (v := r.get(key, default)) is None else v for r in results),
+          dtype=np.float64,
+          count=len(results)
+     )
+
+
+def popularity_scores(results: List[Dict]) -> np.ndarray:
+     """Rating (0-5 -> 0-1, 0.5 when unrated) and log-scaled review count"""
+     ratings = _floats(results, "averageRating", 0.0)
+     reviews = _floats(results, "totalReview", 0.0)
+     rating_score = np.where(ratings != 0, ratings / 5.0, 0.5)
+     review_score = np.minimum(np.log1p(reviews) / _LOG1P_100, 1.0)
+     return 0.7 * rating_score + 0.3 * review_score
+
+
+def profile_key(value) -> str:
+     """Category value usable as a field name; user profiles store category counts under these keys"""
+     return str(value if value is not None else "unknown").replace(".", "_").replace("$", "_")
+
+
+def personalization_scores(results: List[Dict], setup: Dict, user_history: Dict) -> np.ndarray:
+     """Category preference boost, repeat-purchase penalty and fitness-level tag match"""
+     favorites = user_history.get("favorite_categories", {})
+     purchased = user_history.get("purchased_products", set())
+     level = setup.get("fitnessLevel")
+
+     scores = np.full(len(results), 0.5)
+     if favorites:
+          frequency = np.fromiter(
+               (favorites.get(profile_key(r.get("category")), np.nan) for r in results), dtype=np.float64, count=len(results)
+          )
+          preferred = ~np.isnan(frequency)
+          scores[preferred] += np.minimum(frequency[preferred] * 0.1, 0.3)
+     if purchased:
+          scores[np.fromiter((str(r.get("_id", "")) in purchased for r in results), dtype=bool, count=len(results))] -= 0.4
+     if level:
+          scores[np.fromiter((level in (r.get("tags") or []) for r in results), dtype=bool, count=len(results))] += 0.2
+     return np.clip(scores, 0.0, 1.0)
+
+
+def _has_utc_offset(value: str) -> bool:
+     return len(value) > 19 and ("+" in value[19:] or "-" in value[19:])
+
+
+def _created_us(values: List) -> Tuple[np.ndarray, np.ndarray]:
+     """Creation times as UTC epoch microseconds, and which are known"""
+     created = np.zeros(len(values), dtype=np.int64)
+     known = np.zeros(len(values), dtype=bool)
+     naive, naive_rows, aware_rows = [], [], []
+     for i, value in enumerate(values):
+          if not value:
+               continue
+          if isinstance(value, str) and not _has_utc_offset(value):
+               naive.append(value[:-1] if value.endswith("Z") else value)
+               naive_rows.append(i)
+          elif isinstance(value, datetime) and value.tzinfo is None:
+               naive.append(value)
+               naive_rows.append(i)
+          else:
+               aware_rows.append(i)
+     # Naive datetimes and ISO strings are converted in one call
+     if naive_rows:
+          created[naive_rows] = np.array(naive, dtype="datetime64[us]").astype(np.int64)
+          known[naive_rows] = True
+     for i in aware_rows:
+          value = values[i]
+          if isinstance(value, str):
+               value = datetime.fromisoformat(value)
+          value = value.astimezone(timezone.utc).replace(tzinfo=None)
+          created[i] = np.datetime64(value, "us").astype(np.int64)
+          known[i] = True
+     return created, known
+
+
+def freshness_scores(results: List[Dict], now: Optional[datetime] = None) -> np.ndarray:
+     """1.0 under a week old, 0.8 under 30 days, 0.6 under 90, else 0.4; 0.5 when unknown"""
+     created_us, known = _created_us([r.get("created_at") for r in results])
+     now_us = np.datetime64(now or datetime.utcnow(), "us").astype(np.int64)
+     days_old = np.floor_divide(now_us - created_us, _US_PER_DAY)
+     scores = np.select([days_old < 7, days_old < 30, days_old < 90], [1.0, 0.8, 0.6], 0.4)
+     return np.where(known, scores, 0.5)
+
+
+def score_candidates(
+     results: List[Dict],
+     setup: Dict,
+     user_history: Dict,
+     weights: Optional[Dict[str, float]] = None
+) -> Dict[str, np.ndarray]:
+     """All rerank signals for the candidates as columns, plus the weighted "final" score"""
+     weights = weights or rerank_weights()
+     signals = {
+          "vector": _floats(results, "score", 0.5),
+          "popularity": popularity_scores(results),
+          "personalization": personalization_scores(results, setup, user_history),
+          "freshness": freshness_scores(results)
+     }
+     final = np.zeros(len(results))
+     for name in SIGNALS:
+          final = final + weights[name] * signals[name]
+     signals["final"] = final
+     return signals
+
+
+def ranked_prefix(scores: np.ndarray, k: int) -> np.ndarray:
+     """
+     Indices of the top k scores, best first; ties keep candidate order.
+     Uses a partition instead of a full sort. Every candidate tied with the
+     k-th score is kept, so the result is exactly a prefix of the full
+     stable ordering (possibly a little longer than k).
+     """
+     n = len(scores)
+     if k >= n:
+          return np.argsort(-scores, kind="stable")
+     if k <= 0:
+          return np.empty(0, dtype=np.int64)
+     threshold = np.partition(scores, n - k)[n - k]
+     candidates = np.flatnonzero(scores >= threshold)
+     return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def annotate(results: List[Dict], signals: Dict[str, np.ndarray], order: np.ndarray) -> List[Dict]:
+     """Write final_score / score_breakdown onto the candidates, in the given order"""
+     ranked = []
+     for i in order:
+          result = results[i]
+          result["final_score"] = float(signals["final"][i])
+          result["score_breakdown"] = {name: float(signals[name][i]) for name in SIGNALS}
+          ranked.append(result)
+     return ranked
+
+
+def _unit_rows(results: List[Dict]) -> np.ndarray:
+     """Candidate embeddings as unit rows; candidates without one get a zero row"""
+     dim = next((len(r["embedding"]) for r in results if r.get("embedding") is not None), 0)
+     matrix = np.zeros((len(results), dim), dtype=np.float32)
+     for i, result in enumerate(results):
+          embedding = result.get("embedding")
+          if embedding is not None and len(embedding) == dim:
+               matrix[i] = embedding
+     norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+     return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def mmr_select(
+     results: List[Dict],
+     relevance: np.ndarray,
+     k: int,
+     mmr_lambda: float = 0.7,
+     max_per_category: Optional[int] = None
+) -> List[int]:
+     """
+     Maximal marginal relevance over the candidates' embeddings.
+
+     Picks argmax(lambda * relevance - (1 - lambda) * max similarity to the
+     picks so far), keeping max similarity as one vector updated with a
+     single matrix-vector product per pick: O(n * k * dim) in total.
+     Categories at max_per_category are skipped while other candidates
+     remain, then the cap is lifted to fill k.
+     """
+     n = len(results)
+     k = min(k, n)
+     if k <= 0:
+          return []
+     embeddings = _unit_rows(results)
+     codes: Dict = {}
+     categories = np.fromiter(
+          (codes.setdefault(r.get("category", "unknown"), len(codes)) for r in results), dtype=np.int64, count=n
+     )
+     max_similarity = np.zeros(n, dtype=np.float32)
+     available = np.ones(n, dtype=bool)
+     capped = np.zeros(n, dtype=bool)
+     category_counts = np.zeros(len(codes), dtype=np.int64)
+
+     picks = []
+     while len(picks) < k:
+          candidates = available & ~capped
+          if not candidates.any():
+               candidates = available
+          gain = mmr_lambda * relevance - (1 - mmr_lambda) * max_similarity
+          pick = int(np.argmax(np.where(candidates, gain, -np.inf)))
+          picks.append(pick)
+          available[pick] = False
+
+          if embeddings.shape[1]:
+               np.maximum(max_similarity, embeddings @ embeddings[pick], out=max_similarity)
+          category = categories[pick]
+          category_counts[category] += 1
+          if max_per_category and category_counts[category] >= max_per_category:
+               capped |= categories == category
+     return picks
@@ -0,0 +1,188 @@
+from app.config.settings import settings
+from app.utils.embedding.embedding_cache import normalize_text
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import bson
+import json
+import time
+
+# Rough per-entry overhead of the dicts holding a cached candidate
+_DOC_OVERHEAD_BYTES = 512
+
+
+def _candidate_bytes(doc: Dict) -> int:
+     try:
+          return len(bson.encode(doc)) + _DOC_OVERHEAD_BYTES
+     except Exception:
+          return 2048
+
+
+class SearchResultCache:
+     """
+     Cache of search candidates (fused vector + lexical hits, before the
+     per-user history and re-ranking stages), so entries are shared by
+     every user in the same preference bucket.
+
+     Entries are keyed by (normalized query, context), where context holds
+     the filters, preference bucket and candidate count. Each entry
+     records the catalog version it was computed under; product writes
+     bump the version and drop every entry, and a put computed under an
+     older version is discarded. Optionally, a miss falls back to the
+     entry in the same context whose query embedding is most similar, if
+     it is above similarity_threshold. Memory is capped by entry count
+     and by estimated bytes (least recently used first).
+     """
+     def __init__(
+          self,
+          max_entries: int = 2000,
+          max_bytes: int = 256 * 1024 * 1024,
+          ttl: int = 600,
+          similarity_threshold: Optional[float] = None
+     ):
+          self.max_entries = max_entries
+          self.max_bytes = max_bytes
+          self.ttl = ttl
+          self.similarity_threshold = similarity_threshold
+          self.catalog_version = 0
+          self._entries: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+          self._by_context: Dict[str, set] = {}
+          self._bytes = 0
+          self._stats = {
+               "hits": 0,
+               "near_hits": 0,
+               "misses": 0,
+               "expirations": 0,
+               "evictions": 0,
+               "invalidations": 0,
+               "stale_puts": 0
+          }
+
+     @staticmethod
+     def key(query: str, filters: Optional[Dict[str, Any]], bucket: str, candidates: int, min_score: float) -> Tuple[str, str]:
+          context = json.dumps([filters or {}, bucket, candidates, min_score], sort_keys=True, default=str)
+          return normalize_text(query).lower(), context
+
+     def _remove(self, key: Tuple[str, str]):
+          entry = self._entries.pop(key)
+          self._bytes -= entry["bytes"]
+          keys = self._by_context[key[1]]
+          keys.discard(key)
+          if not keys:
+               del self._by_context[key[1]]
+
+     def _live(self, key: Tuple[str, str]) -> Optional[Dict]:
+          entry = self._entries.get(key)
+          if entry is None:
+               return None
+          if entry["expires_at"] <= time.monotonic():
+               self._remove(key)
+               self._stats["expirations"] += 1
+               return None
+          self._entries.move_to_end(key)
+          return entry
+
+     @staticmethod
+     def _copies(entry: Dict) -> List[Dict]:
+          # Callers annotate and trim the candidates; hand out fresh dicts
+          return [
+               {**doc, "embedding": embedding} if embedding is not None else dict(doc)
+               for doc, embedding in zip(entry["docs"], entry["embeddings"])
+          ]
+
+     def get(self, key: Tuple[str, str]) -> Optional[List[Dict]]:
+          """Candidates for an exact (normalized) query match"""
+          entry = self._live(key)
+          if entry is None:
+               return None
+          self._stats["hits"] += 1
+          return self._copies(entry)
+
+     def get_similar(self, key: Tuple[str, str], query_vector: np.ndarray) -> Optional[List[Dict]]:
+          """
+          Candidates of the most similar cached query in the same context, if
+          near-duplicate mode is on. Called after an exact miss; counts the miss.
+          """
+          if self.similarity_threshold is None:
+               self._stats["misses"] += 1
+               return None
+          keys = [k for k in self._by_context.get(key[1], ()) if self._live(k) is not None]
+          if keys:
+               vectors = np.stack([self._entries[k]["query_vector"] for k in keys])
+               query = np.asarray(query_vector, dtype=np.float32)
+               similarity = vectors @ (query / (np.linalg.norm(query) or 1.0))
+               best = int(np.argmax(similarity))
+               if similarity[best] >= self.similarity_threshold:
+                    self._stats["near_hits"] += 1
+                    return self._copies(self._entries[keys[best]])
+          self._stats["misses"] += 1
+          return None
+
+     def put(self, key: Tuple[str, str], query_vector: np.ndarray, candidates: List[Dict], version: int):
+          """Store candidates computed under catalog `version` (dropped if the catalog changed since)"""
+          if version != self.catalog_version:
+               self._stats["stale_puts"] += 1
+               return
+          if key in self._entries:
+               self._remove(key)
+
+          docs, embeddings, size = [], [], 0
+          for candidate in candidates:
+               doc = {k: v for k, v in candidate.items() if k != "embedding"}
+               embedding = candidate.get("embedding")
+               if embedding is not None:
+                    embedding = np.asarray(embedding, dtype=np.float32)
+                    size += embedding.nbytes
+               docs.append(doc)
+               embeddings.append(embedding)
+               size += _candidate_bytes(doc)
+          query = np.asarray(query_vector, dtype=np.float32)
+          if size > self.max_bytes:
+               return
+
+          self._entries[key] = {
+               "docs": docs,
+               "embeddings": embeddings,
+               "query_vector": query / (np.linalg.norm(query) or 1.0),
+               "expires_at": time.monotonic() + self.ttl,
+               "bytes": size
+          }
+          self._by_context.setdefault(key[1], set()).add(key)
+          self._bytes += size
+          while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+               self._remove(next(iter(self._entries)))
+               self._stats["evictions"] += 1
+
+     def bump_catalog_version(self):
+          """Products changed: every cached candidate list may be stale"""
+          self.catalog_version += 1
+          if self._entries:
+               self._stats["invalidations"] += 1
+          self._entries.clear()
+          self._by_context.clear()
+          self._bytes = 0
+
+     def get_stats(self) -> Dict:
+          stats = dict(self._stats)
+          lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+          stats["hit_rate"] = (stats["hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+          stats["entries"] = len(self._entries)
+          stats["memory_mb"] = self._bytes / (1024 * 1024)
+          stats["catalog_version"] = self.catalog_version
+          return stats
+
+
+_search_cache: Optional[SearchResultCache] = None
+
+
+def get_search_result_cache() -> SearchResultCache:
+     """Process-wide search result cache"""
+     global _search_cache
+     if _search_cache is None:
+          _search_cache = SearchResultCache(
+               max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+               max_bytes=settings.SEARCH_CACHE_MAX_MB * 1024 * 1024,
+               ttl=settings.SEARCH_CACHE_TTL,
+               similarity_threshold=settings.SEARCH_CACHE_SIMILARITY_THRESHOLD
+          )
+     return _search_cache
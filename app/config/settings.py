@@ -1,8 +1,15 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str
     DATABASE_NAME: str
+    # One Mongo client (and pool) per process, see app/DB/mongodb/client.py
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 300_000
+    MONGO_MAX_CONNECTING: int = 2
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10_000
     SECRET_KEY: str
     REFRESH_SECRET_KEY: str
     OPENAI_API_KEY: str
@@ -12,11 +19,119 @@ class Settings(BaseSettings):
     AWS_S3_BUCKET_NAME: str
 
     EMBEDDING_CACHE_SIZE: int = 1000
-    EMBEDDING_CACHE_TTL: int = 3600*24 
+    EMBEDDING_CACHE_TTL: int = 3600*24  # in-memory tier only; the disk tier keeps rows until MAX_ROWS
+    EMBEDDING_CACHE_DIR: str = "app/data/embedding_cache"
+    EMBEDDING_DISK_CACHE_ENABLED: bool = True
+    EMBEDDING_DISK_CACHE_MAX_ROWS: int = 500_000
+
+    # Embedding inference backend: "torch" or "onnx" (int8 quantized when EMBEDDING_ONNX_QUANTIZE)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_DIR: str = "app/data/onnx"
+    EMBEDDING_ONNX_QUANTIZE: bool = True
+    EMBEDDING_ONNX_THREADS: int = 0
+
+    # Load embedding weights at import time so pre-forked workers share them
+    EMBEDDING_PRELOAD: bool = False
+
+    # Load the embedding model, search indexes and AI coach graph in a
+    # background task after startup (off: each loads on first use)
+    STARTUP_WARMUP: bool = True
+
+    # Embedding dimension reduction: "none", "truncate" or "pca" (fit with scripts/embedding_dimensions.py)
+    EMBEDDING_MODEL_DIM: int = 768
+    EMBEDDING_DIM_REDUCTION: str = "none"
+    EMBEDDING_TARGET_DIM: int = 384  # truncate; pca takes its dimension from EMBEDDING_PCA_PATH
+    EMBEDDING_PCA_PATH: str = "app/data/embedding_pca.npz"
+
+    # Out-of-process embedding workers (0 = encode in the API process)
+    EMBEDDING_WORKERS: int = 0
+    EMBEDDING_WORKER_CPUS: str = ""  # e.g. "2,3" pins worker i to cpus[i % len(cpus)]
+    EMBEDDING_WORKER_THREADS: int = 1
+    EMBEDDING_WORKER_SLOT_ROWS: int = 64
+
+    # Embedding micro-batching
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_BATCH_MAX_INFLIGHT: int = 1
+
+    # Bulk (length-bucketed) encoding
+    EMBEDDING_BULK_TOKEN_BUDGET: int = 16384
+    EMBEDDING_BULK_CHUNK_SIZE: int = 2048
     
     # Search settings
     VECTOR_SEARCH_NUM_CANDIDATES_MULTIPLIER: int = 10
     DEFAULT_MIN_SIMILARITY_SCORE: float = 0.3
+    # "atlas" ($vectorSearch), "local" (in-process NumPy index) or "hnsw" (in-process HNSW graph)
+    VECTOR_SEARCH_BACKEND: str = "atlas"
+    LOCAL_INDEX_DIR: str = "app/data/local_index"
+    LOCAL_INDEX_DTYPE: str = "float16"
+    HNSW_INDEX_DIR: str = "app/data/hnsw_index"
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    # In-process indexes catch up with other workers' product writes this often
+    VECTOR_INDEX_SYNC_SECONDS: float = 30.0
+    # Snapshot once unsaved rows (delta + tombstones) reach max(MIN_ROWS, RATIO x live rows),
+    # or when unsaved rows are older than SNAPSHOT_SECONDS (0 = no age limit)
+    VECTOR_INDEX_COMPACT_MIN_ROWS: int = 1000
+    VECTOR_INDEX_COMPACT_RATIO: float = 0.1
+    VECTOR_INDEX_SNAPSHOT_SECONDS: float = 600.0
+    # Deleted product ids are kept this long; older index snapshots are rebuilt instead of caught up
+    PRODUCT_DELETION_LOG_DAYS: int = 30
+    # Hybrid retrieval: BM25 lexical hits fused with vector hits (reciprocal rank fusion)
+    LEXICAL_SEARCH_ENABLED: bool = True
+    SEARCH_RRF_K: int = 60
+    # Candidates fetched per requested result before re-ranking
+    SEARCH_CANDIDATE_MULTIPLIER: int = 2
+    # Weights of the hybrid re-ranking signals (see app/Services/products/rerank.py)
+    RERANK_VECTOR_WEIGHT: float = 0.50
+    RERANK_POPULARITY_WEIGHT: float = 0.20
+    RERANK_PERSONALIZATION_WEIGHT: float = 0.20
+    RERANK_FRESHNESS_WEIGHT: float = 0.10
+    # MMR trade-off for result diversity: 1.0 = pure relevance, lower = more diverse
+    SEARCH_MMR_LAMBDA: float = 0.7
+    # Per-stage search timeouts; a timed-out stage degrades (default setup,
+    # no history boost, lexical-only candidates) instead of failing the search
+    SEARCH_SETUP_TIMEOUT_MS: int = 300
+    SEARCH_HISTORY_TIMEOUT_MS: int = 200
+    SEARCH_EMBEDDING_TIMEOUT_MS: int = 2000
+    SEARCH_RETRIEVAL_TIMEOUT_MS: int = 3000
+    # Per-user interaction profiles (userProfiles collection)
+    USER_PROFILE_MAX_PRODUCTS: int = 200
+    USER_PROFILE_HALF_LIFE_DAYS: float = 30.0
+    USER_PROFILE_DECAY_INTERVAL_HOURS: float = 24.0  # 0 disables the background decay job
+    # Write-behind buffer for interaction / search logs and profile updates
+    WRITE_BEHIND_ENABLED: bool = True
+    WRITE_BEHIND_FLUSH_ROWS: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL_MS: int = 1000
+    WRITE_BEHIND_MAX_BUFFER: int = 20000  # writers wait for a flush beyond this
+    # product id -> category cache used when logging interactions
+    PRODUCT_ATTRIBUTE_CACHE_SIZE: int = 50000
+    PRODUCT_ATTRIBUTE_CACHE_TTL: int = 300  # seconds
+    # Materialized similar-products table (productNeighbors collection)
+    NEIGHBOR_TABLE_ENABLED: bool = True
+    NEIGHBOR_TABLE_K: int = 20
+    NEIGHBOR_TABLE_BLOCK_ROWS: int = 512  # rows per matrix product in the batch job
+    NEIGHBOR_TABLE_MAX_AGE_HOURS: float = 168.0  # older rows fall back to live search; 0 = never
+    NEIGHBOR_TABLE_REBUILD_INTERVAL_HOURS: float = 0.0  # 0 = rebuild with scripts.build_neighbor_table instead
+    # Search candidate cache, shared across users in the same preference bucket.
+    # While enabled, retrieval is personalized with the bucket's (goal + level)
+    # preference vector, so the per-user preference_embedding stored with each
+    # personal setup is only read when it is disabled.
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_MAX_ENTRIES: int = 2000
+    SEARCH_CACHE_MAX_MB: int = 256
+    SEARCH_CACHE_TTL: int = 600  # seconds; bounds staleness from writes in other workers
+    # Cosine similarity for reusing a different query's candidates; None = exact queries only
+    SEARCH_CACHE_SIMILARITY_THRESHOLD: Optional[float] = None
+    PERSONALIZATION_QUERY_WEIGHT: float = 0.7
+    PERSONALIZATION_SETUP_WEIGHT: float = 0.3
+    # AI coach (LangGraph) checkpoints
+    CHECKPOINT_KEEP_LAST: int = 5  # per thread, pruned after every run; 0 keeps all
+    CHECKPOINT_RETENTION_DAYS: float = 90.0  # TTL index on created_at; 0 = keep forever
+    CHECKPOINT_INLINE_MAX_KB: int = 32  # larger image data URLs are moved to S3 (or dropped); 0 = keep inline
+    CHECKPOINT_EXTERNALIZE_IMAGES: bool = True
+    CHECKPOINT_COMPACTION_INTERVAL_HOURS: float = 0.0  # 0 = compact old threads with scripts.compact_checkpoints
 
     class Config:
         env_file = ".env"
@@ -1,5 +1,7 @@
 from app.config.settings import settings
 import boto3
+import asyncio
+import uuid
 
 class S3_Manager:
      def __init__(self):
@@ -16,10 +18,16 @@ class S3_Manager:
                print(e)
                return None
      
-     async def upload_file_from_bytes(self,file_bytes:bytes,):
+     async def upload_file_from_bytes(self,file_bytes:bytes,extension:str="png"):
           try:
-               file_name = f"images/AI_coach/{uuid.uuid4()}.png"
-               self.s3.put_object(Bucket=settings.AWS_S3_BUCKET_NAME,Key=file_name,Body=file_bytes)
+               file_name = f"images/AI_coach/{uuid.uuid4()}.{extension}"
+               await asyncio.to_thread(
+                    self.s3.put_object,
+                    Bucket=settings.AWS_S3_BUCKET_NAME,
+                    Key=file_name,
+                    Body=file_bytes,
+                    ContentType=f"image/{extension}"
+               )
                return f"https://{settings.AWS_S3_BUCKET_NAME}.s3.{settings.AWS_REGION_NAME}.amazonaws.com/{file_name}"
           except Exception as e:
                print(e)
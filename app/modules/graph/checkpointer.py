@@ -0,0 +1,323 @@
+from app.config.settings import settings
+from app.DB.mongodb.client import get_motor_client
+from app.modules.graph.compaction import PayloadStripper
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+     WRITES_IDX_MAP,
+     BaseCheckpointSaver,
+     ChannelVersions,
+     Checkpoint,
+     CheckpointMetadata,
+     CheckpointTuple,
+     get_checkpoint_id,
+     get_checkpoint_metadata,
+)
+from langgraph.checkpoint.mongodb.utils import dumps_metadata, loads_metadata
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import asyncio
+
+CHECKPOINT_DB = "checkpointing_db"
+CHECKPOINT_COLLECTION = "checkpoints"
+WRITES_COLLECTION = "checkpoint_writes"
+
+
+def _identifier(value: Any, name: str) -> str:
+     # Identifiers go straight into queries; an operator document must not widen them
+     if not isinstance(value, str):
+          raise ValueError(f"Invalid {name}: expected a string, got {type(value).__name__}")
+     return value
+
+
+class MotorCheckpointSaver(BaseCheckpointSaver):
+     """
+     LangGraph checkpointer on the shared Motor client, so checkpoint reads
+     and writes never block the event loop (MongoDBSaver drives pymongo,
+     on the loop or in the default thread pool).
+
+     Documents match MongoDBSaver's (same database, collections and
+     fields), so existing threads keep working. Pending writes are
+     buffered per thread and written with the next checkpoint of that
+     thread: one bulk_write for all tasks of a super-step, issued
+     concurrently with the checkpoint upsert. Reads of a thread flush its
+     buffer first. Only the async API is implemented.
+
+     Storage stays bounded: large image payloads are stripped before they
+     are stored (PayloadStripper), compact_thread() keeps the latest
+     keep_last checkpoints of a thread, and a TTL index on created_at
+     expires checkpoints and writes after retention_days.
+     """
+     def __init__(
+          self,
+          client=None,
+          db_name: str = CHECKPOINT_DB,
+          keep_last: Optional[int] = None,
+          retention_days: Optional[float] = None,
+          inline_max_kb: Optional[int] = None
+     ):
+          super().__init__()
+          self.client = client or get_motor_client()
+          self.db = self.client[db_name]
+          self.checkpoint_collection = self.db[CHECKPOINT_COLLECTION]
+          self.writes_collection = self.db[WRITES_COLLECTION]
+          self.keep_last = settings.CHECKPOINT_KEEP_LAST if keep_last is None else keep_last
+          self.retention_days = settings.CHECKPOINT_RETENTION_DAYS if retention_days is None else retention_days
+          inline_max_kb = settings.CHECKPOINT_INLINE_MAX_KB if inline_max_kb is None else inline_max_kb
+          self.stripper = (
+               PayloadStripper(inline_max_kb * 1024, settings.CHECKPOINT_EXTERNALIZE_IMAGES)
+               if inline_max_kb > 0 else None
+          )
+          self._pending_writes: Dict[str, List[UpdateOne]] = {}
+          self._indexes_ready = False
+          self.stats = {"checkpoints": 0, "write_batches": 0, "writes": 0, "pruned_checkpoints": 0}
+
+     async def setup(self):
+          """Create the indexes MongoDBSaver creates (idempotent)"""
+          if self._indexes_ready:
+               return
+          await asyncio.gather(
+               self.checkpoint_collection.create_index(
+                    [("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", -1)], unique=True
+               ),
+               self.writes_collection.create_index(
+                    [("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", -1), ("task_id", 1), ("idx", 1)],
+                    unique=True
+               )
+          )
+          if self.retention_days > 0:
+               await asyncio.gather(
+                    self._ensure_ttl_index(self.checkpoint_collection),
+                    self._ensure_ttl_index(self.writes_collection)
+               )
+          self._indexes_ready = True
+
+     async def _ensure_ttl_index(self, collection):
+          expire_after = int(self.retention_days * 86400)
+          try:
+               await collection.create_index([("created_at", 1)], expireAfterSeconds=expire_after)
+          except OperationFailure:
+               # Exists with another retention: change it in place
+               await self.db.command(
+                    "collMod",
+                    collection.name,
+                    index={"keyPattern": {"created_at": 1}, "expireAfterSeconds": expire_after}
+               )
+
+     async def flush(self, thread_id: Optional[str] = None):
+          """Write buffered pending writes of one thread, or of every thread"""
+          thread_ids = [thread_id] if thread_id is not None else list(self._pending_writes)
+          operations = [op for tid in thread_ids for op in self._pending_writes.pop(tid, [])]
+          await self._write_pending(operations)
+
+     async def _write_pending(self, operations: List[UpdateOne]):
+          if operations:
+               await self.writes_collection.bulk_write(operations, ordered=False)
+               self.stats["write_batches"] += 1
+               self.stats["writes"] += len(operations)
+
+     def _pending_write_tuples(self, docs: List[Dict]) -> List[Tuple[str, str, Any]]:
+          return [
+               (doc["task_id"], doc["channel"], self.serde.loads_typed((doc["type"], doc["value"])))
+               for doc in docs
+          ]
+
+     async def _tuple(self, doc: Dict) -> CheckpointTuple:
+          config_values = {
+               "thread_id": doc["thread_id"],
+               "checkpoint_ns": doc["checkpoint_ns"],
+               "checkpoint_id": doc["checkpoint_id"]
+          }
+          writes = await self.writes_collection.find(config_values).sort([("task_id", 1), ("idx", 1)]).to_list(length=None)
+          return CheckpointTuple(
+               {"configurable": config_values},
+               self.serde.loads_typed((doc["type"], doc["checkpoint"])),
+               loads_metadata(self.serde, doc["metadata"]),
+               (
+                    {"configurable": {**config_values, "checkpoint_id": doc["parent_checkpoint_id"]}}
+                    if doc.get("parent_checkpoint_id")
+                    else None
+               ),
+               self._pending_write_tuples(writes)
+          )
+
+     async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+          thread_id = _identifier(config["configurable"]["thread_id"], "thread_id")
+          checkpoint_ns = _identifier(config["configurable"].get("checkpoint_ns", ""), "checkpoint_ns")
+          query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+          checkpoint_id = get_checkpoint_id(config)
+          if checkpoint_id:
+               query["checkpoint_id"] = _identifier(checkpoint_id, "checkpoint_id")
+          await self.flush(thread_id)
+          doc = await self.checkpoint_collection.find_one(query, sort=[("checkpoint_id", -1)])
+          return await self._tuple(doc) if doc is not None else None
+
+     async def alist(
+          self,
+          config: Optional[RunnableConfig],
+          *,
+          filter: Optional[Dict[str, Any]] = None,
+          before: Optional[RunnableConfig] = None,
+          limit: Optional[int] = None
+     ) -> AsyncIterator[CheckpointTuple]:
+          query = {}
+          if config is not None:
+               configurable = config["configurable"]
+               if "thread_id" in configurable:
+                    query["thread_id"] = _identifier(configurable["thread_id"], "thread_id")
+               if "checkpoint_ns" in configurable:
+                    query["checkpoint_ns"] = _identifier(configurable["checkpoint_ns"], "checkpoint_ns")
+          for key, value in (filter or {}).items():
+               if not isinstance(key, str) or key.startswith("$"):
+                    raise ValueError(f"Invalid filter key {key!r}")
+               query[f"metadata.{key}"] = dumps_metadata(self.serde, value)
+          if before is not None:
+               query["checkpoint_id"] = {"$lt": _identifier(before["configurable"]["checkpoint_id"], "checkpoint_id")}
+          await self.flush(query.get("thread_id"))
+          cursor = self.checkpoint_collection.find(query, sort=[("checkpoint_id", -1)], limit=limit or 0)
+          async for doc in cursor:
+               yield await self._tuple(doc)
+
+     async def aput(
+          self,
+          config: RunnableConfig,
+          checkpoint: Checkpoint,
+          metadata: CheckpointMetadata,
+          new_versions: ChannelVersions
+     ) -> RunnableConfig:
+          configurable = config["configurable"]
+          thread_id = _identifier(configurable["thread_id"], "thread_id")
+          checkpoint_ns = _identifier(configurable.get("checkpoint_ns", ""), "checkpoint_ns")
+          checkpoint_id = _identifier(checkpoint["id"], "checkpoint id")
+          parent_checkpoint_id = configurable.get("checkpoint_id")
+          if self.stripper is not None:
+               checkpoint = await self.stripper.strip_checkpoint(checkpoint)
+          type_, serialized = self.serde.dumps_typed(checkpoint)
+          doc = {
+               "parent_checkpoint_id": parent_checkpoint_id,
+               "type": type_,
+               "checkpoint": serialized,
+               "metadata": dumps_metadata(self.serde, get_checkpoint_metadata(config, metadata)),
+               "created_at": datetime.utcnow()
+          }
+          await self.setup()
+          # The previous super-step's writes go out alongside this checkpoint
+          await asyncio.gather(
+               self.checkpoint_collection.update_one(
+                    {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id},
+                    {"$set": doc},
+                    upsert=True
+               ),
+               self._write_pending(self._pending_writes.pop(thread_id, []))
+          )
+          self.stats["checkpoints"] += 1
+          return {
+               "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id
+               }
+          }
+
+     async def aput_writes(
+          self,
+          config: RunnableConfig,
+          writes: Sequence[Tuple[str, Any]],
+          task_id: str,
+          task_path: str = ""
+     ) -> None:
+          configurable = config["configurable"]
+          thread_id = _identifier(configurable["thread_id"], "thread_id")
+          key = {
+               "thread_id": thread_id,
+               "checkpoint_ns": _identifier(configurable.get("checkpoint_ns", ""), "checkpoint_ns"),
+               "checkpoint_id": _identifier(configurable["checkpoint_id"], "checkpoint_id"),
+               "task_id": _identifier(task_id, "task_id"),
+               "task_path": task_path
+          }
+          # Special channels (errors, interrupts) may replace earlier writes, others never do
+          set_method = "$set" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "$setOnInsert"
+          if self.stripper is not None:
+               writes = await self.stripper.strip_writes(writes)
+          created_at = datetime.utcnow()
+          buffer = self._pending_writes.setdefault(thread_id, [])
+          for idx, (channel, value) in enumerate(writes):
+               type_, serialized = self.serde.dumps_typed(value)
+               buffer.append(UpdateOne(
+                    {**key, "idx": WRITES_IDX_MAP.get(channel, idx)},
+                    {set_method: {"channel": channel, "type": type_, "value": serialized, "created_at": created_at}},
+                    upsert=True
+               ))
+
+     async def adelete_thread(self, thread_id: str) -> None:
+          _identifier(thread_id, "thread_id")
+          self._pending_writes.pop(thread_id, None)
+          await asyncio.gather(
+               self.checkpoint_collection.delete_many({"thread_id": thread_id}),
+               self.writes_collection.delete_many({"thread_id": thread_id})
+          )
+
+     async def compact_thread(self, thread_id: str) -> int:
+          """
+          Delete all but the latest keep_last checkpoints of a thread (per
+          namespace) with their pending writes. Returns checkpoints removed.
+          """
+          _identifier(thread_id, "thread_id")
+          if self.keep_last <= 0:
+               return 0
+          await self.flush(thread_id)
+          removed = 0
+          for checkpoint_ns in await self.checkpoint_collection.distinct("checkpoint_ns", {"thread_id": thread_id}):
+               query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+               oldest_kept = await self.checkpoint_collection.find(query, {"checkpoint_id": 1}) \
+                    .sort("checkpoint_id", -1).skip(self.keep_last - 1).limit(1).to_list(length=1)
+               if not oldest_kept:
+                    continue
+               older = {**query, "checkpoint_id": {"$lt": oldest_kept[0]["checkpoint_id"]}}
+               result, _ = await asyncio.gather(
+                    self.checkpoint_collection.delete_many(older),
+                    self.writes_collection.delete_many(older)
+               )
+               removed += result.deleted_count
+          self.stats["pruned_checkpoints"] += removed
+          return removed
+
+     async def _rewrite_payloads(self, batch_size: int = 200) -> int:
+          """Strip large payloads from checkpoints and message writes stored before stripping existed"""
+          rewritten = 0
+          for collection, field in ((self.checkpoint_collection, "checkpoint"), (self.writes_collection, "value")):
+               query = {"channel": "messages"} if field == "value" else {}
+               cursor = collection.find(query, {"type": 1, field: 1}, batch_size=batch_size)
+               async for doc in cursor:
+                    value = self.serde.loads_typed((doc["type"], doc[field]))
+                    if field == "checkpoint":
+                         stripped = await self.stripper.strip_checkpoint(value)
+                    else:
+                         stripped = await self.stripper.strip_value(value)
+                    if stripped is value:
+                         continue
+                    type_, serialized = self.serde.dumps_typed(stripped)
+                    await collection.update_one({"_id": doc["_id"]}, {"$set": {"type": type_, field: serialized}})
+                    rewritten += 1
+          return rewritten
+
+     async def compact_all(self, rewrite_payloads: bool = False) -> Dict[str, int]:
+          """
+          Compact every thread with more than keep_last checkpoints, and
+          optionally strip large payloads from what is already stored.
+          """
+          await self.setup()
+          await self.flush()
+          threads, removed = 0, 0
+          if self.keep_last > 0:
+               cursor = self.checkpoint_collection.aggregate([
+                    {"$group": {"_id": "$thread_id", "checkpoints": {"$sum": 1}}},
+                    {"$match": {"checkpoints": {"$gt": self.keep_last}}}
+               ], allowDiskUse=True)
+               async for row in cursor:
+                    removed += await self.compact_thread(row["_id"])
+                    threads += 1
+          rewritten = await self._rewrite_payloads() if rewrite_payloads and self.stripper is not None else 0
+          print(f"Compacted checkpoints: {removed} removed from {threads} threads, {rewritten} payloads rewritten")
+          return {"threads": threads, "removed": removed, "rewritten": rewritten}
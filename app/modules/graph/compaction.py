@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+import asyncio
+import base64
+import hashlib
+
+IMAGE_PLACEHOLDER = "[image removed from conversation history]"
+
+
+class PayloadStripper:
+     """
+     Keeps large inline payloads out of stored checkpoints. Image parts of
+     message content whose data URL exceeds max_bytes are uploaded to S3
+     and replaced by the object URL (so later turns still see the image),
+     or replaced by a text placeholder when externalizing is off or the
+     upload fails. Messages are copied, never mutated: the running graph
+     still holds the originals.
+     """
+     def __init__(self, max_bytes: int, externalize: bool = True, max_uploads_cached: int = 1024):
+          self.max_bytes = max_bytes
+          self.externalize = externalize
+          self.max_uploads_cached = max_uploads_cached
+          # Every checkpoint of a run carries the same messages: upload each image once
+          self._uploaded: "OrderedDict[str, str]" = OrderedDict()
+          self._s3 = None
+          self.stats = {"stripped": 0, "externalized": 0, "upload_failures": 0}
+
+     async def _externalize(self, data_url: str) -> Optional[str]:
+          digest = hashlib.sha1(data_url.encode()).hexdigest()
+          url = self._uploaded.get(digest)
+          if url is not None:
+               self._uploaded.move_to_end(digest)
+               return url
+          try:
+               header, encoded = data_url.split(",", 1)
+               extension = header[len("data:image/"):].split(";")[0] or "png"
+               if self._s3 is None:
+                    from app.modules.AWS.S3 import S3_Manager
+                    self._s3 = S3_Manager()
+               url = await self._s3.upload_file_from_bytes(base64.b64decode(encoded), extension=extension)
+          except Exception as e:
+               print(f"Externalizing checkpoint image failed: {e}")
+               url = None
+          if url is None:
+               self.stats["upload_failures"] += 1
+               return None
+          self._uploaded[digest] = url
+          while len(self._uploaded) > self.max_uploads_cached:
+               self._uploaded.popitem(last=False)
+          self.stats["externalized"] += 1
+          return url
+
+     async def _strip_part(self, part: Any) -> Any:
+          if not isinstance(part, dict) or part.get("type") != "image_url":
+               return part
+          image_url = part.get("image_url")
+          url = image_url.get("url", "") if isinstance(image_url, dict) else image_url or ""
+          if not url.startswith("data:") or len(url) <= self.max_bytes:
+               return part
+          self.stats["stripped"] += 1
+          external = await self._externalize(url) if self.externalize and url.startswith("data:image/") else None
+          if external is None:
+               return {"type": "text", "text": IMAGE_PLACEHOLDER}
+          return {"type": "image_url", "image_url": {**image_url, "url": external} if isinstance(image_url, dict) else {"url": external}}
+
+     async def strip_message(self, message: Any) -> Any:
+          content = getattr(message, "content", None)
+          if not isinstance(content, list):
+               return message
+          parts = await asyncio.gather(*(self._strip_part(part) for part in content))
+          if all(new is old for new, old in zip(parts, content)):
+               return message
+          return message.model_copy(update={"content": list(parts)})
+
+     async def strip_value(self, value: Any) -> Any:
+          """A message, or a list of messages, with large payloads replaced"""
+          if isinstance(value, list):
+               stripped = [await self.strip_message(item) for item in value]
+               return value if all(new is old for new, old in zip(stripped, value)) else stripped
+          return await self.strip_message(value)
+
+     async def strip_checkpoint(self, checkpoint: dict) -> dict:
+          channel_values = checkpoint.get("channel_values") or {}
+          messages = channel_values.get("messages")
+          if not messages:
+               return checkpoint
+          stripped = await self.strip_value(messages)
+          if stripped is messages:
+               return checkpoint
+          return {**checkpoint, "channel_values": {**channel_values, "messages": stripped}}
+
+     async def strip_writes(self, writes: List[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+          return [
+               (channel, await self.strip_value(value) if channel == "messages" else value)
+               for channel, value in writes
+          ]
@@ -0,0 +1,189 @@
+from app.config.settings import settings
+from typing import List, Optional
+import numpy as np
+import json
+import os
+
+
+class TorchEmbeddingBackend:
+     """SentenceTransformer in torch (fp32, GPU when available)"""
+     name = "torch"
+
+     def __init__(self, model_name: str):
+          from sentence_transformers import SentenceTransformer
+          import torch
+
+          self.model_name = model_name
+          self.model = SentenceTransformer(model_name)
+          if torch.cuda.is_available():
+               self.model = self.model.to('cuda')
+          self.tokenizer = self.model.tokenizer
+          self.max_seq_length = self.model.max_seq_length
+
+     @property
+     def dimension(self) -> int:
+          return self.model.get_sentence_embedding_dimension()
+
+     def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+          return self.model.encode(
+               texts,
+               convert_to_numpy=True,
+               normalize_embeddings=True,  # L2 normalize by default
+               batch_size=batch_size
+          )
+
+
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = True) -> str:
+     """
+     Export the SentenceTransformer's transformer to ONNX, optionally with
+     dynamic int8 weight quantization. Writes model.onnx (or model_int8.onnx),
+     the tokenizer and a pooling config to output_dir and returns the model path.
+     """
+     from sentence_transformers import SentenceTransformer
+     import torch
+
+     os.makedirs(output_dir, exist_ok=True)
+     st_model = SentenceTransformer(model_name, device="cpu")
+     transformer = st_model[0].auto_model.eval()
+     tokenizer = st_model.tokenizer
+     pooling_mode = st_model[1].get_pooling_mode_str()  # 'cls' for bge, 'mean' for most others
+
+     class _LastHiddenState(torch.nn.Module):
+          def __init__(self, model):
+               super().__init__()
+               self.model = model
+
+          def forward(self, input_ids, attention_mask, token_type_ids):
+               return self.model(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    token_type_ids=token_type_ids
+               ).last_hidden_state
+
+     dummy = tokenizer(["export sample"], return_tensors="pt", return_token_type_ids=True)
+     fp32_path = os.path.join(output_dir, "model.onnx")
+     dynamic = {0: "batch", 1: "sequence"}
+     with torch.no_grad():
+          torch.onnx.export(
+               _LastHiddenState(transformer),
+               (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+               fp32_path,
+               input_names=["input_ids", "attention_mask", "token_type_ids"],
+               output_names=["last_hidden_state"],
+               dynamic_axes={
+                    "input_ids": dynamic,
+                    "attention_mask": dynamic,
+                    "token_type_ids": dynamic,
+                    "last_hidden_state": dynamic
+               },
+               opset_version=17
+          )
+
+     model_path = fp32_path
+     if quantize:
+          from onnxruntime.quantization import quantize_dynamic, QuantType
+          model_path = os.path.join(output_dir, "model_int8.onnx")
+          quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+
+     tokenizer.save_pretrained(output_dir)
+     with open(os.path.join(output_dir, "embedding_config.json"), "w") as f:
+          json.dump({
+               "model_name": model_name,
+               "pooling_mode": pooling_mode,
+               "max_seq_length": st_model.max_seq_length,
+               "dimension": st_model.get_sentence_embedding_dimension(),
+               "model_file": os.path.basename(model_path)
+          }, f, indent=2)
+     return model_path
+
+
+class OnnxEmbeddingBackend:
+     """
+     onnxruntime CPU backend. Tokenization, pooling and L2 normalization
+     mirror SentenceTransformer.encode(normalize_embeddings=True).
+     """
+     def __init__(self, model_name: str, onnx_dir: str, quantize: bool = True, num_threads: int = 0):
+          import onnxruntime as ort
+          from transformers import AutoTokenizer
+
+          self.model_name = model_name
+          self.name = "onnx-int8" if quantize else "onnx"
+          model_dir = os.path.join(onnx_dir, model_name.replace("/", "__"))
+          model_file = "model_int8.onnx" if quantize else "model.onnx"
+          if not os.path.exists(os.path.join(model_dir, model_file)):
+               print(f"Exporting {model_name} to ONNX in {model_dir} ...")
+               export_onnx_model(model_name, model_dir, quantize=quantize)
+
+          with open(os.path.join(model_dir, "embedding_config.json")) as f:
+               config = json.load(f)
+          self.pooling_mode = config["pooling_mode"]
+          self.max_seq_length = config["max_seq_length"]
+          self._dimension = config["dimension"]
+
+          options = ort.SessionOptions()
+          options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+          if num_threads:
+               options.intra_op_num_threads = num_threads
+          self.session = ort.InferenceSession(
+               os.path.join(model_dir, model_file),
+               sess_options=options,
+               providers=["CPUExecutionProvider"]
+          )
+          self._input_names = {i.name for i in self.session.get_inputs()}
+          self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+     @property
+     def dimension(self) -> int:
+          return self._dimension
+
+     def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+          if self.pooling_mode == "cls":
+               return hidden[:, 0]
+          mask = attention_mask[..., None].astype(hidden.dtype)
+          return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+     def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+          if isinstance(texts, str):
+               return self.encode([texts], batch_size)[0]
+          outputs = []
+          for start in range(0, len(texts), batch_size):
+               batch = texts[start:start + batch_size]
+               tokens = self.tokenizer(
+                    batch,
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_seq_length,
+                    return_tensors="np",
+                    return_token_type_ids=True
+               )
+               feed = {k: v.astype(np.int64) for k, v in tokens.items() if k in self._input_names}
+               hidden = self.session.run(["last_hidden_state"], feed)[0]
+               outputs.append(self._pool(hidden, tokens["attention_mask"]))
+          if not outputs:
+               return np.empty((0, self._dimension), dtype=np.float32)
+          embeddings = np.concatenate(outputs).astype(np.float32)
+          embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+          return embeddings
+
+
+def backend_cache_name(backend: Optional[str] = None) -> str:
+     """Backend label used to namespace cached embeddings, without loading the model"""
+     backend = (backend or settings.EMBEDDING_BACKEND).lower()
+     if backend == "onnx":
+          return "onnx-int8" if settings.EMBEDDING_ONNX_QUANTIZE else "onnx"
+     return backend
+
+
+def create_embedding_backend(model_name: str, backend: Optional[str] = None):
+     """Build the inference backend selected by EMBEDDING_BACKEND"""
+     backend = (backend or settings.EMBEDDING_BACKEND).lower()
+     if backend == "torch":
+          return TorchEmbeddingBackend(model_name)
+     if backend == "onnx":
+          return OnnxEmbeddingBackend(
+               model_name,
+               onnx_dir=settings.EMBEDDING_ONNX_DIR,
+               quantize=settings.EMBEDDING_ONNX_QUANTIZE,
+               num_threads=settings.EMBEDDING_ONNX_THREADS
+          )
+     raise ValueError(f"Unknown embedding backend: {backend}")
@@ -0,0 +1,104 @@
+from typing import List, Dict, Tuple
+import numpy as np
+import asyncio
+import time
+
+
+class EmbeddingBatcher:
+     """
+     Micro-batcher for single-text embedding requests.
+
+     Concurrent callers are queued and flushed as one encode batch once
+     either `max_batch_size` texts are waiting or `max_wait_ms` has passed
+     since the first queued text. Each caller gets back its own row;
+     requests cancelled before their batch runs are not encoded.
+     """
+     def __init__(self, encode_batch, max_batch_size: int = 32, max_wait_ms: float = 5.0, max_inflight: int = 1):
+          self._encode_batch = encode_batch  # async callable: List[str] -> np.ndarray
+          self.max_batch_size = max(1, max_batch_size)
+          self.max_wait = max(0.0, max_wait_ms) / 1000.0
+          self.max_inflight = max(1, max_inflight)
+          self._pending: List[Tuple[str, asyncio.Future, float]] = []
+          self._flush_handle = None
+          self._inflight = None
+          self._stats = {
+               "requests": 0,
+               "batches": 0,
+               "batched_texts": 0,
+               "max_batch_size": 0,
+               "queue_wait_total_ms": 0.0,
+               "queue_wait_max_ms": 0.0,
+               "encode_total_ms": 0.0,
+          }
+
+     async def submit(self, text: str) -> np.ndarray:
+          """Queue a text and wait for its embedding row"""
+          loop = asyncio.get_running_loop()
+          future = loop.create_future()
+          self._pending.append((text, future, time.perf_counter()))
+          self._stats["requests"] += 1
+
+          if len(self._pending) >= self.max_batch_size:
+               self._flush()
+          elif self._flush_handle is None:
+               self._flush_handle = loop.call_later(self.max_wait, self._flush)
+          return await future
+
+     def _flush(self):
+          if self._flush_handle is not None:
+               self._flush_handle.cancel()
+               self._flush_handle = None
+          if not self._pending:
+               return
+          batch = self._pending[:self.max_batch_size]
+          self._pending = self._pending[self.max_batch_size:]
+          asyncio.get_running_loop().create_task(self._run_batch(batch))
+          # Anything left over starts a new wait window
+          if self._pending:
+               self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+     async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]):
+          if self._inflight is None:
+               self._inflight = asyncio.Semaphore(self.max_inflight)
+
+          async with self._inflight:
+               # Callers cancelled while queued (e.g. on a search cache hit) need no encode
+               batch = [entry for entry in batch if not entry[1].done()]
+               if not batch:
+                    return
+               started = time.perf_counter()
+               for _, _, enqueued in batch:
+                    wait_ms = (started - enqueued) * 1000
+                    self._stats["queue_wait_total_ms"] += wait_ms
+                    self._stats["queue_wait_max_ms"] = max(self._stats["queue_wait_max_ms"], wait_ms)
+
+               # Identical texts in the same window are encoded once
+               unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+               try:
+                    embeddings = await self._encode_batch(unique_texts)
+               except Exception as e:
+                    for _, future, _ in batch:
+                         if not future.done():
+                              future.set_exception(e)
+                    return
+
+               self._stats["batches"] += 1
+               self._stats["batched_texts"] += len(unique_texts)
+               self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(unique_texts))
+               self._stats["encode_total_ms"] += (time.perf_counter() - started) * 1000
+
+               row_of = {text: i for i, text in enumerate(unique_texts)}
+               for text, future, _ in batch:
+                    if not future.done():
+                         future.set_result(embeddings[row_of[text]])
+
+     def get_stats(self) -> Dict:
+          """Batch size and queue time counters"""
+          stats = dict(self._stats)
+          batches = stats["batches"] or 1
+          requests = stats["requests"] or 1
+          stats["avg_batch_size"] = stats["batched_texts"] / batches
+          stats["avg_queue_wait_ms"] = stats["queue_wait_total_ms"] / requests
+          stats["avg_encode_ms"] = stats["encode_total_ms"] / batches
+          stats["pending"] = len(self._pending)
+          return stats
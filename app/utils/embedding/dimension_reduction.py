@@ -0,0 +1,108 @@
+from app.config.settings import settings
+from functools import lru_cache
+from typing import Optional, Tuple
+import numpy as np
+import hashlib
+import os
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+     norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+     return embeddings / np.clip(norms, 1e-12, None)
+
+
+def fit_pca(embeddings: np.ndarray, target_dim: int) -> Tuple[np.ndarray, np.ndarray]:
+     """Fit a PCA projection on full-size embeddings; returns (mean, components)"""
+     embeddings = np.asarray(embeddings, dtype=np.float32)
+     mean = embeddings.mean(axis=0)
+     # Rows of vt are the principal axes, ordered by explained variance
+     _, _, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+     return mean.astype(np.float32), vt[:target_dim].astype(np.float32)
+
+
+def save_pca(path: str, mean: np.ndarray, components: np.ndarray):
+     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+     np.savez(path, mean=mean, components=components)
+
+
+class DimensionReducer:
+     """
+     Maps full model embeddings to a smaller index dimension.
+
+     - "none":     identity
+     - "truncate": keep the first target_dim values and renormalize
+                   (Matryoshka style; loses more on models not trained for it)
+     - "pca":      project onto a PCA basis fitted offline on the catalog
+                   (scripts/embedding_dimensions.py fit) and renormalize
+
+     Applied to product and query embeddings alike, so both live in the
+     same reduced space. `tag` goes into cache keys and stored vector
+     metadata so vectors from different spaces never mix.
+     """
+     def __init__(self, mode: str = "none", target_dim: Optional[int] = None, pca_path: Optional[str] = None):
+          self.mode = mode.lower()
+          self.target_dim = target_dim
+          self.mean = None
+          self.components = None
+
+          if self.mode == "none":
+               self.tag = "full"
+          elif self.mode == "truncate":
+               if not target_dim:
+                    raise ValueError("truncate mode needs EMBEDDING_TARGET_DIM")
+               self.tag = f"trunc{target_dim}"
+          elif self.mode == "pca":
+               if not pca_path or not os.path.exists(pca_path):
+                    raise ValueError(f"PCA projection not found at {pca_path}; fit it first")
+               with np.load(pca_path) as data:
+                    self.mean = data["mean"].astype(np.float32)
+                    self.components = data["components"].astype(np.float32)
+               self.target_dim = self.components.shape[0]
+               fingerprint = hashlib.blake2b(self.components.tobytes(), digest_size=4).hexdigest()
+               self.tag = f"pca{self.target_dim}-{fingerprint}"
+          else:
+               raise ValueError(f"Unknown dimension reduction mode: {mode}")
+
+     def output_dim(self, input_dim: int) -> int:
+          return input_dim if self.mode == "none" else self.target_dim
+
+     def reduce(self, embeddings: np.ndarray) -> np.ndarray:
+          if self.mode == "none":
+               return embeddings
+          embeddings = np.asarray(embeddings, dtype=np.float32)
+          if self.mode == "truncate":
+               reduced = embeddings[..., :self.target_dim]
+          else:
+               reduced = (embeddings - self.mean) @ self.components.T
+          return _normalize(reduced).astype(np.float32)
+
+
+def create_dimension_reducer() -> DimensionReducer:
+     return DimensionReducer(
+          mode=settings.EMBEDDING_DIM_REDUCTION,
+          target_dim=settings.EMBEDDING_TARGET_DIM,
+          pca_path=settings.EMBEDDING_PCA_PATH
+     )
+
+
+@lru_cache(maxsize=4)
+def _pca_output_dim(path: str, mtime: float) -> int:
+     with np.load(path) as data:
+          return int(data["components"].shape[0])
+
+
+def configured_embedding_dim() -> int:
+     """
+     Dimension of stored/query vectors, known without loading the model.
+     For pca it is that of the fitted projection the reducer loads, which
+     may differ from EMBEDDING_TARGET_DIM (the fit script's default).
+     """
+     mode = settings.EMBEDDING_DIM_REDUCTION.lower()
+     if mode == "none":
+          return settings.EMBEDDING_MODEL_DIM
+     if mode == "pca":
+          path = settings.EMBEDDING_PCA_PATH
+          if not os.path.exists(path):
+               raise ValueError(f"PCA projection not found at {path}; fit it first")
+          return _pca_output_dim(path, os.path.getmtime(path))
+     return settings.EMBEDDING_TARGET_DIM
@@ -1,121 +1,215 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator, AsyncIterator
+from itertools import islice
 import hashlib
 from functools import lru_cache
-import torch
+from app.config.settings import settings
+from .model_registry import get_shared_embedding_model, DEFAULT_EMBEDDING_MODEL
+from .batcher import EmbeddingBatcher
+from .dimension_reduction import configured_embedding_dim
 import asyncio
+import time
+
+# Token length estimate for bucketing when the tokenizer lives in the worker pool
+CHARS_PER_TOKEN = 4
+
+
+def token_budget_batches(sorted_lengths: np.ndarray, token_budget: int) -> List[Tuple[int, int]]:
+     """
+     Split ascending token lengths into [start, end) batches whose padded
+     size (rows * longest row) stays within token_budget.
+     """
+     batches = []
+     start = 0
+     for i, length in enumerate(sorted_lengths):
+          # Lengths ascend, so the current text is the longest in the batch
+          if i > start and (i - start + 1) * int(length) > token_budget:
+               batches.append((start, i))
+               start = i
+     if start < len(sorted_lengths):
+          batches.append((start, len(sorted_lengths)))
+     return batches
+
 
 class LocalEmbeddingService:
-     def __init__(self, model_name: str = "BAAI/bge-base-en-v1.5"):
-          self.model = SentenceTransformer(model_name)
-          if torch.cuda.is_available():
-               self.model = self.model.to('cuda')
-          self._setup_cache = {}
-          self._cache_size_limit = 1000
-     async def generate_embedding(self, text: str) -> np.ndarray:
-          """Generate embedding for a single text"""
-          # Run in thread pool to avoid blocking
-          embedding = await asyncio.to_thread(
-               self.model.encode,
-               text,
-               convert_to_numpy=True,
-               normalize_embeddings=True  # L2 normalize by default
-          )
-          return embedding
+     def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
+          # Weights, cache and batcher are process-wide per model; the model
+          # itself is only loaded on first encode
+          self.model_name = model_name
+          self.shared = get_shared_embedding_model(model_name)
+          self.cache = self.shared.cache
+          self.batcher = self.shared.batcher
+          self._bulk_stats = self.shared.bulk_stats
 
-     async def generate_embeddings_batch(self, texts: List[str]) -> np.ndarray:
-          """Generate embeddings for multiple texts efficiently"""
-          embeddings = await asyncio.to_thread(
-               self.model.encode,
+     @property
+     def vector_space(self) -> str:
+          """Identifies the embedding space; vectors from different spaces must not be mixed"""
+          return self.cache.namespace
+
+     @property
+     def dimension(self) -> int:
+          """Output dimension after any configured reduction"""
+          return configured_embedding_dim()
+
+     @property
+     def backend(self):
+          """torch SentenceTransformer or quantized onnxruntime, per EMBEDDING_BACKEND"""
+          return self.shared.backend
+
+     def _token_lengths(self, texts: List[str]) -> np.ndarray:
+          if settings.EMBEDDING_WORKERS > 0:
+               # Tokenizing here would load the model into the API process; estimate instead
+               return np.fromiter((len(text) // CHARS_PER_TOKEN + 2 for text in texts), dtype=np.int64, count=len(texts))
+          input_ids = self.backend.tokenizer(
                texts,
-               convert_to_numpy=True,
-               normalize_embeddings=True,
-               batch_size=32
-          )
-          return embeddings
+               truncation=True,
+               max_length=self.backend.max_seq_length
+          )["input_ids"]
+          return np.fromiter((len(ids) for ids in input_ids), dtype=np.int64, count=len(texts))
 
-     def _get_setup_cache_key(self, setup: Dict) -> str:
-          """Generate cache key from setup dict"""
-          setup_str = str(sorted(setup.items()))
-          return hashlib.md5(setup_str.encode()).hexdigest()
+     def _bucketed_batches(self, texts: List[str], token_budget: int) -> Tuple[np.ndarray, List[np.ndarray]]:
+          """Token lengths, and row indices of each batch of the length-sorted texts"""
+          lengths = self._token_lengths(texts)
+          order = np.argsort(lengths, kind="stable")
+          return lengths, [order[start:end] for start, end in token_budget_batches(lengths[order], token_budget)]
 
-     async def generate_weighted_search_vector(
-          self, 
-          query_text: str, 
-          setup_text: str,
-          query_weight: float = 0.7,
-          setup_weight: float = 0.3,
-          use_cache: bool = True
-) -> List[float]:
+     def _record_bulk(self, texts: List[str], lengths: np.ndarray, started: float):
+          self._bulk_stats["texts"] += len(texts)
+          self._bulk_stats["tokens"] += int(lengths.sum())
+          self._bulk_stats["seconds"] += time.perf_counter() - started
+
+     def _encode_bucketed_chunk(self, texts: List[str], token_budget: int) -> np.ndarray:
+          """Encode one chunk sorted by token length with the in-process model, returned in input order"""
+          embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+          if not texts:
+               return embeddings
+          started = time.perf_counter()
+          lengths, batches = self._bucketed_batches(texts, token_budget)
+          for rows in batches:
+               embeddings[rows] = self.shared.encode([texts[i] for i in rows], len(rows))
+          self._record_bulk(texts, lengths, started)
+          return embeddings
+
+     async def _encode_bucketed_chunk_async(self, texts: List[str], token_budget: int) -> np.ndarray:
           """
-          IMPROVED: Better combination strategy with caching
-          
-          Combines query and setup embeddings with proper normalization.
-          Now uses concatenation + embedding for better semantic alignment.
+          _encode_bucketed_chunk off the event loop. With EMBEDDING_WORKERS > 0
+          the batches go to the worker pool, two per worker in flight, and the
+          model is never loaded in this process.
           """
-          
-          # Strategy 1: Concatenate and embed (RECOMMENDED)
-          # This allows the model to see both contexts together
-          combined_text = self._create_combined_context(query_text, setup_text)
-          combined_embedding = await self.generate_embedding(combined_text)
-          
-          return combined_embedding.tolist()
-     async def generate_weighted_search_vector_separate(
+          if settings.EMBEDDING_WORKERS == 0:
+               return await asyncio.to_thread(self._encode_bucketed_chunk, texts, token_budget)
+          embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+          if not texts:
+               return embeddings
+          started = time.perf_counter()
+          lengths, batches = self._bucketed_batches(texts, token_budget)
+          in_flight = asyncio.Semaphore(2 * settings.EMBEDDING_WORKERS)
+
+          async def encode(rows: np.ndarray):
+               async with in_flight:
+                    # Copy out, so the pool's shared-memory slot is released right away
+                    embeddings[rows] = await self.shared.encode_async([texts[i] for i in rows])
+
+          await asyncio.gather(*(encode(rows) for rows in batches))
+          self._record_bulk(texts, lengths, started)
+          return embeddings
+
+     def iter_embeddings_bucketed(
           self,
-          query_text: str,
-          setup_text: str,
-          query_weight: float = 0.7,
-          setup_weight: float = 0.3,
-          use_cache: bool = True
-     ) -> List[float]:
-               """
-               Alternative: Separate embeddings with weighted combination
-               Use this if concatenation makes queries too long
-               """
-               
-               # Generate query embedding
-               v_query = await self.generate_embedding(query_text)
-               
-               # Check cache for setup embedding
-               setup_cache_key = None
-               if use_cache:
-                    setup_cache_key = self._get_setup_cache_key({"text": setup_text})
-                    if setup_cache_key in self._setup_cache:
-                         v_setup = self._setup_cache[setup_cache_key]
-                    else:
-                         v_setup = await self.generate_embedding(setup_text)
-                         self._cache_setup_embedding(setup_cache_key, v_setup)
-               else:
-                    v_setup = await self.generate_embedding(setup_text)
-               
-               # Weighted combination with proper normalization
-               combined_vector = (query_weight * v_query) + (setup_weight * v_setup)
-               
-               # L2 normalize the result
-               norm = np.linalg.norm(combined_vector)
-               if norm > 0:
-                    combined_vector = combined_vector / norm
-               
-               return combined_vector.tolist()
-          
-     def _create_combined_context(self, query: str, setup: str) -> str:
+          texts: Iterable[str],
+          token_budget: Optional[int] = None,
+          chunk_size: Optional[int] = None
+     ) -> Iterator[np.ndarray]:
           """
-          Create a unified context that helps the model understand both
-          the query and user preferences together
+          Bulk encode with length bucketing. Texts are consumed chunk_size at a
+          time, sorted by token length within the chunk and batched under a
+          token budget instead of a fixed count, so padding is minimal. Yields
+          one array per chunk in input order; memory stays bounded by the chunk.
+          Encodes with the in-process model; stream_embeddings_bucketed uses
+          the worker pool when one is configured.
           """
-          return f"""User searching for: {query}
+          token_budget = token_budget or settings.EMBEDDING_BULK_TOKEN_BUDGET
+          chunk_size = chunk_size or settings.EMBEDDING_BULK_CHUNK_SIZE
+          iterator = iter(texts)
+          while True:
+               chunk = list(islice(iterator, chunk_size))
+               if not chunk:
+                    return
+               yield self._encode_bucketed_chunk(chunk, token_budget)
 
-     User preferences and context:
-     {setup}
+     async def stream_embeddings_bucketed(
+          self,
+          texts: Iterable[str],
+          token_budget: Optional[int] = None,
+          chunk_size: Optional[int] = None
+     ) -> AsyncIterator[np.ndarray]:
+          """Async variant of iter_embeddings_bucketed; each chunk is encoded off the event loop (or in the worker pool)"""
+          token_budget = token_budget or settings.EMBEDDING_BULK_TOKEN_BUDGET
+          chunk_size = chunk_size or settings.EMBEDDING_BULK_CHUNK_SIZE
+          iterator = iter(texts)
+          while True:
+               chunk = list(islice(iterator, chunk_size))
+               if not chunk:
+                    return
+               yield await self._encode_bucketed_chunk_async(chunk, token_budget)
 
-     Find products matching the search query that align with user preferences."""
-     
-     def _cache_setup_embedding(self, cache_key: str, embedding: np.ndarray):
-          """Cache user setup embedding with LRU eviction"""
-          if len(self._setup_cache) >= self._cache_size_limit:
-               self._setup_cache.pop(next(iter(self._setup_cache)))
-          self._setup_cache[cache_key] = embedding
+     async def generate_embedding(self, text: str, use_cache: bool = True) -> np.ndarray:
+          """Generate embedding for a single text"""
+          if use_cache:
+               cached = self.cache.get(text)
+               if cached is not None:
+                    return cached
+          embedding = await self.batcher.submit(text)
+          if use_cache:
+               self.cache.put(text, embedding)
+          return embedding
+
+     def get_stats(self) -> Dict:
+          """Embedding throughput and cache counters"""
+          seconds = self._bulk_stats["seconds"] or 1e-9
+          return {
+               "batcher": self.batcher.get_stats(),
+               "cache": self.cache.get_stats(),
+               "bulk": {
+                    **self._bulk_stats,
+                    "texts_per_sec": self._bulk_stats["texts"] / seconds,
+                    "tokens_per_sec": self._bulk_stats["tokens"] / seconds
+               }
+          }
+
+     async def generate_embeddings_batch(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+          """Generate embeddings for multiple texts efficiently"""
+          if not use_cache:
+               return await self._encode_bucketed_chunk_async(texts, settings.EMBEDDING_BULK_TOKEN_BUDGET)
+
+          cached = self.cache.get_many(texts)
+          missing = list(dict.fromkeys(t for t, e in zip(texts, cached) if e is None))
+          if missing:
+               encoded = await self._encode_bucketed_chunk_async(missing, settings.EMBEDDING_BULK_TOKEN_BUDGET)
+               self.cache.put_many(missing, encoded)
+               fresh = dict(zip(missing, encoded))
+               cached = [e if e is not None else fresh[t] for t, e in zip(texts, cached)]
+          return np.stack(cached) if cached else np.empty((0, 0), dtype=np.float32)
+
+     @staticmethod
+     def combine_weighted_vectors(
+          v_query: np.ndarray,
+          v_setup: np.ndarray,
+          query_weight: float = 0.7,
+          setup_weight: float = 0.3
+     ) -> np.ndarray:
+          """Weighted sum of two embeddings, L2 normalized"""
+          combined_vector = (query_weight * np.asarray(v_query, dtype=np.float32)) + \
+               (setup_weight * np.asarray(v_setup, dtype=np.float32))
+          norm = np.linalg.norm(combined_vector)
+          if norm > 0:
+               combined_vector = combined_vector / norm
+          return combined_vector
+
+     async def generate_preference_vector(self, setup: Dict) -> np.ndarray:
+          """Embedding of a user's setup, stored with the setup and reused at search time"""
+          setup_text = await self.create_setup_text(setup)
+          return await self.generate_embedding(setup_text)
 
      async def create_product_text(self, product) -> str:
           """Enhanced product text with better structure"""
@@ -0,0 +1,264 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import asyncio
+import hashlib
+import fcntl
+import time
+import os
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+     """Collapse whitespace so trivially different texts share a cache entry"""
+     return _WHITESPACE.sub(" ", text).strip()
+
+
+def text_key(namespace: str, text: str) -> bytes:
+     """Content address for (model, normalized text)"""
+     digest = hashlib.blake2b(digest_size=16)
+     digest.update(namespace.encode("utf-8"))
+     digest.update(b"\0")
+     digest.update(normalize_text(text).encode("utf-8"))
+     return digest.digest()
+
+
+class DiskEmbeddingStore:
+     """
+     Append-only float32 embedding store backed by a memory-mapped file.
+
+     Layout: 16 byte header (magic + dim) followed by fixed size records of
+     16 byte key + dim float32 values. Appends are serialized with flock so
+     several uvicorn workers can share one file; readers remap when the file
+     grows and pick up rows written by other processes. Within a process,
+     writes run in a worker thread; a lookup that finds the store busy
+     remapping or writing reports a miss instead of waiting.
+     """
+     MAGIC = b"EMBC"
+     HEADER_SIZE = 16
+     KEY_SIZE = 16
+
+     def __init__(self, path: str, max_rows: int = 500_000):
+          self.path = path
+          self.max_rows = max_rows
+          self.dim: Optional[int] = None
+          self._records = None
+          self._index: Dict[bytes, int] = {}
+          self._rows = 0
+          self._mapped_size = 0
+          self._lock = threading.Lock()
+          os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+          self._read_header()
+
+     def _read_header(self):
+          if not os.path.exists(self.path) or os.path.getsize(self.path) < self.HEADER_SIZE:
+               return
+          with open(self.path, "rb") as f:
+               header = f.read(self.HEADER_SIZE)
+          if header[:4] != self.MAGIC:
+               raise ValueError(f"{self.path} is not an embedding cache file")
+          self.dim = int(np.frombuffer(header[4:8], dtype="<u4")[0])
+
+     def _record_dtype(self) -> np.dtype:
+          return np.dtype([("key", f"V{self.KEY_SIZE}"), ("vec", "<f4", (self.dim,))])
+
+     def _refresh(self):
+          """Map rows appended since the last refresh"""
+          if self.dim is None:
+               self._read_header()
+               if self.dim is None:
+                    return
+          size = os.path.getsize(self.path)
+          if size == self._mapped_size:
+               return
+          dtype = self._record_dtype()
+          rows = (size - self.HEADER_SIZE) // dtype.itemsize  # ignore a partially written tail
+          if rows <= 0:
+               return
+          self._records = np.memmap(self.path, dtype=dtype, mode="r", offset=self.HEADER_SIZE, shape=(rows,))
+          for i, key in enumerate(self._records["key"][self._rows:], self._rows):
+               self._index.setdefault(bytes(key), i)
+          self._rows = rows
+          self._mapped_size = self.HEADER_SIZE + rows * dtype.itemsize
+
+     def __len__(self) -> int:
+          return len(self._index)
+
+     def get(self, key: bytes) -> Optional[np.ndarray]:
+          row = self._index.get(key)
+          if row is None:
+               if not self._lock.acquire(blocking=False):
+                    return None
+               try:
+                    self._refresh()
+               finally:
+                    self._lock.release()
+               row = self._index.get(key)
+               if row is None:
+                    return None
+          return np.array(self._records["vec"][row], dtype=np.float32)
+
+     def put_many(self, items: List[Tuple[bytes, np.ndarray]]) -> int:
+          """Append new rows, returns how many were written"""
+          if not items:
+               return 0
+          dim = int(np.asarray(items[0][1]).shape[-1])
+          with self._lock, open(self.path, "ab") as f:
+               fcntl.flock(f, fcntl.LOCK_EX)
+               try:
+                    # Another worker may have written the header since open(); the position is stale
+                    if os.fstat(f.fileno()).st_size == 0:
+                         f.write(self.MAGIC + np.array([dim], dtype="<u4").tobytes() + bytes(8))
+                         f.flush()
+                    self._refresh()
+                    if self.dim != dim:
+                         return 0
+                    fresh = [(k, v) for k, v in dict(items).items() if k not in self._index]
+                    fresh = fresh[:max(0, self.max_rows - len(self._index))]
+                    if not fresh:
+                         return 0
+                    records = np.empty(len(fresh), dtype=self._record_dtype())
+                    records["key"] = [k for k, _ in fresh]
+                    records["vec"] = np.stack([np.asarray(v, dtype=np.float32) for _, v in fresh])
+                    f.write(records.tobytes())
+                    f.flush()
+               finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+               self._refresh()
+          return len(fresh)
+
+
+class EmbeddingCache:
+     """
+     Two-tier embedding cache keyed by (model name, normalized text hash).
+
+     Tier 1 is an in-process LRU with TTL, tier 2 an optional on-disk
+     DiskEmbeddingStore that survives restarts and is shared across workers.
+     The TTL only bounds how long a vector stays in memory: disk rows are
+     permanent (up to disk_max_rows). Disk writes are queued and appended
+     in batches from a worker thread, so a miss never blocks the event loop
+     on flock or file I/O; rows still queued when the loop shuts down are
+     written then. An embedding never goes stale for
+     its key, since the namespace names the model, backend and reduction
+     (PCA fingerprint included); a new space starts a new file.
+     """
+     DISK_FLUSH_SECONDS = 0.2
+
+     def __init__(
+          self,
+          namespace: str,
+          max_size: int = 1000,
+          ttl: int = 3600 * 24,
+          cache_dir: Optional[str] = None,
+          disk_max_rows: int = 500_000
+     ):
+          self.namespace = namespace
+          self.max_size = max_size
+          self.ttl = ttl
+          self._memory: "OrderedDict[bytes, Tuple[float, np.ndarray]]" = OrderedDict()
+          self._disk_queue: List[Tuple[bytes, np.ndarray]] = []
+          self._disk_flush: Optional[asyncio.Task] = None
+          self.disk = None
+          if cache_dir:
+               file_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", namespace) + ".emb"
+               self.disk = DiskEmbeddingStore(os.path.join(cache_dir, file_name), max_rows=disk_max_rows)
+          self._stats = {
+               "memory_hits": 0,
+               "disk_hits": 0,
+               "misses": 0,
+               "evictions": 0,
+               "expirations": 0,
+               "disk_writes": 0,
+          }
+
+     def key(self, text: str) -> bytes:
+          return text_key(self.namespace, text)
+
+     def _remember(self, key: bytes, embedding: np.ndarray):
+          self._memory[key] = (time.monotonic() + self.ttl, embedding)
+          self._memory.move_to_end(key)
+          while len(self._memory) > self.max_size:
+               self._memory.popitem(last=False)
+               self._stats["evictions"] += 1
+
+     def get(self, text: str) -> Optional[np.ndarray]:
+          key = self.key(text)
+          entry = self._memory.get(key)
+          if entry is not None:
+               expires_at, embedding = entry
+               if expires_at > time.monotonic():
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return embedding
+               del self._memory[key]
+               self._stats["expirations"] += 1
+
+          if self.disk is not None:
+               embedding = self.disk.get(key)
+               if embedding is not None:
+                    self._stats["disk_hits"] += 1
+                    self._remember(key, embedding)
+                    return embedding
+
+          self._stats["misses"] += 1
+          return None
+
+     def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+          return [self.get(text) for text in texts]
+
+     def put(self, text: str, embedding: np.ndarray):
+          self.put_many([text], [embedding])
+
+     def put_many(self, texts: List[str], embeddings):
+          items = []
+          for text, embedding in zip(texts, embeddings):
+               key = self.key(text)
+               # Copy: the row may be a view into a batch or a worker pool slot
+               embedding = np.array(embedding, dtype=np.float32)
+               self._remember(key, embedding)
+               items.append((key, embedding))
+          if self.disk is None:
+               return
+          try:
+               loop = asyncio.get_running_loop()
+          except RuntimeError:
+               # No event loop (a worker thread or plain script): nothing to block
+               self._write_disk(items)
+               return
+          self._disk_queue.extend(items)
+          # A task left on another (closed) loop would never run
+          if self._disk_flush is None or self._disk_flush.get_loop() is not loop:
+               self._disk_flush = loop.create_task(self._flush_disk_later())
+
+     def _write_disk(self, items: List[Tuple[bytes, np.ndarray]]):
+          try:
+               self._stats["disk_writes"] += self.disk.put_many(items)
+          except OSError as e:
+               print(f"Embedding disk cache write failed: {e}")
+
+     async def _flush_disk_later(self):
+          """Let misses accumulate for DISK_FLUSH_SECONDS, then append them in one batch off the loop"""
+          try:
+               await asyncio.sleep(self.DISK_FLUSH_SECONDS)
+               while self._disk_queue:
+                    items, self._disk_queue = self._disk_queue, []
+                    await asyncio.to_thread(self._write_disk, items)
+          except asyncio.CancelledError:
+               # Loop shutting down: persist what is left rather than drop it
+               items, self._disk_queue = self._disk_queue, []
+               self._write_disk(items)
+               raise
+          finally:
+               self._disk_flush = None
+
+     def get_stats(self) -> Dict:
+          stats = dict(self._stats)
+          lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+          stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+          stats["memory_size"] = len(self._memory)
+          stats["disk_rows"] = len(self.disk) if self.disk is not None else 0
+          stats["disk_queued"] = len(self._disk_queue)
+          return stats
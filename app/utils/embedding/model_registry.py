@@ -0,0 +1,144 @@
+from app.config.settings import settings
+from .backends import create_embedding_backend, backend_cache_name
+from .embedding_cache import EmbeddingCache
+from .batcher import EmbeddingBatcher
+from .worker_pool import EmbeddingWorkerPool
+from .dimension_reduction import create_dimension_reducer
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import asyncio
+import gc
+
+DEFAULT_EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
+
+
+class SharedEmbeddingModel:
+     """
+     Process-wide state for one embedding model: the inference backend
+     (loaded lazily, exactly once) or, with EMBEDDING_WORKERS > 0, an
+     out-of-process worker pool, plus the embedding cache, the micro-batcher
+     and bulk throughput counters. Every LocalEmbeddingService for the same
+     model delegates here, so constructing a service per request is cheap.
+     """
+     def __init__(self, model_name: str, backend_name: str):
+          self.model_name = model_name
+          self.backend_name = backend_name
+          self._backend = None
+          self._lock = threading.Lock()
+          self._pool: Optional[EmbeddingWorkerPool] = None
+          self._pool_lock = None
+          # Optional truncation / PCA to the index dimension, applied to every encode
+          self.reducer = create_dimension_reducer()
+          self.cache = EmbeddingCache(
+               namespace=f"{model_name}:{backend_cache_name(backend_name)}:{self.reducer.tag}",
+               max_size=settings.EMBEDDING_CACHE_SIZE,
+               ttl=settings.EMBEDDING_CACHE_TTL,
+               cache_dir=settings.EMBEDDING_CACHE_DIR if settings.EMBEDDING_DISK_CACHE_ENABLED else None,
+               disk_max_rows=settings.EMBEDDING_DISK_CACHE_MAX_ROWS
+          )
+          # Coalesce concurrent single-text requests into one encode call
+          self.batcher = EmbeddingBatcher(
+               self.encode_async,
+               max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+               max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+               # Keep every pool worker busy when inference runs out of process
+               max_inflight=max(settings.EMBEDDING_BATCH_MAX_INFLIGHT, settings.EMBEDDING_WORKERS)
+          )
+          self.bulk_stats = {"texts": 0, "tokens": 0, "seconds": 0.0}
+
+     @property
+     def loaded(self) -> bool:
+          return self._backend is not None
+
+     @property
+     def backend(self):
+          if self._backend is None:
+               with self._lock:
+                    if self._backend is None:
+                         self._backend = create_embedding_backend(self.model_name, self.backend_name)
+          return self._backend
+
+     @property
+     def dimension(self) -> int:
+          return self.reducer.output_dim(self.backend.dimension)
+
+     def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+          """Encode (blocking) and reduce to the configured index dimension"""
+          return self.reducer.reduce(self.backend.encode(texts, batch_size))
+
+     async def _get_pool(self) -> EmbeddingWorkerPool:
+          if self._pool is None:
+               if self._pool_lock is None:
+                    self._pool_lock = asyncio.Lock()
+               async with self._pool_lock:
+                    if self._pool is None:
+                         cpus = [int(c) for c in settings.EMBEDDING_WORKER_CPUS.split(",") if c.strip()]
+                         pool = EmbeddingWorkerPool(
+                              self.model_name,
+                              self.backend_name,
+                              num_workers=settings.EMBEDDING_WORKERS,
+                              cpus=cpus,
+                              threads_per_worker=settings.EMBEDDING_WORKER_THREADS,
+                              slot_rows=max(settings.EMBEDDING_WORKER_SLOT_ROWS, settings.EMBEDDING_BATCH_MAX_SIZE)
+                         )
+                         await asyncio.to_thread(pool.start)
+                         self._pool = pool
+          return self._pool
+
+     async def encode_async(self, texts: List[str]) -> np.ndarray:
+          """Encode a list of texts off the event loop (in worker processes when configured)"""
+          if settings.EMBEDDING_WORKERS > 0:
+               pool = await self._get_pool()
+               return await pool.encode(texts)
+          return await asyncio.to_thread(self.encode, texts, len(texts))
+
+     def shutdown(self):
+          if self._pool is not None:
+               self._pool.shutdown()
+               self._pool = None
+
+
+_models: Dict[Tuple[str, str], SharedEmbeddingModel] = {}
+_models_lock = threading.Lock()
+
+
+def get_shared_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: Optional[str] = None) -> SharedEmbeddingModel:
+     key = (model_name, (backend or settings.EMBEDDING_BACKEND).lower())
+     shared = _models.get(key)
+     if shared is None:
+          with _models_lock:
+               shared = _models.get(key)
+               if shared is None:
+                    shared = _models[key] = SharedEmbeddingModel(*key)
+     return shared
+
+
+def preload_embedding_models(model_names: Optional[List[str]] = None):
+     """
+     Load model weights in the master process before workers are forked
+     (gunicorn --preload). Children then share the weight pages copy-on-write
+     instead of each holding its own copy. gc.freeze() moves everything
+     loaded so far into the permanent generation so the collector in the
+     children does not touch (and thereby copy) those pages.
+
+     ONNX sessions start their thread pools on creation, which is not fork
+     safe, so only torch models are preloaded.
+     """
+     for model_name in model_names or [DEFAULT_EMBEDDING_MODEL]:
+          shared = get_shared_embedding_model(model_name)
+          if settings.EMBEDDING_WORKERS > 0:
+               continue  # inference happens in the worker pool, not here
+          if shared.backend_name != "torch":
+               print(f"Skipping preload of {model_name}: {shared.backend_name} backend is not fork safe")
+               continue
+          shared.backend
+          print(f"Preloaded embedding model {model_name}")
+     gc.collect()
+     gc.freeze()
+
+
+def shutdown_embedding_models():
+     """Stop embedding worker pools; call on application shutdown"""
+     for shared in list(_models.values()):
+          shared.shutdown()
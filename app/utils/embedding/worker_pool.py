@@ -0,0 +1,199 @@
+from multiprocessing import shared_memory
+from collections import deque
+from typing import Dict, List, Optional
+import multiprocessing as mp
+import numpy as np
+import threading
+import itertools
+import asyncio
+import weakref
+import os
+
+
+def _worker_main(model_name: str, backend_name: str, cpu: Optional[int], threads: int, tasks, results):
+     """Embedding worker: loads the model once, then encodes batches into shared memory"""
+     if cpu is not None and hasattr(os, "sched_setaffinity"):
+          os.sched_setaffinity(0, {cpu})
+     # Must be set before torch / onnxruntime start their thread pools
+     os.environ["OMP_NUM_THREADS"] = str(threads)
+     os.environ["MKL_NUM_THREADS"] = str(threads)
+
+     from app.utils.embedding.backends import create_embedding_backend
+     from app.utils.embedding.dimension_reduction import create_dimension_reducer
+     backend = create_embedding_backend(model_name, backend_name)
+     reducer = create_dimension_reducer()
+     if backend_name == "torch":
+          import torch
+          torch.set_num_threads(threads)
+     dim = reducer.output_dim(backend.dimension)
+     results.put(("ready", None, dim, None))
+
+     segments: Dict[str, shared_memory.SharedMemory] = {}
+     while True:
+          task = tasks.get()
+          if task is None:
+               break
+          job_id, shm_name, texts = task
+          try:
+               shm = segments.get(shm_name)
+               if shm is None:
+                    shm = segments[shm_name] = shared_memory.SharedMemory(name=shm_name)
+               out = np.ndarray((len(texts), dim), dtype=np.float32, buffer=shm.buf)
+               out[:] = reducer.reduce(backend.encode(texts, len(texts)))
+               del out
+               results.put(("done", job_id, len(texts), None))
+          except Exception as e:
+               results.put(("error", job_id, 0, f"{type(e).__name__}: {e}"))
+
+     for shm in segments.values():
+          shm.close()
+
+
+class EmbeddingWorkerPool:
+     """
+     Out-of-process embedding engine.
+
+     A pool of spawned worker processes (optionally pinned to cores) each
+     holds the model. Batches are sent over a queue; workers write float32
+     rows straight into a shared-memory slot and only the row count comes
+     back. encode() returns an ndarray viewing that slot, and the slot is
+     handed back to the pool once the array is garbage collected, so
+     results cross the process boundary without pickling or copying. If
+     callers hold on to more results than there are slots, new slots are
+     allocated rather than waiting.
+     """
+     def __init__(
+          self,
+          model_name: str,
+          backend_name: str,
+          num_workers: int,
+          cpus: Optional[List[int]] = None,
+          threads_per_worker: int = 1,
+          slot_rows: int = 64
+     ):
+          self.model_name = model_name
+          self.backend_name = backend_name
+          self.num_workers = num_workers
+          self.cpus = cpus or []
+          self.threads_per_worker = threads_per_worker
+          self.slot_rows = slot_rows
+          self.dim = None
+          self._ctx = mp.get_context("spawn")
+          self._tasks = None
+          self._results = None
+          self._processes = []
+          self._slots: List[shared_memory.SharedMemory] = []
+          self._slot_bytes = 0
+          self._free_slots = deque()
+          self._futures: Dict[int, tuple] = {}
+          self._job_ids = itertools.count()
+          self._reader = None
+          self._closed = False
+
+     def start(self, timeout: float = 600.0):
+          """Spawn workers and wait until each has loaded the model (blocking)"""
+          self._tasks = self._ctx.Queue()
+          self._results = self._ctx.Queue()
+          for i in range(self.num_workers):
+               cpu = self.cpus[i % len(self.cpus)] if self.cpus else None
+               process = self._ctx.Process(
+                    target=_worker_main,
+                    args=(self.model_name, self.backend_name, cpu, self.threads_per_worker, self._tasks, self._results),
+                    daemon=True
+               )
+               process.start()
+               self._processes.append(process)
+
+          for _ in range(self.num_workers):
+               kind, _, dim, error = self._results.get(timeout=timeout)
+               if kind != "ready":
+                    raise RuntimeError(f"Embedding worker failed to start: {error}")
+               self.dim = dim
+
+          # Two slots per worker keeps every worker busy while results are read
+          self._slot_bytes = self.slot_rows * self.dim * np.dtype(np.float32).itemsize
+          for _ in range(self.num_workers * 2):
+               self._free_slots.append(self._new_slot())
+          self._reader = threading.Thread(target=self._read_results, name="embedding-pool-results", daemon=True)
+          self._reader.start()
+          print(f"Embedding worker pool started: {self.num_workers} workers, dim={self.dim}")
+
+     def _read_results(self):
+          while not self._closed:
+               try:
+                    kind, job_id, rows, error = self._results.get()
+               except (EOFError, OSError):
+                    return
+               if kind == "stop":
+                    return
+               entry = self._futures.pop(job_id, None)
+               if entry is None:
+                    continue
+               loop, future = entry
+               if kind == "done":
+                    loop.call_soon_threadsafe(self._resolve, future, rows, None)
+               else:
+                    loop.call_soon_threadsafe(self._resolve, future, None, RuntimeError(error))
+
+     @staticmethod
+     def _resolve(future: asyncio.Future, rows, error):
+          if future.done():
+               return
+          if error is not None:
+               future.set_exception(error)
+          else:
+               future.set_result(rows)
+
+     def _new_slot(self) -> int:
+          self._slots.append(shared_memory.SharedMemory(create=True, size=self._slot_bytes))
+          return len(self._slots) - 1
+
+     def _release(self, slot: int):
+          # Finalizers can run on any thread; deque.append is atomic
+          self._free_slots.append(slot)
+
+     async def encode(self, texts: List[str]) -> np.ndarray:
+          if len(texts) > self.slot_rows:
+               parts = [
+                    await self.encode(texts[i:i + self.slot_rows])
+                    for i in range(0, len(texts), self.slot_rows)
+               ]
+               return np.concatenate(parts)
+
+          loop = asyncio.get_running_loop()
+          try:
+               slot = self._free_slots.popleft()
+          except IndexError:
+               slot = self._new_slot()
+          job_id = next(self._job_ids)
+          future = loop.create_future()
+          self._futures[job_id] = (loop, future)
+          try:
+               self._tasks.put((job_id, self._slots[slot].name, list(texts)))
+               rows = await future
+          except BaseException:
+               self._futures.pop(job_id, None)
+               self._free_slots.append(slot)
+               raise
+
+          view = np.ndarray((rows, self.dim), dtype=np.float32, buffer=self._slots[slot].buf)
+          weakref.finalize(view, self._release, slot)
+          return view
+
+     def shutdown(self):
+          if self._closed:
+               return
+          self._closed = True
+          for _ in self._processes:
+               self._tasks.put(None)
+          for process in self._processes:
+               process.join(timeout=10)
+               if process.is_alive():
+                    process.terminate()
+          self._results.put(("stop", None, 0, None))
+          for shm in self._slots:
+               try:
+                    shm.close()
+               except BufferError:
+                    pass  # a result view is still alive; unlink still frees the name
+               shm.unlink()
@@ -5,14 +5,89 @@ from app.Services.meal_generation.meal_generation_router import router as meal_g
 from app.Services.dailly_workout.dailly_workout_router import router as daily_workout_router
 from app.Services.products.products_router import router as product_router
 from app.Services.personal_setup.personal_setup_router import router as personal_setup_router
+from app.Services.health.health_router import router as health_router
 from fastapi.middleware.cors import CORSMiddleware
-from app.DB.mongodb.mongodb import MongoDB
+from app.DB.mongodb.write_behind import close_write_behind_buffer
+from app.DB.mongodb.client import close_mongo_clients
+from app.config.settings import settings
+from app.utils.embedding.model_registry import preload_embedding_models, shutdown_embedding_models
+from app.Services.products.products import ProductService
+from app.Services.AI_coach.AI_coach import AI_coach
+from app.Services.container import ServiceContainer
+from app.Services.health.health import Readiness, warm_up
+from contextlib import asynccontextmanager
+import asyncio
+
+# With `gunicorn main:app --preload -k uvicorn.workers.UvicornWorker -w N` this
+# runs once in the master, and forked workers share the weights copy-on-write
+if settings.EMBEDDING_PRELOAD:
+     preload_embedding_models()
+
+
+async def user_profile_decay_loop(services: ServiceContainer, interval_hours: float):
+     """Periodically decay per-user interaction profiles"""
+     while True:
+          await asyncio.sleep(interval_hours * 3600)
+          try:
+               decayed = await services.get(ProductService).decay_user_profiles()
+               print(f"Decayed {decayed} user profiles")
+          except Exception as e:
+               print(f"User profile decay failed: {e}")
+
+async def neighbor_table_rebuild_loop(services: ServiceContainer, interval_hours: float):
+     """Periodically recompute the similar-products neighbor table"""
+     while True:
+          await asyncio.sleep(interval_hours * 3600)
+          try:
+               await services.get(ProductService).rebuild_neighbor_table()
+          except Exception as e:
+               print(f"Neighbor table rebuild failed: {e}")
+
+async def checkpoint_compaction_loop(services: ServiceContainer, interval_hours: float):
+     """Periodically prune AI coach checkpoints of threads that no run has compacted"""
+     while True:
+          await asyncio.sleep(interval_hours * 3600)
+          try:
+               await services.get(AI_coach).checkpointer.compact_all()
+          except Exception as e:
+               print(f"Checkpoint compaction failed: {e}")
+
+background_tasks = []
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+     # Routers resolve their services here (Depends(provide(...))), one instance per process
+     app.state.services = ServiceContainer()
+     # Serve (and answer liveness probes) right away; /health/ready turns 200 once warmed up
+     app.state.readiness = Readiness()
+     background_tasks.append(asyncio.create_task(warm_up(app.state.services, app.state.readiness)))
+     if settings.USER_PROFILE_DECAY_INTERVAL_HOURS > 0:
+          background_tasks.append(asyncio.create_task(
+               user_profile_decay_loop(app.state.services, settings.USER_PROFILE_DECAY_INTERVAL_HOURS)
+          ))
+     if settings.NEIGHBOR_TABLE_ENABLED and settings.NEIGHBOR_TABLE_REBUILD_INTERVAL_HOURS > 0:
+          background_tasks.append(asyncio.create_task(
+               neighbor_table_rebuild_loop(app.state.services, settings.NEIGHBOR_TABLE_REBUILD_INTERVAL_HOURS)
+          ))
+     if settings.CHECKPOINT_COMPACTION_INTERVAL_HOURS > 0:
+          background_tasks.append(asyncio.create_task(
+               checkpoint_compaction_loop(app.state.services, settings.CHECKPOINT_COMPACTION_INTERVAL_HOURS)
+          ))
+     yield
+     for task in background_tasks:
+          task.cancel()
+     await close_write_behind_buffer()
+     # After the last buffered write: every service shares these clients
+     close_mongo_clients()
+     shutdown_embedding_models()
+     app.state.services.clear()
 
 
 app = FastAPI(
      title="Actyv AI",
      description="The fitness app developing is designed to offer a comprehensive fitness experience, combining personalized coaching with social interaction and a multi-vendor marketplace",
-     version="1.0.0"
+     version="1.0.0",
+     lifespan=lifespan
 )
 
 app.add_middleware(
@@ -30,13 +105,9 @@ app.include_router(meal_generation_router,prefix="/v1",tags=["Meal-generation"])
 app.include_router(daily_workout_router,prefix="/v1",tags=["Daily-workout"])
 app.include_router(personal_setup_router,prefix="/v1",tags=["Personal-setup"])
 app.include_router(product_router,prefix="/v1",tags=["Product"])
+app.include_router(health_router,tags=["Health"])
 
 
-@app.on_event("startup")
-async def startup_event():
-     db = MongoDB()
-     await db.init_indexes()
-
 if __name__ == "__main__":
      import uvicorn
      uvicorn.run("main:app", host="0.0.0.0", port=8888, reload=True)   
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+Build the userProfiles collection from existing interactions.
+
+Run once when deploying materialized profiles (search personalization
+reads only userProfiles), or any time to rebuild them from scratch.
+
+     python -m scripts.backfill_user_profiles
+     python -m scripts.backfill_user_profiles --decay   # only run the decay job
+"""
+from app.Services.products.products import ProductService
+import argparse
+import asyncio
+
+
+async def main(decay_only: bool):
+     service = ProductService()
+     if decay_only:
+          print(f"Decayed {await service.decay_user_profiles()} user profiles")
+     else:
+          print(f"Backfilled {await service.backfill_user_profiles()} user profiles")
+
+
+if __name__ == "__main__":
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--decay", action="store_true")
+     args = parser.parse_args()
+     asyncio.run(main(args.decay))
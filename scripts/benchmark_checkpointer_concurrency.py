@@ -0,0 +1,166 @@
+"""
+Event-loop impact of the LangGraph checkpointer.
+
+Runs --sessions concurrent chat-like graph sessions (parallel title and
+setup nodes, then a response node, payloads of --payload-kb per turn)
+for --turns turns each, while --streams observer coroutines emit a token
+every --tick-ms like an SSE stream. Reports how late the observer ticks
+are (the stall other sessions' streams see), turn latency, and for
+MotorCheckpointSaver the number of batched pending-write round trips.
+
+Savers compared:
+- blocking: MongoDBSaver with its sync pymongo calls made on the loop
+- executor: MongoDBSaver as shipped (pymongo in the default thread pool)
+- motor:    MotorCheckpointSaver (app/modules/graph/checkpointer.py)
+
+Point --uri at a local stand-in, e.g. `docker run -p 27017:27017 mongo`;
+everything is written to a scratch database that is dropped afterwards.
+
+     python -m scripts.benchmark_checkpointer_concurrency --uri mongodb://localhost:27017 --sessions 20
+"""
+from app.modules.graph.checkpointer import MotorCheckpointSaver
+from langgraph.checkpoint.mongodb import MongoDBSaver
+from langgraph.graph import START, END, StateGraph
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from typing import Annotated, TypedDict
+import numpy as np
+import argparse
+import asyncio
+import operator
+import time
+import uuid
+
+SCRATCH_DB = "checkpoint_benchmark"
+
+
+class BlockingMongoDBSaver(MongoDBSaver):
+     """MongoDBSaver with every checkpoint call made synchronously on the event loop"""
+     async def aget_tuple(self, config):
+          return self.get_tuple(config)
+
+     async def alist(self, config, *, filter=None, before=None, limit=None):
+          for item in self.list(config, filter=filter, before=before, limit=limit):
+               yield item
+
+     async def aput(self, config, checkpoint, metadata, new_versions):
+          return self.put(config, checkpoint, metadata, new_versions)
+
+     async def aput_writes(self, config, writes, task_id, task_path=""):
+          return self.put_writes(config, writes, task_id, task_path)
+
+
+class BenchState(TypedDict):
+     messages: Annotated[list, operator.add]
+     title: str
+     setup: str
+
+
+def build_graph(payload: str):
+     async def personal_setup(state):
+          await asyncio.sleep(0.002)
+          return {"setup": "setup"}
+
+     async def generate_title(state):
+          await asyncio.sleep(0.002)
+          return {"title": "title"}
+
+     async def conversation(state):
+          await asyncio.sleep(0.005)
+          return {"messages": [payload]}
+
+     graph = StateGraph(BenchState)
+     graph.add_node("personal_setup", personal_setup)
+     graph.add_node("generate_title", generate_title)
+     graph.add_node("conversation", conversation)
+     graph.add_edge(START, "personal_setup")
+     graph.add_edge(START, "generate_title")
+     graph.add_edge("personal_setup", "conversation")
+     graph.add_edge("generate_title", "conversation")
+     graph.add_edge("conversation", END)
+     return graph
+
+
+async def observer(tick_ms: float, stop: asyncio.Event, lateness: list):
+     interval = tick_ms / 1000
+     expected = time.perf_counter() + interval
+     while not stop.is_set():
+          await asyncio.sleep(max(expected - time.perf_counter(), 0))
+          lateness.append((time.perf_counter() - expected) * 1000)
+          expected += interval
+
+
+async def session(graph, turns: int, payload: str, latencies: list):
+     config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+     for _ in range(turns):
+          started = time.perf_counter()
+          async for _ in graph.astream_events({"messages": [payload]}, config=config, version="v2"):
+               pass
+          latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run(name: str, saver, args) -> dict:
+     payload = "x" * (args.payload_kb * 1024)
+     graph = build_graph(payload).compile(checkpointer=saver)
+     lateness, latencies = [], []
+     stop = asyncio.Event()
+     observers = [asyncio.create_task(observer(args.tick_ms, stop, lateness)) for _ in range(args.streams)]
+     started = time.perf_counter()
+     await asyncio.gather(*(session(graph, args.turns, payload, latencies) for _ in range(args.sessions)))
+     elapsed = time.perf_counter() - started
+     stop.set()
+     await asyncio.gather(*observers)
+     return {
+          "saver": name,
+          "tick p50": np.percentile(lateness, 50),
+          "tick p99": np.percentile(lateness, 99),
+          "tick max": max(lateness),
+          "turn p50": np.percentile(latencies, 50),
+          "turn p95": np.percentile(latencies, 95),
+          "turns/s": len(latencies) / elapsed,
+          "batches": getattr(saver, "stats", {}).get("write_batches", "-")
+     }
+
+
+async def main(args):
+     sync_client = MongoClient(args.uri)
+     motor_client = AsyncIOMotorClient(args.uri)
+     savers = {
+          "blocking": lambda: BlockingMongoDBSaver(sync_client, db_name=SCRATCH_DB),
+          "executor": lambda: MongoDBSaver(sync_client, db_name=SCRATCH_DB),
+          "motor": lambda: MotorCheckpointSaver(motor_client, db_name=SCRATCH_DB)
+     }
+     print(
+          f"{args.sessions} sessions x {args.turns} turns, {args.payload_kb} KB/turn, "
+          f"{args.streams} observer streams ticking every {args.tick_ms} ms"
+     )
+     print(
+          f"{'saver':>9} {'tick p50':>9} {'tick p99':>9} {'tick max':>9} "
+          f"{'turn p50':>9} {'turn p95':>9} {'turns/s':>8} {'batches':>8}"
+     )
+     try:
+          for name in args.savers:
+               result = await run(name, savers[name](), args)
+               print(
+                    f"{name:>9} {result['tick p50']:>9.2f} {result['tick p99']:>9.2f} {result['tick max']:>9.2f} "
+                    f"{result['turn p50']:>9.1f} {result['turn p95']:>9.1f} {result['turns/s']:>8.1f} {result['batches']:>8}"
+               )
+               sync_client.drop_database(SCRATCH_DB)
+     finally:
+          sync_client.drop_database(SCRATCH_DB)
+          sync_client.close()
+          motor_client.close()
+     print("tick columns: ms an observer stream's token was late; turn columns: ms per graph turn")
+
+
+if __name__ == "__main__":
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--uri", default="mongodb://localhost:27017")
+     parser.add_argument("--sessions", type=int, default=20)
+     parser.add_argument("--turns", type=int, default=10)
+     parser.add_argument("--payload-kb", type=int, default=32)
+     parser.add_argument("--streams", type=int, default=5)
+     parser.add_argument("--tick-ms", type=float, default=5.0)
+     parser.add_argument("--savers", nargs="+", default=["blocking", "executor", "motor"])
+     args = parser.parse_args()
+     asyncio.run(main(args))
@@ -0,0 +1,76 @@
+"""
+Compare the torch and ONNX embedding backends.
+
+Checks cosine agreement of the ONNX output against torch (exits non-zero
+below --min-cosine) and reports single-text latency and batch throughput.
+
+     python -m scripts.benchmark_embedding_backends --texts 512
+"""
+from app.utils.embedding.backends import TorchEmbeddingBackend, OnnxEmbeddingBackend
+from app.config.settings import settings
+import numpy as np
+import argparse
+import random
+import time
+import sys
+
+WORDS = (
+     "whey protein isolate creatine monohydrate resistance bands adjustable dumbbells "
+     "yoga mat vegan plant based pre workout electrolytes foam roller kettlebell "
+     "low sugar high fiber recovery shaker bottle beginner strength cardio"
+).split()
+
+
+def sample_texts(n: int, seed: int = 7):
+     rng = random.Random(seed)
+     return [" ".join(rng.choices(WORDS, k=rng.randint(3, 60))) for _ in range(n)]
+
+
+def measure(backend, texts, batch_size):
+     backend.encode(texts[:batch_size], batch_size)  # warm-up
+
+     latencies = []
+     for text in texts[:64]:
+          started = time.perf_counter()
+          backend.encode([text], 1)
+          latencies.append((time.perf_counter() - started) * 1000)
+
+     started = time.perf_counter()
+     embeddings = backend.encode(texts, batch_size)
+     elapsed = time.perf_counter() - started
+     return embeddings, np.percentile(latencies, 50), np.percentile(latencies, 99), len(texts) / elapsed
+
+
+def main():
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--model", default="BAAI/bge-base-en-v1.5")
+     parser.add_argument("--texts", type=int, default=512)
+     parser.add_argument("--batch-size", type=int, default=32)
+     parser.add_argument("--no-quantize", action="store_true")
+     parser.add_argument("--min-cosine", type=float, default=0.99)
+     args = parser.parse_args()
+
+     texts = sample_texts(args.texts)
+     torch_backend = TorchEmbeddingBackend(args.model)
+     onnx_backend = OnnxEmbeddingBackend(
+          args.model,
+          onnx_dir=settings.EMBEDDING_ONNX_DIR,
+          quantize=not args.no_quantize,
+          num_threads=settings.EMBEDDING_ONNX_THREADS
+     )
+
+     results = {}
+     for backend in (torch_backend, onnx_backend):
+          embeddings, p50, p99, throughput = measure(backend, texts, args.batch_size)
+          results[backend.name] = embeddings
+          print(f"{backend.name:>10}: single p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  batch {throughput:8.1f} texts/s")
+
+     cosine = np.sum(results[torch_backend.name] * results[onnx_backend.name], axis=1)
+     print(f"cosine agreement: mean {cosine.mean():.5f}  min {cosine.min():.5f}")
+     if cosine.min() < args.min_cosine:
+          print(f"FAIL: cosine below {args.min_cosine}")
+          sys.exit(1)
+
+
+if __name__ == "__main__":
+     main()
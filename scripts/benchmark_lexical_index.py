@@ -0,0 +1,71 @@
+"""
+Build time and query latency of the BM25 lexical index.
+
+Generates a synthetic catalog of product names/descriptions from a
+Zipf-distributed vocabulary plus brand and SKU-like tokens, then times
+queries with and without filters: full product names (which include
+very common words with long postings) and brand + size queries
+("brand12 300g", the exact-term case lexical retrieval is for).
+
+     python -m scripts.benchmark_lexical_index --sizes 10000,100000
+"""
+from app.DB.vectorDB.lexical_index import LexicalIndex
+from scripts.benchmark_vector_index import CATEGORIES, STATUSES
+import numpy as np
+import argparse
+import time
+
+BRANDS = [f"brand{i}" for i in range(300)]
+
+
+def synthetic_products(n: int, rng: np.random.Generator, vocab_size: int = 20000):
+     vocab = np.array([f"w{i}" for i in range(vocab_size)])
+     for i in range(n):
+          words = vocab[np.minimum(rng.zipf(1.3, size=40), vocab_size) - 1]
+          yield {
+               "_id": f"{i:024x}",
+               "name": f"{BRANDS[rng.integers(len(BRANDS))]} {' '.join(words[:4])} {rng.integers(100, 1000)}g",
+               "description": " ".join(words[4:34]),
+               "features": list(words[34:]),
+               "category": CATEGORIES[rng.integers(len(CATEGORIES))],
+               "status": STATUSES[rng.integers(len(STATUSES))],
+               "price": float(rng.integers(5, 300)),
+               "averageRating": float(rng.uniform(0, 5))
+          }
+
+
+def main():
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--sizes", default="10000,100000")
+     parser.add_argument("--queries", type=int, default=500)
+     parser.add_argument("--limit", type=int, default=20)
+     args = parser.parse_args()
+
+     print(f"{'size':>9} {'build s':>8} {'queries':>11} {'filters':>9} {'p50 ms':>8} {'p99 ms':>8}")
+     for size in [int(s) for s in args.sizes.split(",")]:
+          rng = np.random.default_rng(0)
+          products = list(synthetic_products(size, rng))
+          index = LexicalIndex()
+          started = time.perf_counter()
+          index.upsert_many(products)
+          index.freeze()
+          build = time.perf_counter() - started
+
+          names = [products[i]["name"] for i in rng.choice(size, args.queries, replace=False)]
+          query_sets = {
+               "name": names,
+               "brand+size": [f"{name.split()[0]} {name.split()[-1]}" for name in names]
+          }
+          for query_name, queries in query_sets.items():
+               for name, filters in (("none", None), ("category", {"category": "PROTEIN"})):
+                    timings = []
+                    for query in queries:
+                         started = time.perf_counter()
+                         index.search(query, args.limit, filters)
+                         timings.append((time.perf_counter() - started) * 1000)
+                    p50, p99 = np.percentile(timings, 50), np.percentile(timings, 99)
+                    print(f"{size:>9} {build:>8.2f} {query_name:>11} {name:>9} {p50:>8.3f} {p99:>8.3f}")
+
+
+if __name__ == "__main__":
+     main()
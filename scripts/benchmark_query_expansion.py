@@ -0,0 +1,105 @@
+"""
+Single-query vs multi-query expansion search.
+
+Runs candidate retrieval (ProductService._search_candidates, unpersonalized,
+result cache off) for a set of queries under a few user setups, with and
+without expansion, against the configured database and vector backend.
+Reports:
+
+- embedding ms: one uncached query embedding vs one uncached
+  generate_embeddings_batch call over all variants
+- retrieval p50 / p95 ms, with warm embedding caches
+- recall@k against exact (brute force) rankings over every product
+  embedding: "query" is the plain query's exact top k, "intent" the exact
+  top k of every variant fused by reciprocal rank
+
+     python -m scripts.benchmark_query_expansion --k 20 --repeats 5
+"""
+from app.Services.products.products import ProductService
+from app.config.settings import settings
+import numpy as np
+import argparse
+import asyncio
+import time
+
+QUERIES = [
+     "whey protein", "resistance bands", "creatine", "yoga mat", "pre workout",
+     "adjustable dumbbells", "electrolytes", "foam roller", "vegan protein", "shaker bottle"
+]
+
+SETUPS = {
+     "muscle_gain": {"fitnessGoal": "muscle_gain", "fitnessLevel": "intermediate", "equipmentHave": ["dumbbells"]},
+     "weight_loss": {"fitnessGoal": "weight_loss", "fitnessLevel": "beginner", "equipmentHave": []}
+}
+
+
+async def load_embeddings(service: ProductService):
+     ids, rows = [], []
+     async for doc in service.products_collection.find({"embedding": {"$exists": True}}, {"embedding": 1}):
+          ids.append(str(doc["_id"]))
+          rows.append(doc["embedding"])
+     matrix = np.asarray(rows, dtype=np.float32)
+     matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+     return np.array(ids), matrix
+
+
+def exact_top(ids, matrix, vectors, k: int):
+     """Exact top k ids of each vector, plus all of them fused by reciprocal rank"""
+     rankings = [ids[np.argsort(-(matrix @ v))[:k]] for v in vectors]
+     fused = {}
+     for ranking in rankings:
+          for rank, product_id in enumerate(ranking):
+               fused[product_id] = fused.get(product_id, 0.0) + 1.0 / (settings.SEARCH_RRF_K + rank + 1)
+     return set(rankings[0]), set(sorted(fused, key=fused.get, reverse=True)[:k])
+
+
+async def main(k: int, repeats: int):
+     settings.LEXICAL_SEARCH_ENABLED = False  # vector retrieval only
+     service = ProductService()
+     service.result_cache = None
+     embedder = service.embedding_service
+     ids, matrix = await load_embeddings(service)
+     print(f"{len(ids)} products, backend {settings.VECTOR_SEARCH_BACKEND}, k={k}")
+
+     for name, setup in SETUPS.items():
+          embed_ms = {"single": [], "expanded": []}
+          latency = {"single": [], "expanded": []}
+          recall = {mode: {"query": [], "intent": []} for mode in latency}
+          for query in QUERIES:
+               variants = await embedder.expand_query(query, setup)
+               started = time.perf_counter()
+               await embedder.generate_embedding(query, use_cache=False)
+               embed_ms["single"].append((time.perf_counter() - started) * 1000)
+               started = time.perf_counter()
+               vectors = await embedder.generate_embeddings_batch(variants, use_cache=False)
+               embed_ms["expanded"].append((time.perf_counter() - started) * 1000)
+
+               vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+               query_truth, intent_truth = exact_top(ids, matrix, vectors, k)
+               for mode, expand in (("single", False), ("expanded", True)):
+                    for _ in range(repeats):
+                         started = time.perf_counter()
+                         results = await service._search_candidates(
+                              "benchmark", query, setup, k, None, 0.0, False, expand=expand
+                         )
+                         latency[mode].append((time.perf_counter() - started) * 1000)
+                    found = {str(r["_id"]) for r in results}
+                    recall[mode]["query"].append(len(found & query_truth) / max(len(query_truth), 1))
+                    recall[mode]["intent"].append(len(found & intent_truth) / max(len(intent_truth), 1))
+
+          print(f"\nsetup {name}")
+          print(f"{'mode':>9} {'embed ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall query':>13} {'recall intent':>14}")
+          for mode in latency:
+               print(
+                    f"{mode:>9} {np.mean(embed_ms[mode]):>9.2f} {np.percentile(latency[mode], 50):>8.2f} "
+                    f"{np.percentile(latency[mode], 95):>8.2f} {np.mean(recall[mode]['query']):>13.3f} "
+                    f"{np.mean(recall[mode]['intent']):>14.3f}"
+               )
+
+
+if __name__ == "__main__":
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--k", type=int, default=20)
+     parser.add_argument("--repeats", type=int, default=5)
+     args = parser.parse_args()
+     asyncio.run(main(args.k, args.repeats))
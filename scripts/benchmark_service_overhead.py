@@ -0,0 +1,82 @@
+"""
+Per-request service construction vs the app-scoped container.
+
+For every router's service, times what an endpoint paid before (a fresh
+instance with its API clients, embedding service and compiled LangGraph
+built eagerly) against resolving it through ServiceContainer (first
+lookup constructs it, later lookups return the shared instance). No
+request is sent to OpenAI or MongoDB; clients only connect on first use.
+Reports p50 / p95 microseconds per request and the process RSS growth
+over the run.
+
+     python -m scripts.benchmark_service_overhead --requests 200
+"""
+from app.Services.container import ServiceContainer
+from app.Services.AI_coach.AI_coach import AI_coach
+from app.Services.dailly_workout.dailly_workout import DailyWorkout
+from app.Services.food_scan.food_scan import food_scan_service
+from app.Services.meal_generation.meal_generation import MealGeneration
+from app.Services.personal_setup.personal_setup import personalSetup
+from app.Services.products.products import ProductService
+import numpy as np
+import argparse
+import resource
+import time
+
+# Lazy members each endpoint used to build in __init__
+EAGER_MEMBERS = {
+     AI_coach: ["checkpointer", "graph"],
+     DailyWorkout: ["client"],
+     food_scan_service: ["client"],
+     MealGeneration: ["client"],
+     personalSetup: ["openai", "embedding_service"],
+     ProductService: []
+}
+
+
+def rss_mb() -> float:
+     return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def per_request(cls, members):
+     instance = cls()
+     for member in members:
+          getattr(instance, member)
+     return instance
+
+
+def timed(fn, requests: int) -> np.ndarray:
+     samples = []
+     for _ in range(requests):
+          started = time.perf_counter()
+          fn()
+          samples.append((time.perf_counter() - started) * 1e6)
+     return np.asarray(samples)
+
+
+def main(requests: int):
+     print(f"{'service':>18} {'mode':>10} {'p50 us':>10} {'p95 us':>10} {'first us':>10} {'rss +MB':>8}")
+     for cls, members in EAGER_MEMBERS.items():
+          before = rss_mb()
+          samples = timed(lambda: per_request(cls, members), requests)
+          grown = rss_mb() - before
+          print(
+               f"{cls.__name__:>18} {'per-req':>10} {np.percentile(samples, 50):>10.1f} "
+               f"{np.percentile(samples, 95):>10.1f} {samples[0]:>10.1f} {grown:>8.1f}"
+          )
+
+          services = ServiceContainer()
+          before = rss_mb()
+          samples = timed(lambda: services.get(cls), requests)
+          grown = rss_mb() - before
+          print(
+               f"{cls.__name__:>18} {'container':>10} {np.percentile(samples, 50):>10.1f} "
+               f"{np.percentile(samples, 95):>10.1f} {samples[0]:>10.1f} {grown:>8.1f}"
+          )
+
+
+if __name__ == "__main__":
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--requests", type=int, default=200)
+     args = parser.parse_args()
+     main(args.requests)
@@ -0,0 +1,79 @@
+"""
+Latency of the in-process vector index against catalog size.
+
+Builds synthetic catalogs (random unit vectors with realistic filter
+columns), snapshots them and measures query latency with and without
+filters for float16 and float32 storage.
+
+     python -m scripts.benchmark_vector_index --sizes 10000,100000,500000 --dim 768
+"""
+from app.DB.vectorDB.local_index import LocalVectorIndex
+import numpy as np
+import argparse
+import tempfile
+import time
+
+CATEGORIES = ["SUPPLEMENTS", "VITAMINS", "PROTEIN", "FITNESS", "NUTRITION", "EQUIPMENT", "ACCESSORIES"]
+STATUSES = ["ACTIVE"] * 8 + ["INACTIVE", "OUT_OF_STOCK"]
+
+
+def synthetic_docs(n: int, dim: int, rng: np.random.Generator, batch: int = 50_000):
+     for start in range(0, n, batch):
+          size = min(batch, n - start)
+          vectors = rng.standard_normal((size, dim), dtype=np.float32)
+          vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+          yield [
+               {
+                    "_id": f"{start + i:024x}",
+                    "embedding": vectors[i],
+                    "category": CATEGORIES[rng.integers(len(CATEGORIES))],
+                    "status": STATUSES[rng.integers(len(STATUSES))],
+                    "price": float(rng.integers(5, 300)),
+                    "averageRating": float(rng.uniform(0, 5))
+               }
+               for i in range(size)
+          ]
+
+
+def measure(index, queries, limit, filters):
+     index.search(queries[0], limit, filters, 0.0)  # warm the page cache
+     timings = []
+     for query in queries:
+          started = time.perf_counter()
+          index.search(query, limit, filters, 0.0)
+          timings.append((time.perf_counter() - started) * 1000)
+     return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--sizes", default="10000,100000,500000")
+     parser.add_argument("--dim", type=int, default=768)
+     parser.add_argument("--queries", type=int, default=100)
+     parser.add_argument("--limit", type=int, default=20)
+     args = parser.parse_args()
+
+     rng = np.random.default_rng(0)
+     queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+     queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+     filter_sets = {
+          "none": None,
+          "category": {"category": "PROTEIN"},
+          "category+price+rating": {"category": "PROTEIN", "price_range": {"min": 20, "max": 60}, "min_rating": 4.0},
+     }
+
+     print(f"{'size':>9} {'dtype':>8} {'filters':>22} {'p50 ms':>8} {'p99 ms':>8}")
+     for size in [int(s) for s in args.sizes.split(",")]:
+          for dtype in ("float16", "float32"):
+               with tempfile.TemporaryDirectory() as tmp:
+                    index = LocalVectorIndex(f"{tmp}/index", dtype=dtype)
+                    for docs in synthetic_docs(size, args.dim, rng):
+                         index.upsert_many(docs)
+                    index.compact()
+                    for name, filters in filter_sets.items():
+                         p50, p99 = measure(index, queries, args.limit, filters)
+                         print(f"{size:>9} {dtype:>8} {name:>22} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+     main()
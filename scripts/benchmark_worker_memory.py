@@ -0,0 +1,77 @@
+"""
+RSS / PSS per worker with and without preloading the embedding model.
+
+"per-worker" forks N children that each load the model themselves (what
+uvicorn --workers N does today). "preload" loads once in the parent and
+forks afterwards (gunicorn --preload with EMBEDDING_PRELOAD=true). PSS
+splits shared pages between the processes mapping them, so it shows the
+real per-worker cost.
+
+     python -m scripts.benchmark_worker_memory --workers 4
+"""
+from app.utils.embedding.model_registry import get_shared_embedding_model, preload_embedding_models
+import multiprocessing as mp
+import argparse
+import time
+import os
+
+
+def memory_kb(pid: int):
+     values = {}
+     with open(f"/proc/{pid}/smaps_rollup") as f:
+          for line in f:
+               parts = line.split()
+               if parts[0] in ("Rss:", "Pss:"):
+                    values[parts[0][:-1]] = int(parts[1])
+     return values["Rss"], values["Pss"]
+
+
+def worker(ready, done):
+     shared = get_shared_embedding_model()
+     shared.backend.encode(["warm up the model"], 1)
+     ready.set()
+     done.wait()
+
+
+def run(mode: str, workers: int):
+     ctx = mp.get_context("fork")
+     if mode == "preload":
+          preload_embedding_models()
+     done = ctx.Event()
+     readies, procs = [], []
+     for _ in range(workers):
+          ready = ctx.Event()
+          proc = ctx.Process(target=worker, args=(ready, done))
+          proc.start()
+          readies.append(ready)
+          procs.append(proc)
+     for ready in readies:
+          ready.wait()
+     time.sleep(1)
+
+     rows = [memory_kb(p.pid) for p in procs]
+     done.set()
+     for p in procs:
+          p.join()
+
+     rss = sum(r for r, _ in rows) / len(rows) / 1024
+     pss = sum(p for _, p in rows) / len(rows) / 1024
+     print(f"{mode:>10}: {workers} workers  avg RSS {rss:8.1f} MB  avg PSS {pss:8.1f} MB  total PSS {pss * workers:8.1f} MB")
+
+
+def main():
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--workers", type=int, default=4)
+     parser.add_argument("--mode", choices=["per-worker", "preload"], default=None)
+     args = parser.parse_args()
+
+     if args.mode:
+          run(args.mode, args.workers)
+          return
+     # Run each mode in a fresh interpreter so the parent's state doesn't leak between them
+     for mode in ("per-worker", "preload"):
+          os.system(f"python -m scripts.benchmark_worker_memory --workers {args.workers} --mode {mode}")
+
+
+if __name__ == "__main__":
+     main()
@@ -0,0 +1,23 @@
+"""
+Recompute the productNeighbors table behind get_similar_products.
+
+Exact top NEIGHBOR_TABLE_K cosine neighbors of every product, by blocked
+matrix products over all product embeddings. Run after bulk catalog
+imports and periodically (e.g. nightly from cron); single product
+writes keep the table current incrementally in between.
+
+     python -m scripts.build_neighbor_table
+"""
+from app.Services.products.products import ProductService
+import asyncio
+import time
+
+
+async def main():
+     started = time.perf_counter()
+     written = await ProductService().rebuild_neighbor_table()
+     print(f"Wrote {written} neighbor rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+     asyncio.run(main())
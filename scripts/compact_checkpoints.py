@@ -0,0 +1,44 @@
+"""
+Compact the AI coach's LangGraph checkpoint collections.
+
+Keeps the latest CHECKPOINT_KEEP_LAST checkpoints (and their pending
+writes) of every thread, and creates the CHECKPOINT_RETENTION_DAYS TTL
+index. With --rewrite-payloads, checkpoints and message writes stored
+before payload stripping existed have their large image data URLs moved
+to S3 (or replaced by a placeholder). Runs after each chat keep active
+threads compacted; run this once for existing data, then periodically
+(or set CHECKPOINT_COMPACTION_INTERVAL_HOURS).
+
+     python -m scripts.compact_checkpoints --rewrite-payloads
+"""
+from app.modules.graph.checkpointer import MotorCheckpointSaver
+import argparse
+import asyncio
+import time
+
+
+async def main(keep_last, rewrite_payloads: bool):
+     saver = MotorCheckpointSaver(keep_last=keep_last)
+     before = {
+          name: await collection.estimated_document_count()
+          for name, collection in (("checkpoints", saver.checkpoint_collection), ("writes", saver.writes_collection))
+     }
+     started = time.perf_counter()
+     result = await saver.compact_all(rewrite_payloads=rewrite_payloads)
+     after = {
+          name: await collection.estimated_document_count()
+          for name, collection in (("checkpoints", saver.checkpoint_collection), ("writes", saver.writes_collection))
+     }
+     print(f"Done in {time.perf_counter() - started:.1f}s: {result}")
+     for name in before:
+          print(f"{name}: {before[name]} -> {after[name]} documents")
+     if saver.stripper is not None:
+          print(f"payloads: {saver.stripper.stats}")
+
+
+if __name__ == "__main__":
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--keep-last", type=int, default=None, help="default: CHECKPOINT_KEEP_LAST")
+     parser.add_argument("--rewrite-payloads", action="store_true")
+     args = parser.parse_args()
+     asyncio.run(main(args.keep_last, args.rewrite_payloads))
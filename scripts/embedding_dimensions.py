@@ -0,0 +1,110 @@
+"""
+Fit the PCA projection for EMBEDDING_DIM_REDUCTION=pca and benchmark
+recall@k against embedding dimension.
+
+     # full-size embeddings of the catalog, cached to .npy
+     python -m scripts.embedding_dimensions export --out app/data/catalog_full.npy
+     # fit and persist the projection used by the "pca" mode
+     python -m scripts.embedding_dimensions fit --embeddings app/data/catalog_full.npy --dim 384
+     # recall@k / storage / latency for truncation and PCA at several sizes
+     python -m scripts.embedding_dimensions benchmark --embeddings app/data/catalog_full.npy
+"""
+from app.config.settings import settings
+from app.utils.embedding.dimension_reduction import fit_pca, save_pca, _normalize
+from motor.motor_asyncio import AsyncIOMotorClient
+import numpy as np
+import argparse
+import asyncio
+import time
+
+
+async def export_catalog(out: str):
+     from app.Services.products.products_schema import Product
+     from app.utils.embedding.model_registry import get_shared_embedding_model
+     from app.utils.embedding.embedding import LocalEmbeddingService
+
+     service = LocalEmbeddingService()
+     backend = get_shared_embedding_model().backend  # unreduced model output
+     client = AsyncIOMotorClient(settings.DATABASE_URL)
+     docs = await client[settings.DATABASE_NAME]["products"].find({}, {"embedding": 0}).to_list(None)
+
+     texts = []
+     for doc in docs:
+          try:
+               texts.append(await service.create_product_text(Product(**doc)))
+          except Exception:
+               continue
+     embeddings = backend.encode(texts, 64).astype(np.float32)
+     np.save(out, embeddings)
+     print(f"Saved {embeddings.shape} to {out}")
+
+
+def bson_bytes(dim: int) -> int:
+     """Approximate BSON size of a float array: type byte + index key + NUL + double"""
+     return 5 + sum(1 + len(str(i)) + 1 + 8 for i in range(dim))
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+     scores = queries @ matrix.T
+     return np.argpartition(-scores, k, axis=1)[:, :k]
+
+
+def benchmark(embeddings: np.ndarray, dims, k: int, num_queries: int, seed: int = 0):
+     rng = np.random.default_rng(seed)
+     n, full_dim = embeddings.shape
+     # Held-out queries: perturbed catalog vectors, so neighbours are non-trivial
+     picks = rng.choice(n, size=min(num_queries, n), replace=False)
+     queries = _normalize(embeddings[picks] + rng.normal(0, 0.02, (len(picks), full_dim)).astype(np.float32))
+     truth = top_k(embeddings, queries, k)
+
+     print(f"{n} vectors, {len(picks)} queries, recall@{k}")
+     print(f"{'mode':>9} {'dim':>5} {'recall':>8} {'bson KB/vec':>12} {'catalog MB':>11} {'ms/query':>9}")
+     for dim in [full_dim] + sorted(d for d in dims if d < full_dim):
+          for mode in (["full"] if dim == full_dim else ["truncate", "pca"]):
+               if mode == "full":
+                    matrix, reduced_queries = embeddings, queries
+               elif mode == "truncate":
+                    matrix = _normalize(embeddings[:, :dim])
+                    reduced_queries = _normalize(queries[:, :dim])
+               else:
+                    mean, components = fit_pca(embeddings, dim)
+                    matrix = _normalize((embeddings - mean) @ components.T)
+                    reduced_queries = _normalize((queries - mean) @ components.T)
+
+               started = time.perf_counter()
+               found = top_k(matrix, reduced_queries, k)
+               per_query = (time.perf_counter() - started) * 1000 / len(picks)
+               recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+               size = bson_bytes(dim)
+               print(f"{mode:>9} {dim:>5} {recall:>8.3f} {size / 1024:>12.2f} {size * n / 2**20:>11.1f} {per_query:>9.3f}")
+
+
+def main():
+     parser = argparse.ArgumentParser()
+     sub = parser.add_subparsers(dest="command", required=True)
+     export_cmd = sub.add_parser("export")
+     export_cmd.add_argument("--out", required=True)
+     fit_cmd = sub.add_parser("fit")
+     fit_cmd.add_argument("--embeddings", required=True)
+     fit_cmd.add_argument("--dim", type=int, default=settings.EMBEDDING_TARGET_DIM)
+     fit_cmd.add_argument("--out", default=settings.EMBEDDING_PCA_PATH)
+     bench_cmd = sub.add_parser("benchmark")
+     bench_cmd.add_argument("--embeddings", required=True)
+     bench_cmd.add_argument("--dims", default="128,256,384,512")
+     bench_cmd.add_argument("--k", type=int, default=10)
+     bench_cmd.add_argument("--queries", type=int, default=500)
+     args = parser.parse_args()
+
+     if args.command == "export":
+          asyncio.run(export_catalog(args.out))
+     elif args.command == "fit":
+          mean, components = fit_pca(np.load(args.embeddings), args.dim)
+          save_pca(args.out, mean, components)
+          print(f"Saved PCA {components.shape} to {args.out}")
+     else:
+          dims = [int(d) for d in args.dims.split(",")]
+          benchmark(np.load(args.embeddings).astype(np.float32), dims, args.k, args.queries)
+
+
+if __name__ == "__main__":
+     main()
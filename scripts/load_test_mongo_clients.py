@@ -0,0 +1,110 @@
+"""
+Connection count and per-request latency: a Motor client per request
+(how ProductService used to be built by Depends()) vs the shared
+process-wide client from app.DB.mongodb.client.
+
+Each simulated request builds its service's client (or takes the shared
+one) and runs a couple of small queries against the configured database.
+Connections opened are counted with a pymongo pool listener; the
+server-side current connection count is shown when serverStatus is
+allowed.
+
+     python -m scripts.load_test_mongo_clients --requests 500 --concurrency 50
+"""
+from app.DB.mongodb.client import client_options
+from app.config.settings import settings
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+import numpy as np
+import argparse
+import asyncio
+import time
+
+
+class ConnectionCounter(monitoring.ConnectionPoolListener):
+     def __init__(self):
+          self.created = 0
+          self.open = 0
+          self.peak = 0
+
+     def connection_created(self, event):
+          self.created += 1
+          self.open += 1
+          self.peak = max(self.peak, self.open)
+
+     def connection_closed(self, event):
+          self.open -= 1
+
+     def pool_created(self, event): pass
+     def pool_ready(self, event): pass
+     def pool_cleared(self, event): pass
+     def pool_closed(self, event): pass
+     def connection_ready(self, event): pass
+     def connection_check_out_started(self, event): pass
+     def connection_check_out_failed(self, event): pass
+     def connection_checked_out(self, event): pass
+     def connection_checked_in(self, event): pass
+
+
+async def server_connections(client) -> str:
+     try:
+          status = await client.admin.command("serverStatus")
+          return str(status["connections"]["current"])
+     except Exception:
+          return "n/a"
+
+
+async def run(mode: str, requests: int, concurrency: int):
+     counter = ConnectionCounter()
+     shared = AsyncIOMotorClient(settings.DATABASE_URL, event_listeners=[counter], **client_options())
+     clients = []
+     semaphore = asyncio.Semaphore(concurrency)
+     latencies = []
+
+     async def request(i: int):
+          async with semaphore:
+               started = time.perf_counter()
+               if mode == "per-request":
+                    # Never closed, like the per-request ProductService clients
+                    client = AsyncIOMotorClient(settings.DATABASE_URL, event_listeners=[counter])
+                    clients.append(client)
+               else:
+                    client = shared
+               db = client[settings.DATABASE_NAME]
+               await db["products"].find_one({}, {"_id": 1})
+               await db["userProfiles"].find_one({"userId": f"load-test-{i}"})
+               latencies.append((time.perf_counter() - started) * 1000)
+
+     started = time.perf_counter()
+     await asyncio.gather(*(request(i) for i in range(requests)))
+     elapsed = time.perf_counter() - started
+     on_server = await server_connections(shared)
+     for client in clients:
+          client.close()
+     shared.close()
+     return {
+          "p50": np.percentile(latencies, 50),
+          "p99": np.percentile(latencies, 99),
+          "rps": requests / elapsed,
+          "created": counter.created,
+          "peak": counter.peak,
+          "server": on_server
+     }
+
+
+async def main(requests: int, concurrency: int):
+     print(f"{'mode':>12} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'conns opened':>13} {'peak open':>10} {'server':>7}")
+     for mode in ("per-request", "shared"):
+          r = await run(mode, requests, concurrency)
+          print(
+               f"{mode:>12} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['rps']:>8.1f} "
+               f"{r['created']:>13} {r['peak']:>10} {r['server']:>7}"
+          )
+
+
+if __name__ == "__main__":
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--requests", type=int, default=500)
+     parser.add_argument("--concurrency", type=int, default=50)
+     args = parser.parse_args()
+     asyncio.run(main(args.requests, args.concurrency))
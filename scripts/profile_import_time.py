@@ -0,0 +1,90 @@
+"""
+Import-time profile of the app (python -X importtime).
+
+Imports a module (main by default) in a fresh interpreter and reports
+the total import time, the slowest top-level packages (self time of all
+their modules) and the slowest single modules, by self and by
+cumulative time (the latter includes everything a module pulls in). Heavy dependencies that should only load on first
+use or in the startup warm-up are listed separately; any of them being
+imported by `main` is a regression. Exits non-zero when --budget-ms is
+exceeded or a heavy package is imported, so it can run in CI.
+
+     python -m scripts.profile_import_time --top 15 --budget-ms 1500
+"""
+from typing import Dict, List, Tuple
+import argparse
+import subprocess
+import sys
+
+# Loaded lazily (first use or warm-up), never at import of main
+HEAVY_PACKAGES = [
+     "torch", "sentence_transformers", "transformers", "onnxruntime", "hnswlib",
+     "langchain", "langchain_core", "langchain_community", "langchain_openai",
+     "langgraph", "fitz", "pymupdf", "docx", "boto3"
+]
+
+
+def import_profile(module: str) -> List[Tuple[int, int, str]]:
+     """(self us, cumulative us, name indented by nesting depth) of every module imported by `module`"""
+     result = subprocess.run(
+          [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+          capture_output=True,
+          text=True
+     )
+     if result.returncode != 0:
+          sys.stderr.write(result.stderr)
+          raise SystemExit(f"import {module} failed")
+     rows = []
+     for line in result.stderr.splitlines():
+          if not line.startswith("import time:") or "self [us]" in line:
+               continue
+          self_us, cumulative_us, name = line[len("import time:"):].split("|")
+          rows.append((int(self_us), int(cumulative_us), name[1:]))
+     return rows
+
+
+def by_package(rows: List[Tuple[int, int, str]]) -> Dict[str, int]:
+     """Self us summed per top-level package"""
+     totals: Dict[str, int] = {}
+     for self_us, _, name in rows:
+          package = name.strip().split(".")[0]
+          totals[package] = totals.get(package, 0) + self_us
+     return totals
+
+
+def main(module: str, top: int, budget_ms: float):
+     rows = import_profile(module)
+     packages = by_package(rows)
+     total_ms = sum(packages.values()) / 1000
+     print(f"import {module}: {total_ms:.0f} ms, {len(rows)} modules")
+
+     print(f"\n{'package':<28} {'self ms':>8}")
+     for package, us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+          print(f"{package:<28} {us / 1000:>8.1f}")
+
+     print(f"\n{'module':<48} {'self ms':>8}")
+     for self_us, _, name in sorted(rows, reverse=True)[:top]:
+          print(f"{name.strip():<48} {self_us / 1000:>8.1f}")
+
+     print(f"\n{'module':<48} {'cumulative ms':>14}")
+     for _, cumulative_us, name in sorted(rows, key=lambda row: -row[1])[:top]:
+          print(f"{name.strip():<48} {cumulative_us / 1000:>14.1f}")
+
+     imported = {name.strip().split(".")[0] for _, _, name in rows}
+     heavy = [package for package in HEAVY_PACKAGES if package in imported]
+     print(f"\nheavy packages imported: {', '.join(heavy) or 'none'}")
+
+     failed = bool(heavy)
+     if budget_ms and total_ms > budget_ms:
+          print(f"over budget: {total_ms:.0f} ms > {budget_ms:.0f} ms")
+          failed = True
+     raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+     parser = argparse.ArgumentParser()
+     parser.add_argument("--module", default="main")
+     parser.add_argument("--top", type=int, default=15)
+     parser.add_argument("--budget-ms", type=float, default=0)
+     args = parser.parse_args()
+     main(args.module, args.top, args.budget_ms)